@@ -7,12 +7,13 @@ from pathlib import Path
 
 # Third party
 from fastapi import APIRouter, Request, HTTPException
-from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse
+from fastapi.responses import HTMLResponse, JSONResponse, RedirectResponse, Response
 
 # Local
 from app import cache
 from app.api import templates
 from app.config import CONTENT_DIR, PER_PAGE
+from app.core.frontmatter import read_frontmatter
 from app.core.indexing import parse_frontmatter, is_published
 from app.services.content import render_markdown
 from app.services.images import find_image_in_static
@@ -22,7 +23,8 @@ from app.utils.messages import get_all_messages
 router = APIRouter()
 
 
-def _get_related_articles(file_path: str, tags: list, is_localhost: bool, limit: int = 5) -> list[dict]:
+def _get_related_articles(snapshot: cache.VaultSnapshot, file_path: str, tags: list, is_localhost: bool,
+                          limit: int = 5) -> list[dict]:
     """タグの共通度に基づいて関連記事を取得"""
     if not tags:
         return []
@@ -30,7 +32,7 @@ def _get_related_articles(file_path: str, tags: list, is_localhost: bool, limit:
     tag_set = set(tags)
     scored = []
 
-    for f in cache.GLOBAL_FILE_CACHE:
+    for f in snapshot.files:
         if f["path"] == file_path:
             continue
         if not is_localhost and not f.get("published"):
@@ -42,7 +44,7 @@ def _get_related_articles(file_path: str, tags: list, is_localhost: bool, limit:
             scored.append({
                 "title": f["title"],
                 "path": f["path"],
-                "slug": cache.PATH_TO_SLUG.get(f["path"], f["path"]),
+                "slug": snapshot.path_to_slug.get(f["path"], f["path"]),
                 "score": common
             })
 
@@ -56,8 +58,10 @@ async def preview_file(request: Request, path: str):
     if ".." in path or path.startswith("/"):
         raise HTTPException(status_code=400, detail="Invalid path")
 
+    snapshot = cache.get_snapshot()
+
     # スラッグからの解決を試みる
-    resolved = cache.SLUG_TO_PATH.get(path)
+    resolved = snapshot.slug_to_path.get(path)
     if resolved:
         path = resolved
 
@@ -65,52 +69,82 @@ async def preview_file(request: Request, path: str):
     if not full_path.exists():
         raise HTTPException(status_code=404, detail="File not found")
 
-    with open(full_path, "r", encoding="utf-8") as f:
-        content = f.read()
-
-    # Validation for non-localhost
+    # Validation for non-localhost（公開判定はfrontmatterのみを読んで行い、本文は読まない）
     is_localhost = is_request_local(request)
     if not is_localhost:
-        frontmatter, _ = parse_frontmatter(content)
-        if not is_published(frontmatter):
+        if not is_published(read_frontmatter(full_path)):
             raise HTTPException(status_code=403, detail="Forbidden: This file is not public")
 
+    with open(full_path, "r", encoding="utf-8") as f:
+        content = f.read()
+
     # frontmatterからタイトルを取得
     frontmatter, body = parse_frontmatter(content)
     title = frontmatter.get("title") or Path(path).stem
 
-    html = render_markdown(body)
+    html = render_markdown(body, snapshot)
     return JSONResponse(content={"title": title, "content": html})
 
 
+@router.get("/api/tree")
+async def api_tree(request: Request, path: str = ""):
+    """ファイルツリーの1階層分を返す（サイドバーでのフォルダ遅延展開用）
+
+    ディレクトリは配下を含めず直下の件数のみ返す。スナップショットの世代番号をETagとする。
+    """
+    is_localhost = is_request_local(request)
+    snapshot = cache.get_snapshot()
+
+    folders = snapshot.folders if is_localhost else snapshot.folders_public
+    path = path.strip("/")
+    children = folders.get(path)
+    if children is None:
+        raise HTTPException(status_code=404, detail="Folder not found")
+
+    etag = f'W/"tree-{snapshot.generation}-{int(is_localhost)}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
+
+    items = []
+    for node in children:
+        if node["type"] == "directory":
+            items.append({
+                "type": "directory",
+                "name": node["name"],
+                "path": node["path"],
+                "count": len(node["children"]),
+            })
+        else:
+            items.append({
+                "type": "file",
+                "name": node["name"],
+                "title": node["title"],
+                "path": node["path"],
+                "slug": node.get("slug", ""),
+            })
+
+    return JSONResponse(content={"path": path, "items": items}, headers={"ETag": etag})
+
+
 @router.get("/", response_class=HTMLResponse)
 async def read_root(request: Request, page: int = 1, q: str = "", tag: str = "", visibility: str = "all"):
-    # Filter files
-    filtered = cache.GLOBAL_FILE_CACHE
+    snapshot = cache.get_snapshot()
+    is_localhost = is_request_local(request)
+
+    # 公開状態・タグでの絞り込みはインデックス構築時に作成済みのビューを使う
+    if not is_localhost:
+        # Force public visibility for external requests
+        view = "public"
+    elif visibility in ("public", "private"):
+        view = visibility
+    else:
+        view = "all"
+    filtered = snapshot.listings[view].get(tag, []) if tag else snapshot.listings[view][""]
 
     if q:
         q_lower = q.lower()
         filtered = [f for f in filtered if q_lower in f['title'].lower() or q_lower in f['path'].lower()]
 
-    if tag:
-        filtered = [f for f in filtered if tag in (f.get('tags') or [])]
-
-    if not is_request_local(request):
-        # Force public visibility for external requests
-        filtered = [f for f in filtered if f.get('published')]
-    else:
-        if visibility == "public":
-            filtered = [f for f in filtered if f.get('published')]
-        elif visibility == "private":
-            filtered = [f for f in filtered if not f.get('published')]
-
-    # Tags for cloud
-    all_tags = set()
-    for f in cache.GLOBAL_FILE_CACHE:
-        for t in (f.get('tags') or []):
-            all_tags.add(t)
-    all_tags = sorted(list(all_tags))
-
     # Pagination
     total = len(filtered)
     pages = math.ceil(total / PER_PAGE)
@@ -118,8 +152,6 @@ async def read_root(request: Request, page: int = 1, q: str = "", tag: str = "",
     end = start + PER_PAGE
     paginated_files = filtered[start:end]
 
-    is_localhost = is_request_local(request)
-
     return templates.TemplateResponse(request=request, name="index.html", context={
         "request": request,
         "files": paginated_files,
@@ -127,7 +159,7 @@ async def read_root(request: Request, page: int = 1, q: str = "", tag: str = "",
         "current_page": page,
         "total_pages": pages,
         "selected_tag": tag,
-        "all_tags": all_tags,
+        "all_tags": snapshot.all_tags,
         "visibility": visibility,
         "q": q,
         "is_localhost": is_localhost,
@@ -137,13 +169,15 @@ async def read_root(request: Request, page: int = 1, q: str = "", tag: str = "",
 
 @router.get("/view/{file_path:path}", response_class=HTMLResponse)
 async def read_item(request: Request, file_path: str):
+    snapshot = cache.get_snapshot()
+
     # スラッグからの解決を試みる
-    actual_path = cache.SLUG_TO_PATH.get(file_path)
+    actual_path = snapshot.slug_to_path.get(file_path)
     if actual_path is None:
         # レガシーパス（実ファイルパス）でのアクセス → スラッグURLへ301リダイレクト
         full_path = CONTENT_DIR / file_path
         if full_path.exists() and full_path.is_file():
-            slug = cache.PATH_TO_SLUG.get(file_path)
+            slug = snapshot.path_to_slug.get(file_path)
             if slug:
                 return RedirectResponse(url=f"/view/{slug}", status_code=301)
             actual_path = file_path
@@ -152,35 +186,57 @@ async def read_item(request: Request, file_path: str):
     file_path = actual_path
 
     full_path = CONTENT_DIR / file_path
-    if not full_path.exists():
+    try:
+        st = full_path.stat()
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="File not found")
 
-    mtime = full_path.stat().st_mtime
+    # レンダリング結果はノート内容のハッシュで照合する（同期でmtimeのみ変わっても再レンダリングしない）。
+    # 現在のmtime/sizeがスナップショットのstatと異なる場合（ファイル監視の無効時・デバウンス中の更新）は
+    # スナップショットのハッシュが古いため、キャッシュを使わずに再レンダリングする。
+    # 未インデックスのノートはmtime/sizeで照合
+    record = snapshot.records.get(file_path)
+    live_stat = (st.st_mtime_ns, st.st_size)
+    stale = record is not None and snapshot.stats.get(file_path) != live_stat
+    if record is not None and record.content_hash:
+        identity = record.content_hash
+    else:
+        identity = live_stat
+
+    is_localhost = is_request_local(request)
 
     # Check cache
     cache_key = str(file_path)
-    if cache_key in cache.MARKDOWN_CACHE and cache.MARKDOWN_CACHE[cache_key]['mtime'] == mtime:
-        entry = cache.MARKDOWN_CACHE[cache_key]
+    entry = None if stale else cache.MARKDOWN_CACHE.get(cache_key)
+    raw_body = None
+    # Dataviewを含むノートはスナップショットの世代が変わったら再レンダリング
+    if entry and entry['identity'] == identity and entry['generation'] in (None, snapshot.generation):
         html = entry['html']
         title = entry['title']
         frontmatter = entry.get('frontmatter', {})
     else:
+        # 非公開ノートへの外部アクセスは本文を読み込む前に拒否する（frontmatterのみ読み込み）
+        if not is_localhost and not is_published(read_frontmatter(full_path)):
+            raise HTTPException(status_code=403, detail="Forbidden: This file is not public")
+
         with open(full_path, "r", encoding="utf-8") as f:
             content = f.read()
 
         frontmatter, body = parse_frontmatter(content)
         title = frontmatter.get('title') or Path(file_path).stem
 
-        html = render_markdown(body)
-        # Update cache
-        cache.MARKDOWN_CACHE[cache_key] = {
-            'html': html,
-            'title': title,
-            'mtime': mtime,
-            'frontmatter': frontmatter
-        }
-
-    is_localhost = is_request_local(request)
+        html = render_markdown(body, snapshot)
+        raw_body = body
+        # Update cache（スナップショットへの反映前の内容はキャッシュしない）
+        if not stale:
+            cache.MARKDOWN_CACHE[cache_key] = {
+                'html': html,
+                'title': title,
+                'identity': identity,
+                'frontmatter': frontmatter,
+                # Dataviewを含むノートは他ノートの更新でも結果が変わるため世代番号に紐付ける
+                'generation': snapshot.generation if 'dataview' in body else None
+            }
 
     is_pub = is_published(frontmatter)
 
@@ -188,20 +244,18 @@ async def read_item(request: Request, file_path: str):
         raise HTTPException(status_code=403, detail="Forbidden: This file is not public")
 
     # キャッシュから読了時間を取得
-    reading_time = 1
-    for f in cache.GLOBAL_FILE_CACHE:
-        if f["path"] == file_path:
-            reading_time = f.get("reading_time", 1)
-            break
+    reading_time = record.reading_time if record is not None else 1
 
     # OGP用のdescription生成
     description = frontmatter.get("description", "")
-    raw_body = ""
     og_image_from_fm = frontmatter.get("image") or frontmatter.get("thumbnail")
-    if not description or not og_image_from_fm:
-        with open(full_path, "r", encoding="utf-8") as f:
-            raw_content = f.read()
-        _, raw_body = parse_frontmatter(raw_content)
+    # 今回レンダリングした場合は読み込み済みの本文を使う（キャッシュヒット時のみ再読み込み）
+    if raw_body is None:
+        raw_body = ""
+        if not description or not og_image_from_fm:
+            with open(full_path, "r", encoding="utf-8") as f:
+                raw_content = f.read()
+            _, raw_body = parse_frontmatter(raw_content)
 
     if not description:
         # body先頭からプレーンテキスト150文字を抽出
@@ -240,19 +294,18 @@ async def read_item(request: Request, file_path: str):
         og_image = base_url + og_image
 
     # バックリンク取得
-    backlinks = cache.BACKLINK_CACHE.get(file_path, [])
+    backlinks = snapshot.backlinks.get(file_path, [])
     # 非localhostの場合、公開ファイルのみに絞る
     if not is_localhost:
-        published_paths = {f["path"] for f in cache.GLOBAL_FILE_CACHE if f.get("published")}
-        backlinks = [bl for bl in backlinks if bl["path"] in published_paths]
+        backlinks = [bl for bl in backlinks if bl["path"] in snapshot.published_paths]
 
     # 関連記事取得
     tags = frontmatter.get("tags") or []
     if isinstance(tags, str):
         tags = [tags]
-    related_articles = _get_related_articles(file_path, tags, is_localhost)
+    related_articles = _get_related_articles(snapshot, file_path, tags, is_localhost)
 
-    slug = cache.PATH_TO_SLUG.get(file_path, file_path)
+    slug = snapshot.path_to_slug.get(file_path, file_path)
 
     return templates.TemplateResponse(request=request, name="view.html", context={
         "request": request,
@@ -279,12 +332,12 @@ async def api_get_messages():
     return get_all_messages()
 
 
-def _legacy_search(q: str, is_localhost: bool) -> list[dict]:
+def _legacy_search(snapshot: cache.VaultSnapshot, q: str, is_localhost: bool) -> list[dict]:
     """旧方式の線形スキャン検索（ベンチマーク比較用に抽出）"""
     q_lower = q.lower()
     results = []
 
-    for f in cache.GLOBAL_FILE_CACHE:
+    for f in snapshot.files:
         if not is_localhost and not f.get('published'):
             continue
 
@@ -308,7 +361,7 @@ def _legacy_search(q: str, is_localhost: bool) -> list[dict]:
             results.append({
                 "title": f['title'],
                 "path": f['path'],
-                "slug": cache.PATH_TO_SLUG.get(f['path'], f['path']),
+                "slug": snapshot.path_to_slug.get(f['path'], f['path']),
                 "match_type": match_type,
                 "snippet": snippet
             })
@@ -322,13 +375,14 @@ async def api_search(request: Request, q: str = ""):
         return []
 
     is_localhost = is_request_local(request)
+    snapshot = cache.get_snapshot()
 
-    # TF-IDFインデックスが構築済みなら新方式を使用
-    if cache.SEARCH_INDEX is not None:
-        return cache.SEARCH_INDEX.search(q, is_localhost, cache.GLOBAL_FILE_CACHE)
+    # 全文検索インデックスが構築済みなら新方式を使用
+    if snapshot.search_index is not None:
+        return snapshot.search_index.search(q, is_localhost, snapshot.records, snapshot.published_paths)
 
     # フォールバック: 旧方式
-    return _legacy_search(q, is_localhost)
+    return _legacy_search(snapshot, q, is_localhost)
 
 
 @router.get("/api/search/benchmark")
@@ -337,7 +391,8 @@ async def api_search_benchmark(request: Request):
     if not is_request_local(request):
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    if cache.SEARCH_INDEX is None:
+    snapshot = cache.get_snapshot()
+    if snapshot.search_index is None:
         return {"error": "検索インデックスが未構築です"}
 
     test_queries = [
@@ -357,12 +412,12 @@ async def api_search_benchmark(request: Request):
     for q in test_queries:
         # 旧方式
         t0 = time.perf_counter()
-        old_results = _legacy_search(q, is_localhost=True)
+        old_results = _legacy_search(snapshot, q, is_localhost=True)
         old_time = (time.perf_counter() - t0) * 1000  # ms
 
         # 新方式
         t0 = time.perf_counter()
-        new_results = cache.SEARCH_INDEX.search(q, True, cache.GLOBAL_FILE_CACHE)
+        new_results = snapshot.search_index.search(q, True, snapshot.records, snapshot.published_paths)
         new_time = (time.perf_counter() - t0) * 1000  # ms
 
         results.append({
@@ -390,7 +445,8 @@ async def api_search_benchmark(request: Request):
             "legacy_avg_ms": round(legacy_avg, 3),
             "tfidf_avg_ms": round(tfidf_avg, 3),
             "speedup_ratio": round(speedup, 2),
-            "doc_count": cache.SEARCH_INDEX.doc_count,
-            "vocab_size": len(cache.SEARCH_INDEX.inverted_index),
+            "doc_count": snapshot.search_index.doc_count,
+            "vocab_size": snapshot.search_index.vocab_size,
+            "generation": snapshot.generation,
         }
     }
@@ -18,20 +18,17 @@ async def dashboard_page(request: Request):
     if not is_request_local(request):
         raise HTTPException(status_code=403, detail="Forbidden")
 
-    files = cache.GLOBAL_FILE_CACHE
+    snapshot = cache.get_snapshot()
+    files = snapshot.files
 
     # 統計情報
     total_files = len(files)
-    public_files = sum(1 for f in files if f.get("published"))
+    public_files = len(snapshot.published_paths)
     private_files = total_files - public_files
     total_chars = sum(f.get("char_count", 0) for f in files)
 
     # タグ分布 (top 20)
-    tag_counter = Counter()
-    for f in files:
-        for t in (f.get("tags") or []):
-            tag_counter[t] += 1
-    top_tags = tag_counter.most_common(20)
+    top_tags = Counter(snapshot.tag_counts["all"]).most_common(20)
     max_tag_count = top_tags[0][1] if top_tags else 1
 
     # 最近更新されたファイル (top 10)
@@ -12,9 +12,9 @@ from app.api import templates
 
 logger = logging.getLogger("app.editor")
 from app import cache
-from app.config import CONTENT_DIR
-from app.core.indexing import refresh_global_caches
+from app.config import CONTENT_DIR, REFRESH_WAIT_TIMEOUT_SECONDS
 from app.services.content import render_markdown
+from app.services.refresh import request_refresh, wait_for_refresh_async
 from app.services.sync import load_config
 from app.utils.helpers import is_request_local, localhost_guard
 from app.utils.messages import get_error, get_system
@@ -88,8 +88,8 @@ async def editor_save(request: Request):
     stem = Path(filename).stem
 
     # 既存ファイルの上書き禁止（サブディレクトリ含む再帰チェック）
-    # アプリ側: FILE_NAME_CACHEは全ディレクトリのstem→pathマップ
-    if stem in cache.FILE_NAME_CACHE:
+    # アプリ側: file_namesは全ディレクトリのstem→pathマップ
+    if stem in cache.get_snapshot().file_names:
         return JSONResponse({"status": "error", "message": get_error("E204")}, status_code=409)
 
     # ホスト側Vault: rglobで再帰的に同名ファイルを探索
@@ -118,8 +118,9 @@ async def editor_save(request: Request):
             host_error = str(e)
             logger.warning("ホスト側Vaultへの書き込みに失敗: %s", e)
 
-    # キャッシュ更新
-    refresh_global_caches()
+    # キャッシュ更新（保存したノートのみ差分反映）。反映はワーカースレッドで行い、完了をループ外で待つ
+    ticket = request_refresh([filename])
+    await wait_for_refresh_async(ticket, timeout=REFRESH_WAIT_TIMEOUT_SECONDS)
 
     return {
         "status": "success",
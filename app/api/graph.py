@@ -1,6 +1,6 @@
 """グラフビュー エンドポイント"""
 from fastapi import APIRouter, Request
-from fastapi.responses import HTMLResponse, JSONResponse
+from fastapi.responses import HTMLResponse, JSONResponse, Response
 
 from app import cache
 from app.api import templates
@@ -21,26 +21,34 @@ async def graph_page(request: Request):
 
 @router.get("/api/graph")
 async def api_graph(request: Request):
-    """グラフデータ（ノードとリンク）をJSONで返す"""
+    """グラフデータ（ノードとリンク）をJSONで返す
+
+    スナップショットの世代番号をETagとし、変更がなければ304を返す。
+    """
     is_localhost = is_request_local(request)
+    snapshot = cache.get_snapshot()
+
+    etag = f'W/"graph-{snapshot.generation}-{int(is_localhost)}"'
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers={"ETag": etag})
 
     # ノード生成
     nodes = []
     node_paths = set()
-    for f in cache.GLOBAL_FILE_CACHE:
+    for f in snapshot.files:
         if not is_localhost and not f.get("published"):
             continue
         nodes.append({
             "id": f["path"],
             "title": f["title"],
             "tags": f.get("tags", []),
-            "slug": cache.PATH_TO_SLUG.get(f["path"], f["path"])
+            "slug": snapshot.path_to_slug.get(f["path"], f["path"])
         })
         node_paths.add(f["path"])
 
-    # リンク生成（FORWARD_LINK_CACHEから）
+    # リンク生成（forward_linksから）
     links = []
-    for source, targets in cache.FORWARD_LINK_CACHE.items():
+    for source, targets in snapshot.forward_links.items():
         if source not in node_paths:
             continue
         for target in targets:
@@ -50,4 +58,4 @@ async def api_graph(request: Request):
                     "target": target
                 })
 
-    return JSONResponse(content={"nodes": nodes, "links": links})
+    return JSONResponse(content={"nodes": nodes, "links": links}, headers={"ETag": etag})
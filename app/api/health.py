@@ -0,0 +1,35 @@
+"""ヘルスチェック エンドポイント
+
+/healthz はプロセスが応答できれば常に200を返し、インデックスの状態と進捗を含める。
+/readyz はトラフィックを受けてよい状態（index_status.ready）の場合のみ200、それ以外は503。
+ロードバランサ等から参照されるためlocalhost制限はかけない。
+"""
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+
+from app import cache
+from app.core.index_status import index_status
+
+router = APIRouter()
+
+
+def _status_body() -> dict:
+    snapshot = cache.get_snapshot()
+    return {
+        **index_status.to_dict(),
+        "generation": snapshot.generation,
+        "files_indexed": len(snapshot.files),
+    }
+
+
+@router.get("/healthz")
+async def healthz():
+    return JSONResponse(_status_body())
+
+
+@router.get("/readyz")
+async def readyz():
+    body = _status_body()
+    if not body["ready"]:
+        return JSONResponse(body, status_code=503, headers={"Retry-After": "5"})
+    return JSONResponse(body)
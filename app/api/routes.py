@@ -6,6 +6,7 @@ from app.api.sync import router as sync_router
 from app.api.editor import router as editor_router
 from app.api.graph import router as graph_router
 from app.api.dashboard import router as dashboard_router
+from app.api.health import router as health_router
 
 router = APIRouter()
 router.include_router(content_router)
@@ -13,3 +14,4 @@ router.include_router(sync_router)
 router.include_router(editor_router)
 router.include_router(graph_router)
 router.include_router(dashboard_router)
+router.include_router(health_router)
@@ -1,5 +1,6 @@
 """同期・管理系エンドポイント（localhost限定）"""
 # Standard library
+import asyncio
 import os
 from pathlib import Path
 
@@ -8,9 +9,10 @@ from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
 
 # Local
-from app.core.indexing import refresh_global_caches
+from app.config import REFRESH_WAIT_TIMEOUT_SECONDS
 from app.events import config_updated_event
 from app.models.sync import SyncConfig
+from app.services.refresh import refresh_status, request_refresh, wait_for_refresh_async
 from app.services.sync import load_config, save_config, perform_sync
 from app.utils.helpers import localhost_guard
 from app.utils.messages import get_error, get_warning
@@ -94,7 +96,9 @@ async def api_get_public_config():
 async def api_sync_now(request: Request):
     if error := localhost_guard(request): return error
     config = load_config()
-    success, message = perform_sync(config)
+    # ファイルコピーでイベントループをブロックしないようスレッドで実行
+    loop = asyncio.get_event_loop()
+    success, message = await loop.run_in_executor(None, perform_sync, config)
     # 同期後、定期実行のタイマーをリセットさせるために通知を送る
     config_updated_event.set()
     if success:
@@ -105,11 +109,23 @@ async def api_sync_now(request: Request):
 
 @router.post("/api/reindex")
 @router.post("/api/rebuild-index")
-async def api_reindex(request: Request):
+async def api_reindex(request: Request, incremental: bool = False, wait: bool = True):
     if error := localhost_guard(request): return error
 
-    refresh_global_caches()
-    return {"status": "success"}
+    # incremental=true の場合は変更のあったノートのみ再インデックス
+    # 反映はリフレッシュキューのワーカーで行い、wait=trueの場合はループ外で完了を待つ
+    ticket = request_refresh(incremental=incremental, full=not incremental)
+    if wait:
+        await wait_for_refresh_async(ticket, timeout=REFRESH_WAIT_TIMEOUT_SECONDS)
+    return {"status": "success", "ticket": ticket, **refresh_status()}
+
+
+@router.get("/api/reindex/status")
+async def api_reindex_status(request: Request):
+    """リフレッシュキューの状態（state, requested, completed, generation など）を返す。
+    completed >= ticket になればその要求は反映済み"""
+    if error := localhost_guard(request): return error
+    return refresh_status()
 
 
 @router.get("/api/dirs")
@@ -1,12 +1,101 @@
-# In-memory Global Index Cache
-GLOBAL_FILE_CACHE = []
-GLOBAL_FILE_TREE_CACHE = []
-GLOBAL_FILE_TREE_CACHE_PUBLIC = []
+"""インデックス済みVaultのスナップショットと、レンダリング用のメモキャッシュ"""
+
+
+class VaultSnapshot:
+    """インデックス済みVaultの不変スナップショット。
+
+    リフレッシュ時は新しいスナップショットを別に構築し、publish_snapshot()で
+    参照を1回差し替えて公開する。公開後は各フィールドを変更しないこと。
+    リクエストハンドラは処理の最初にget_snapshot()で1つ取得し、以降はそれだけを参照する。
+    generationは公開ごとに増加するため、派生データのキャッシュキーとして使用できる。
+    """
+
+    __slots__ = (
+        "generation",
+        "files",             # [file_record] mtime降順
+        "records",           # {relative_path: file_record} パス→レコード
+        "published_paths",   # frozenset(relative_path) 公開ノートのパス
+        "listings",          # {visibility: {tag: [file_record]}} 一覧表示用（mtime降順、tag=""は全件）
+        "tag_counts",        # {visibility: {tag: count}} visibilityは "all" / "public" / "private"
+        "all_tags",          # [tag] 全ノートのタグ（ソート済み）
+        "file_tree",         # 全ファイルのツリー（管理者用）
+        "file_tree_public",  # 公開ファイルのみのツリー
+        "folders",           # {relative_dir: [node]} ツリーの階層ごとの索引（""はルート、ノードはfile_treeと共有）
+        "folders_public",    # 公開ファイルのみのツリーの階層索引
+        "file_names",        # {stem: path} e.g. {"Redis 環境構築手順": "infra/Redis 環境構築手順.md"}
+        "stem_paths",        # {stem: [path]} 同名ノートの一覧（file_namesの差分更新用）
+        "backlinks",         # {target_path: [{title, path, slug}]} 被リンクマップ
+        "forward_links",     # {source_path: [target_path]} リンク先マップ
+        "search_index",      # SearchIndex instance (BM25F全文検索)。未構築の場合はNone
+        "slug_to_path",      # {slug: relative_path} スラッグ→実パス
+        "path_to_slug",      # {relative_path: slug} 実パス→スラッグ
+        "wikilinks",         # {source_path: [link_name]} ノート内の生のwikilink名
+        "linked_from",       # {link_name: frozenset(source_path)} wikilinksの逆引き（未解決のリンクを含む）
+        "stats",             # {relative_path: (mtime_ns, size)} 差分リフレッシュ用
+        "dirs",              # [relative_dir] ツリー構築用のディレクトリ一覧
+    )
+
+    def __init__(self, generation: int = 0, files: list | None = None,
+                 records: dict | None = None, published_paths: frozenset | None = None,
+                 listings: dict | None = None, tag_counts: dict | None = None, all_tags: list | None = None,
+                 file_tree: list | None = None, file_tree_public: list | None = None,
+                 folders: dict | None = None, folders_public: dict | None = None,
+                 file_names: dict | None = None, stem_paths: dict | None = None, backlinks: dict | None = None,
+                 forward_links: dict | None = None, search_index=None,
+                 slug_to_path: dict | None = None, path_to_slug: dict | None = None,
+                 wikilinks: dict | None = None, linked_from: dict | None = None, stats: dict | None = None,
+                 dirs: list | None = None):
+        values = {
+            "generation": generation,
+            "files": files if files is not None else [],
+            "records": records if records is not None else {},
+            "published_paths": published_paths if published_paths is not None else frozenset(),
+            "listings": listings if listings is not None else {"all": {"": []}, "public": {"": []}, "private": {"": []}},
+            "tag_counts": tag_counts if tag_counts is not None else {"all": {}, "public": {}, "private": {}},
+            "all_tags": all_tags if all_tags is not None else [],
+            "file_tree": file_tree if file_tree is not None else [],
+            "file_tree_public": file_tree_public if file_tree_public is not None else [],
+            "folders": folders if folders is not None else {"": []},
+            "folders_public": folders_public if folders_public is not None else {"": []},
+            "file_names": file_names if file_names is not None else {},
+            "stem_paths": stem_paths if stem_paths is not None else {},
+            "backlinks": backlinks if backlinks is not None else {},
+            "forward_links": forward_links if forward_links is not None else {},
+            "search_index": search_index,
+            "slug_to_path": slug_to_path if slug_to_path is not None else {},
+            "path_to_slug": path_to_slug if path_to_slug is not None else {},
+            "wikilinks": wikilinks if wikilinks is not None else {},
+            "linked_from": linked_from if linked_from is not None else {},
+            "stats": stats if stats is not None else {},
+            "dirs": dirs if dirs is not None else [],
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("VaultSnapshot is immutable")
+
+    def replace(self, **changes) -> "VaultSnapshot":
+        """一部のフィールドを差し替えた次世代のスナップショットを返す"""
+        values = {name: getattr(self, name) for name in self.__slots__}
+        values.update(changes)
+        values["generation"] = self.generation + 1
+        return VaultSnapshot(**values)
+
+
+# 現在公開中のスナップショット（参照の差し替えのみで更新する）
+SNAPSHOT = VaultSnapshot()
+
+
+def get_snapshot() -> VaultSnapshot:
+    return SNAPSHOT
+
+
+def publish_snapshot(snapshot: VaultSnapshot) -> None:
+    global SNAPSHOT
+    SNAPSHOT = snapshot
+
+
+# レンダリング用のメモキャッシュ（スナップショットとは独立して更新される）
 IMAGE_PATH_CACHE = {}      # {filename: url}
-MARKDOWN_CACHE = {}        # {file_path: {html, title, mtime}}
-FILE_NAME_CACHE = {}       # {stem: path} e.g. {"Redis 環境構築手順": "infra/Redis 環境構築手順.md"}
-BACKLINK_CACHE = {}        # {target_path: [{title, path}]} 被リンクマップ
-FORWARD_LINK_CACHE = {}    # {source_path: [target_path]} リンク先マップ
-SEARCH_INDEX = None        # SearchIndex instance (TF-IDF全文検索)
-SLUG_TO_PATH = {}          # {slug: relative_path} スラッグ→実パス
-PATH_TO_SLUG = {}          # {relative_path: slug} 実パス→スラッグ
+MARKDOWN_CACHE = {}        # {file_path: {html, title, identity, frontmatter, generation}}
@@ -5,13 +5,18 @@ import os
 BASE_DIR = Path(__file__).resolve().parent.parent
 
 # Content and Statics directories
-CONTENT_DIR = BASE_DIR / "content"
+# OBSIDIAN_CONTENT_DIR でコンテンツディレクトリを差し替え可能（ベンチマーク用の合成Vaultなど）
+CONTENT_DIR = Path(os.environ.get("OBSIDIAN_CONTENT_DIR") or BASE_DIR / "content")
 STATICS_DIR = BASE_DIR / "static"
 IMAGES_DIR = STATICS_DIR / "images"
 TEMPLATES_DIR = BASE_DIR / "templates"
 
 # Cache files
-METADATA_CACHE_FILE = BASE_DIR / "metadata_cache.json"
+METADATA_CACHE_FILE = Path(os.environ.get("OBSIDIAN_METADATA_CACHE_FILE") or BASE_DIR / "metadata_cache.json")
+# スラッグ化（ローマ字変換）結果のテーブル。メタデータキャッシュと同じ場所に置く
+SLUG_TABLE_FILE = METADATA_CACHE_FILE.with_name(METADATA_CACHE_FILE.stem + "_slugs.json")
+# 検索インデックスのセグメント（起動時にmmapで開く）
+SEARCH_INDEX_FILE = METADATA_CACHE_FILE.with_name(METADATA_CACHE_FILE.stem + "_search.idx")
 CONFIG_FILE = BASE_DIR / "app" / "server_config.yaml"
 
 # Pagination
@@ -20,6 +25,64 @@ PER_PAGE = 12
 # 読了時間の算出基準（日本語: 500文字/分）
 READING_SPEED_JP = 500
 
+# インデックス構築時の並列パース（ProcessPoolExecutor）
+# ワーカー数: 0の場合はCPUコア数。1で常にシリアル処理
+INDEX_WORKERS = int(os.environ.get("OBSIDIAN_INDEX_WORKERS") or 0)
+# この件数未満のノートはプロセス起動コストの方が大きいためシリアル処理
+# （ワーカーの起動は0.3〜0.4秒、パース・トークン化は1ノート約1ms、親プロセスでの受け取りは約0.08ms。
+#   4コアで約600件、2コアで約1000件が損益分岐）
+PARALLEL_INDEX_MIN_FILES = 500
+
+# 全文検索（BM25F）のフィールドごとの重み（本文・タイトル・パス）とパラメータ
+SEARCH_FIELD_WEIGHTS = (1.0, 3.0, 1.5)
+SEARCH_BM25_K1 = 1.2
+SEARCH_BM25_B = 0.75
+# 複数語のクエリで、本文中のクエリ語が近くに出現する文書への加点の上限。
+# 出現するクエリ語の割合と、それらを含む最短の区間の密度（語数 / 区間のトークン数）に比例する
+SEARCH_PROXIMITY_WEIGHT = 0.5
+# 近接度で並べ直すBM25Fの上位候補の件数（limitより少ない場合はlimit件）
+SEARCH_PROXIMITY_CANDIDATES = 100
+# 検索時に計算した語ごとのスコア寄与を保持するLRUの件数（インデックスごと）
+SEARCH_TERM_CACHE_SIZE = 2048
+
+# 検索インデックスの差分更新で削除済み文書（文書IDの欠番）が
+# 生存文書数のこの割合（かつ最低件数）を超えたら、リフレッシュ時に詰め直す
+SEARCH_COMPACT_DEAD_RATIO = 0.2
+SEARCH_COMPACT_MIN_DEAD = 64
+
+# ノート本文（検索・スニペット用のプレーンテキスト）の保持先
+# "disk": 圧縮して一時ファイルに追記し、mmap経由で必要時に読み込む / "memory": 圧縮してメモリに保持
+BODY_STORE = os.environ.get("OBSIDIAN_BODY_STORE", "disk")
+# 展開済み本文を保持するLRUの件数
+BODY_CACHE_SIZE = 256
+
+# frontmatterのパース結果を保持するLRUの件数（frontmatterブロックの内容単位）
+FRONTMATTER_CACHE_SIZE = 4096
+# メタデータのみの読み込み（read_frontmatter）で先頭から読む上限。超えた場合は全文を読む
+FRONTMATTER_MAX_BYTES = 64 * 1024
+
+# リフレッシュキュー: 最後の要求からこの秒数は後続の要求を待ってまとめて1回で反映する
+REFRESH_DEBOUNCE_SECONDS = 0.2
+# 要求が続いていても最初の要求からこの秒数で反映する
+REFRESH_MAX_DELAY_SECONDS = 2.0
+# 保存・再インデックスのAPIが反映完了を待つ最大秒数（超えた場合は反映を待たずに応答する）
+REFRESH_WAIT_TIMEOUT_SECONDS = 60.0
+
+# 差分リフレッシュ後のスナップショットの永続化は、最初の変更からこの秒数後にまとめて
+# バックグラウンドで書き出す（フルリビルド時・シャットダウン時はその場で書き出す）
+SNAPSHOT_SAVE_DELAY_SECONDS = 30.0
+
+# 起動時、永続化済みのスナップショットを読み込んだ時点でready（/readyz）とする。
+# OBSIDIAN_SERVE_STALE=0 の場合は最新化と検索インデックスの構築が終わるまでnot ready
+SERVE_STALE_ON_STARTUP = os.environ.get("OBSIDIAN_SERVE_STALE", "1") != "0"
+
+# ファイル監視（inotify）。OBSIDIAN_WATCH=0 で無効化
+WATCH_ENABLED = os.environ.get("OBSIDIAN_WATCH", "1") != "0"
+# 最後のイベントからこの秒数変更がなければ反映（連続書き込みをまとめる）
+WATCH_DEBOUNCE_SECONDS = 0.5
+# イベントが続いていても最初のイベントからこの秒数で反映する
+WATCH_MAX_DELAY_SECONDS = 5.0
+
 # 同期時に削除しない保護対象
 PROTECTED_ITEMS = ["samples", "demo.md", ".git", ".gitignore"]
 
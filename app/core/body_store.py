@@ -0,0 +1,107 @@
+"""ノート本文（マークアップ除去済みプレーンテキスト）の格納先
+
+本文は検索インデックスの構築・スニペット生成・簡易検索でしか使わないため、
+レコードには圧縮済みのバイト列か、ディスク上のセグメントへの参照(BodyRef)のみを持たせる。
+展開済みの本文は直近に参照したものだけをLRUで保持する。
+"""
+import logging
+import mmap
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+
+from app.config import BODY_CACHE_SIZE, BODY_STORE
+
+logger = logging.getLogger("app.body_store")
+
+
+def compress_body(body_text: str) -> bytes:
+    """本文テキストを圧縮して保持用のバイト列にする"""
+    return zlib.compress(body_text.encode("utf-8"), 1)
+
+
+class BodySegment:
+    """圧縮済み本文を追記する一時ファイル（クローズ時に自動削除）。読み込みはmmap経由"""
+
+    def __init__(self):
+        self._file = tempfile.TemporaryFile(prefix="obsidian-bodies-")
+        self._size = 0
+        self._map: mmap.mmap | None = None
+        self._lock = threading.Lock()
+
+    def append(self, data: bytes) -> int:
+        with self._lock:
+            offset = self._size
+            self._file.seek(offset)
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+            return offset
+
+    def read(self, offset: int, length: int) -> bytes:
+        with self._lock:
+            # 追記でファイルが伸びた場合はマップし直す
+            if self._map is None or offset + length > len(self._map):
+                if self._map is not None:
+                    self._map.close()
+                self._map = mmap.mmap(self._file.fileno(), self._size, access=mmap.ACCESS_READ)
+            return self._map[offset:offset + length]
+
+
+class BodyRef:
+    """セグメント内の圧縮済み本文の位置"""
+
+    __slots__ = ("segment", "offset", "length")
+
+    def __init__(self, segment: BodySegment, offset: int, length: int):
+        self.segment = segment
+        self.offset = offset
+        self.length = length
+
+
+# 現在の追記先。旧セグメントは参照するレコードがなくなった時点で解放される
+_segment: BodySegment | None = None
+# 展開済み本文のLRU {bytes | BodyRef: str}
+_hot: OrderedDict = OrderedDict()
+_hot_lock = threading.Lock()
+
+
+def start_segment() -> None:
+    """フルリビルド時に新しいセグメントへ切り替える（差分更新で溜まった旧本文を捨てるため）"""
+    global _segment
+    _segment = BodySegment() if BODY_STORE == "disk" else None
+    with _hot_lock:
+        _hot.clear()
+
+
+def store_body(body: bytes | BodyRef) -> bytes | BodyRef:
+    """圧縮済み本文を格納先へ移し、レコードに持たせるハンドルを返す"""
+    global _segment
+    if BODY_STORE != "disk" or isinstance(body, BodyRef):
+        return body
+    if _segment is None:
+        _segment = BodySegment()
+    return BodyRef(_segment, _segment.append(body), len(body))
+
+
+def compressed_body(handle: bytes | BodyRef) -> bytes:
+    if isinstance(handle, BodyRef):
+        return handle.segment.read(handle.offset, handle.length)
+    return handle
+
+
+def load_body(handle: bytes | BodyRef) -> str:
+    """本文テキストを取得（直近に参照したものはLRUから返す）"""
+    with _hot_lock:
+        text = _hot.get(handle)
+        if text is not None:
+            _hot.move_to_end(handle)
+            return text
+
+    text = zlib.decompress(compressed_body(handle)).decode("utf-8")
+    with _hot_lock:
+        _hot[handle] = text
+        if len(_hot) > BODY_CACHE_SIZE:
+            _hot.popitem(last=False)
+    return text
@@ -239,11 +239,12 @@ def _evaluate_condition(file_entry: dict, field: str, op: str, value: str) -> bo
     return False
 
 
-def execute_query(query: DataviewQuery) -> list[dict]:
-    """GLOBAL_FILE_CACHEに対してクエリを実行"""
+def execute_query(query: DataviewQuery, snapshot: cache.VaultSnapshot | None = None) -> list[dict]:
+    """スナップショットのファイル一覧に対してクエリを実行"""
+    snapshot = snapshot or cache.get_snapshot()
     results = []
 
-    for f in cache.GLOBAL_FILE_CACHE:
+    for f in snapshot.files:
         # FROMフィルタ（フォルダ）
         if query.from_folder:
             if not f["path"].startswith(query.from_folder + "/"):
@@ -322,7 +323,7 @@ def render_table(query: DataviewQuery, results: list[dict]) -> str:
     rows = ""
     for f in results:
         title = escape(f.get("title", ""))
-        slug = escape(cache.PATH_TO_SLUG.get(f.get("path", ""), f.get("path", "")))
+        slug = escape(f.get("slug") or f.get("path", ""))
         link = f'<a href="/view/{slug}" class="dataview-link">{title}</a>'
         row_cells = f'<td>{link}</td>'
 
@@ -349,7 +350,7 @@ def render_list(query: DataviewQuery, results: list[dict]) -> str:
     items = ""
     for f in results:
         title = escape(f.get("title", ""))
-        slug = escape(cache.PATH_TO_SLUG.get(f.get("path", ""), f.get("path", "")))
+        slug = escape(f.get("slug") or f.get("path", ""))
         items += (
             f'<li>'
             f'<a href="/view/{slug}" class="dataview-list-link">'
@@ -370,11 +371,11 @@ def render_error(message: str) -> str:
     return f'<div class="dataview-error">Dataview Error: {escape(message)}</div>'
 
 
-def process_dataview(text: str) -> str:
+def process_dataview(text: str, snapshot: cache.VaultSnapshot | None = None) -> str:
     """メインエントリポイント: Dataviewクエリ文字列を受け取りHTMLを返す"""
     try:
         query = parse_query(text)
-        results = execute_query(query)
+        results = execute_query(query, snapshot)
 
         if query.query_type == "TABLE":
             return render_table(query, results)
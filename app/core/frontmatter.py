@@ -0,0 +1,271 @@
+"""frontmatterのパーサー
+
+ブロックの位置はstr.findで特定し、フラットな `key: value` とリスト（`tags: [a, b]` /
+`- a` 形式）のみのfrontmatterはYAMLパーサーを通さずに読み取る。
+スカラーの型解決（真偽値・数値・日付など）はPyYAMLのResolver/SafeConstructorをそのまま使うため、
+結果はyaml.safe_loadと一致する。それ以外の構造はyaml.CSafeLoader（libyamlがない場合はSafeLoader）で読み込む。
+パース結果はfrontmatterブロックの内容をキーにLRUで保持する。
+メタデータのみが必要な場合はread_frontmatterでファイル先頭のブロックだけを読み込む。
+"""
+import codecs
+import re
+import threading
+from pathlib import Path
+from collections import OrderedDict
+
+import yaml
+from yaml.constructor import SafeConstructor
+from yaml.nodes import ScalarNode
+from yaml.reader import Reader
+from yaml.resolver import Resolver
+
+from app.config import FRONTMATTER_CACHE_SIZE, FRONTMATTER_MAX_BYTES
+
+_Loader = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# ブロック位置の特定が高速パスで扱えない場合（先頭の空白・空行など）の従来の正規表現
+_BLOCK_RE = re.compile(r'^\s*---\s*\n(.*?)\n---(?:\s*\n|$)', re.DOTALL)
+
+_KEY_RE = re.compile(r'([A-Za-z_][\w\-]*):(?:[ ]+(.*))?$')
+_ITEM_RE = re.compile(r'([ ]*)-(?:[ ]+(.*))?$')
+_EXTRA_LINE_BREAK_RE = re.compile('[\r\x85\u2028\u2029]')
+# プレーンスカラーの先頭に置けない文字（YAMLのインジケータ）
+_INDICATORS = frozenset("-?:,[]{}#&*!|>'\"%@`")
+
+_resolver = Resolver()
+_constructor = SafeConstructor()
+_STR_TAG = "tag:yaml.org,2002:str"
+
+# read_frontmatterの1回あたりの読み込みサイズ
+_READ_CHUNK = 4096
+# _find_blockで、ファイルの続きを読まないと判定できないことを表す
+_INCOMPLETE = object()
+
+_cache: OrderedDict = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+class _Unsupported(Exception):
+    """高速パスで扱えない構造（YAMLパーサーにフォールバックする）"""
+
+
+def _plain_scalar(text: str):
+    """プレーンスカラーをyaml.safe_loadと同じ型に変換する"""
+    if not text:
+        raise _Unsupported
+    if text[0] in _INDICATORS or "\t" in text or ": " in text or " #" in text or text.endswith(":"):
+        raise _Unsupported
+    tag = _resolver.resolve(ScalarNode, text, (True, False))
+    if tag == _STR_TAG:
+        return text
+    construct = SafeConstructor.yaml_constructors.get(tag)
+    if construct is None:
+        raise _Unsupported
+    return construct(_constructor, ScalarNode(tag, text))
+
+
+def _scalar(text: str):
+    """値（プレーン・引用符付き）を変換する。textは前後の空白を除去済み"""
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "\"'":
+        inner = text[1:-1]
+        # エスケープや引用符の二重化を含むものはYAMLパーサーに任せる
+        if text[0] in inner or "\\" in inner or "\n" in inner:
+            raise _Unsupported
+        return inner
+    return _plain_scalar(text)
+
+
+def _flow_sequence(text: str) -> list:
+    inner = text[1:-1].strip()
+    if not inner:
+        return []
+    items = []
+    for item in inner.split(","):
+        item = item.strip()
+        if not item or any(c in item for c in "[]{}:#"):
+            raise _Unsupported
+        items.append(_scalar(item))
+    return items
+
+
+def _parse_simple(text: str) -> dict:
+    """フラットなkey: valueとリストのみのYAMLを読み取る。それ以外は_Unsupported"""
+    # YAMLが改行とみなす文字・読み込みエラーになる制御文字を含むものはパーサーに任せる
+    if _EXTRA_LINE_BREAK_RE.search(text) or Reader.NON_PRINTABLE.search(text):
+        raise _Unsupported
+
+    result = {}
+    list_key = None  # 値が空のキー（続く "- item" 行をリストとして受ける）
+    list_indent = None
+    for line in text.split("\n"):
+        stripped = line.strip()
+        if not stripped or stripped.startswith("#"):
+            continue
+        if "\t" in line:
+            raise _Unsupported
+
+        if list_key is not None:
+            m = _ITEM_RE.match(line)
+            if m:
+                indent = len(m.group(1))
+                if list_indent is None:
+                    list_indent = indent
+                elif indent != list_indent:
+                    raise _Unsupported
+                value = (m.group(2) or "").rstrip()
+                if not value:
+                    raise _Unsupported
+                if result[list_key] is None:
+                    result[list_key] = []
+                result[list_key].append(_scalar(value))
+                continue
+            list_key = None
+
+        m = _KEY_RE.match(line)
+        if not m:
+            raise _Unsupported
+        key = m.group(1)
+        if _resolver.resolve(ScalarNode, key, (True, False)) != _STR_TAG:
+            raise _Unsupported
+        value = (m.group(2) or "").rstrip()
+        if not value:
+            result[key] = None
+            list_key = key
+            list_indent = None
+        elif value[0] == "[":
+            if value[-1] != "]":
+                raise _Unsupported
+            result[key] = _flow_sequence(value)
+        else:
+            result[key] = _scalar(value)
+    return result
+
+
+def _find_block(content: str, complete: bool = True):
+    """frontmatterブロックを探し、(YAML部分, 本文の開始位置) を返す。
+
+    _BLOCK_RE と同じ位置を返す。先頭が "---\\n" で始まり直後が空白でない通常のケースはstr.findで探す。
+    complete=Falseの場合、contentはファイル先頭の一部とみなし、
+    続きを読まないと判定できなければ_INCOMPLETEを返す。
+    """
+    if not content.startswith("---\n") or len(content) < 5 or content[4].isspace():
+        if not complete:
+            return _INCOMPLETE
+        match = _BLOCK_RE.match(content)
+        return (match.group(1), match.end()) if match else None
+
+    start = 4
+    pos = start
+    while True:
+        j = content.find("\n---", pos)
+        if j < 0:
+            return None if complete else _INCOMPLETE
+        end = j + 4
+        # 閉じ側の "---" に続く空白（改行を含む場合は最後の改行まで）を消費する
+        k = end
+        last_newline = -1
+        while k < len(content) and content[k].isspace():
+            if content[k] == "\n":
+                last_newline = k
+            k += 1
+        if last_newline >= 0:
+            return content[start:j], last_newline + 1
+        if k == len(content) and not complete:
+            return _INCOMPLETE
+        if end == len(content):
+            return content[start:j], end
+        pos = j + 1
+
+
+def _parse_yaml(yaml_content: str):
+    """frontmatterのYAMLを読み込む（失敗時は例外）。結果はLRUで保持"""
+    with _cache_lock:
+        cached = _cache.get(yaml_content)
+        if cached is not None:
+            _cache.move_to_end(yaml_content)
+    if cached is not None:
+        # 呼び出し側で変更されても共有しないよう、リストはコピーして返す
+        return {k: list(v) if isinstance(v, list) else v for k, v in cached.items()}
+
+    try:
+        data = _parse_simple(yaml_content)
+    except _Unsupported:
+        data = yaml.load(yaml_content, Loader=_Loader)
+
+    # スカラーとスカラーのリストのみのものをキャッシュする
+    if isinstance(data, dict) and all(
+        not isinstance(v, (dict, set)) and not (isinstance(v, list) and any(isinstance(i, (dict, list)) for i in v))
+        for v in data.values()
+    ):
+        with _cache_lock:
+            _cache[yaml_content] = {k: list(v) if isinstance(v, list) else v for k, v in data.items()}
+            if len(_cache) > FRONTMATTER_CACHE_SIZE:
+                _cache.popitem(last=False)
+    return data
+
+
+def parse_frontmatter(content: str) -> tuple[dict, str]:
+    """ノート本文を (frontmatter, frontmatter除去後の本文) に分割する"""
+    frontmatter = {}
+    body = content
+    if content.startswith('\ufeff'):
+        content = content[1:]
+        body = content
+
+    content_normalized = content.replace('\r\n', '\n')
+
+    if content_normalized.lstrip().startswith("---"):
+        block = _find_block(content_normalized)
+        if block:
+            yaml_content, end = block
+            try:
+                frontmatter = _parse_yaml(yaml_content) or {}
+                body = content_normalized[end:]
+            except Exception:
+                pass
+    return frontmatter, body
+
+
+def read_frontmatter(path: Path) -> dict:
+    """ノートのfrontmatterのみを読み込む（本文は読まない）。
+
+    ファイル先頭から_READ_CHUNKずつ読み、閉じ側の "---" が確定した時点で打ち切る。
+    結果はテキストモードで全文を読んでparse_frontmatterに渡した場合と同じ。
+    FRONTMATTER_MAX_BYTES以内で確定しない場合や、先頭に空白・空行がある場合は全文を読む。
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    text = ""
+    size = 0
+    with open(path, "rb") as f:
+        while size <= FRONTMATTER_MAX_BYTES:
+            chunk = f.read(_READ_CHUNK)
+            size += len(chunk)
+            eof = not chunk
+            text += decoder.decode(chunk, final=eof)
+
+            # テキストモード（universal newlines）での読み込みと同じく改行を\nに揃える
+            header = text[1:] if text.startswith('\ufeff') else text
+            header = header.replace('\r\n', '\n').replace('\r', '\n')
+            stripped = header.lstrip()
+            if len(stripped) < 3 and not eof:
+                continue
+            if not stripped.startswith("---"):
+                return {}
+            if len(header) >= 5 and not (header.startswith("---\n") and not header[4].isspace()):
+                # 先頭に空白・空行があるなど、正規表現での判定が必要な場合は全文を読む
+                break
+
+            block = _find_block(header, complete=eof)
+            if block is _INCOMPLETE:
+                if eof:
+                    break
+                continue
+            if block is None:
+                return {}
+            try:
+                return _parse_yaml(block[0]) or {}
+            except Exception:
+                return {}
+
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        return parse_frontmatter(f.read())[0]
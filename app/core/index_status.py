@@ -0,0 +1,108 @@
+"""インデックスのライフサイクル状態（/healthz・/readyz で公開）
+
+起動時・フルリビルド時のフェーズと進捗（走査済みファイル数・ETA）を保持する。
+"""
+import threading
+import time
+
+from app.config import SERVE_STALE_ON_STARTUP
+
+PHASE_STARTING = "starting"
+PHASE_LOADING = "loading_snapshot"            # 永続化済みスナップショットの読み込み
+PHASE_REVALIDATING = "revalidating"           # 読み込んだスナップショットとの差分を再パース
+PHASE_SCANNING = "scanning"                   # Vault全体の走査・パース
+PHASE_INDEXING = "building_search_index"      # 全文検索インデックスの構築
+PHASE_READY = "ready"
+PHASE_FAILED = "failed"
+
+_PROGRESS_PHASES = (PHASE_REVALIDATING, PHASE_SCANNING)
+
+
+class IndexStatus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phase = PHASE_STARTING
+        self.serving: str | None = None  # None（未公開）/ "stale"（永続化済み）/ "fresh"
+        self.search_index_ready = False
+        self.files_total = 0
+        self.files_scanned = 0
+        self.error: str | None = None
+        self._started = time.monotonic()
+        self._phase_started = self._started
+
+    def set_phase(self, phase: str, files_total: int = 0) -> None:
+        with self._lock:
+            self.phase = phase
+            self.files_total = files_total
+            self.files_scanned = 0
+            self._phase_started = time.monotonic()
+            if phase != PHASE_FAILED:
+                self.error = None
+
+    def set_total(self, files_total: int) -> None:
+        """走査対象のファイル数を設定（走査系フェーズ中のみ）"""
+        with self._lock:
+            if self.phase in _PROGRESS_PHASES:
+                self.files_total = files_total
+
+    def advance(self, count: int) -> None:
+        """パース済みファイル数を加算（走査系フェーズ中のみ）"""
+        with self._lock:
+            if self.phase in _PROGRESS_PHASES:
+                self.files_scanned += count
+
+    def set_serving(self, serving: str, search_index_ready: bool) -> None:
+        with self._lock:
+            self.serving = serving
+            self.search_index_ready = search_index_ready
+
+    def fail(self, error: str) -> None:
+        with self._lock:
+            self.phase = PHASE_FAILED
+            self.error = error
+
+    def recover(self) -> None:
+        """失敗後にリフレッシュが成功した場合、readyに戻してエラーを消す"""
+        with self._lock:
+            if self.phase == PHASE_FAILED:
+                self.phase = PHASE_READY
+                self.error = None
+                self._phase_started = time.monotonic()
+
+    @property
+    def ready(self) -> bool:
+        """トラフィックを受けてよい状態か。
+
+        最新のスナップショットと検索インデックスが揃った時点でready。
+        SERVE_STALE_ON_STARTUPが有効な場合は永続化済みスナップショットの公開時点でready。
+        直近のリフレッシュが失敗した場合は、次にリフレッシュが成功するまでnot ready。
+        """
+        if self.phase == PHASE_FAILED:
+            return False
+        if self.serving == "fresh" and self.search_index_ready:
+            return True
+        return SERVE_STALE_ON_STARTUP and self.serving is not None
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            now = time.monotonic()
+            elapsed = now - self._phase_started
+            eta = None
+            if self.phase in _PROGRESS_PHASES and self.files_scanned and self.files_total:
+                remaining = max(0, self.files_total - self.files_scanned)
+                eta = round(elapsed / self.files_scanned * remaining, 1)
+            return {
+                "phase": self.phase,
+                "ready": self.ready,
+                "serving": self.serving,
+                "search_index_ready": self.search_index_ready,
+                "files_total": self.files_total,
+                "files_scanned": self.files_scanned,
+                "phase_elapsed_seconds": round(elapsed, 1),
+                "eta_seconds": eta,
+                "uptime_seconds": round(now - self._started, 1),
+                "error": self.error,
+            }
+
+
+index_status = IndexStatus()
@@ -1,36 +1,38 @@
 from pathlib import Path
+from array import array
+from bisect import bisect_left, insort
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
 import math
+import multiprocessing
 import re
-import yaml
 import os
 import logging
+import threading
 
 from datetime import datetime, timezone, timedelta
-from app.config import CONTENT_DIR, READING_SPEED_JP
+from app.config import CONTENT_DIR, INDEX_WORKERS, PARALLEL_INDEX_MIN_FILES, SNAPSHOT_SAVE_DELAY_SECONDS
 from app import cache
-from app.utils.slug import slugify_path
+from app.core.metadata_cache import load_metadata_cache, save_metadata_cache
+from app.core.search_segment import index_fingerprint, open_segment, write_segment
+from app.core.body_store import compress_body, start_segment
+from app.core.frontmatter import parse_frontmatter, read_frontmatter
+from app.core.index_status import (
+    PHASE_INDEXING, PHASE_LOADING, PHASE_READY, PHASE_REVALIDATING, PHASE_SCANNING, index_status,
+)
+from app.core.records import NoteRecord
+from app.utils.slug import save_slug_table, slugify_path
 
 logger = logging.getLogger("app.indexing")
 
-def parse_frontmatter(content: str) -> tuple[dict, str]:
-    frontmatter = {}
-    body = content
-    if content.startswith('\ufeff'):
-        content = content[1:]
-        body = content
-
-    content_normalized = content.replace('\r\n', '\n')
-
-    if content_normalized.strip().startswith("---"):
-        match = re.match(r'^\s*---\s*\n(.*?)\n---(?:\s*\n|$)', content_normalized, re.DOTALL)
-        if match:
-            yaml_content = match.group(1)
-            try:
-                frontmatter = yaml.safe_load(yaml_content) or {}
-                body = content_normalized[match.end():]
-            except Exception:
-                pass
-    return frontmatter, body
+# リフレッシュ処理の直列化（エディタ保存・同期・ファイル監視が同時に走る場合）
+_refresh_lock = threading.RLock()
+
+# スナップショットの永続化（書き出しの直列化・予約中のタイマー・書き出し済みの世代）
+_save_lock = threading.Lock()
+_save_timer_lock = threading.Lock()
+_save_timer: threading.Timer | None = None
+_saved_generation = -1
 
 def is_published(frontmatter: dict) -> bool:
     """frontmatterのpublishフィールドがTrueかどうかを判定します。"""
@@ -55,198 +57,403 @@ def parse_obsidian_date(date_str: str) -> datetime | None:
             continue
     return None
 
-def get_all_files(directory: Path, relative_to: Path) -> list[dict]:
-    files_list = []
-    
-    # Simple recursive walk
+_WIKILINK_RE = re.compile(r'\[\[([^\]\|#]+)')
+
+# シリアルパース時に進捗（index_status）を更新する間隔
+SERIAL_PROGRESS_CHUNK = 100
+
+
+def _build_note_record(full_path: Path, rel_path: Path, content: str, st: os.stat_result,
+                       content_hash: str | None = None) -> tuple[NoteRecord, str]:
+    """読み込み済みのノート本文から、ファイルキャッシュ用のレコードと本文(frontmatter除去済み)を生成"""
+    frontmatter, body = parse_frontmatter(content)
+
+    # Create preview (plain text, first 200 chars)
+    preview = re.sub(r'<[^>]+>', '', body) # strip HTML if any
+    preview = preview.replace('\n', ' ').strip()[:200]
+
+    title = frontmatter.get('title') or rel_path.stem
+    tags = frontmatter.get('tags')
+    if tags is None:
+        tags = []
+    elif isinstance(tags, str):
+        tags = [tags]
+
+    # Cleanup tags: remove leading '#' and whitespace
+    tags = [t.strip().lstrip('#') for t in tags if t and str(t).strip()]
+
+    # Check Visibility
+    published = is_published(frontmatter)
+
+    # マークアップ除去したプレーンテキスト（全文検索・読了時間用）
+    body_text = re.sub(r'<[^>]+>', '', body)
+    body_text = re.sub(r'!\[.*?\]\(.*?\)', '', body_text)
+    body_text = re.sub(r'\[([^\]]*)\]\(.*?\)', r'\1', body_text)
+    body_text = re.sub(r'[#*_~`>\-\|]', '', body_text)
+    body_text = body_text.strip()
+
+    record = NoteRecord(
+        path=str(rel_path).replace('\\', '/'),
+        title=title,
+        mtime_ns=st.st_mtime_ns,
+        tags=tags,
+        published=published,
+        frontmatter=frontmatter,
+        preview=preview,
+        body=compress_body(body_text),
+        char_count=len(body_text),
+        content_hash=content_hash,
+    )
+    return record, body
+
+
+def _file_order(f: NoteRecord) -> tuple[int, str]:
+    """ノート一覧の並び順のキー（更新日時の降順、同じ日時はパス順）"""
+    return (-f.mtime_ns, f.path)
+
+
+def _stat_key(st: os.stat_result) -> tuple[int, int]:
+    """変更検知用のキー (mtime_ns, size)"""
+    return (st.st_mtime_ns, st.st_size)
+
+
+def hash_content(data: bytes) -> str:
+    """ファイル内容のハッシュ（mtimeに依存しない変更検知用）"""
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+
+def _read_note(full_path: Path, rel_path: Path, st: os.stat_result) -> tuple[NoteRecord, list[str]]:
+    """ノートを1回だけ読み込み、レコードとwikilink名一覧を返す"""
+    with open(full_path, 'rb') as f:
+        data = f.read()
+    # テキストモードでの読み込みと同じく改行を\nに揃える
+    content = data.decode('utf-8', errors='replace').replace('\r\n', '\n').replace('\r', '\n')
+
+    record, body = _build_note_record(full_path, rel_path, content, st, hash_content(data))
+    return record, [l.strip() for l in _WIKILINK_RE.findall(body)]
+
+
+def _parse_notes_chunk(items: list[tuple[str, str]]) -> list[tuple | None]:
+    """ノート群を読み込み・パースする。
+
+    itemsは (絶対パス, 相対パス) の一覧。各要素について
+    (レコード, wikilink名一覧, statキー, None) を返し、読み込めなかったものはNone。
+    """
+    results = []
+    for full_path, rel_path in items:
+        full_path = Path(full_path)
+        try:
+            st = full_path.stat()
+            record, links = _read_note(full_path, Path(rel_path), st)
+        except OSError:
+            results.append(None)
+            continue
+        results.append((record, links, _stat_key(st), None))
+    return results
+
+
+def _parse_notes_shard(items: list[tuple[str, str]]) -> tuple[list[str], list[tuple | None]]:
+    """ProcessPoolExecutorのワーカー: _parse_notes_chunkに検索用のトークン化を加える。
+
+    戻り値は (語彙, 結果一覧)。結果のトークンは (本文, タイトル, パス) ごとの、シャード内の語彙の番号の
+    array('I')（トークン列のままでは語ごとに文字列がpickleされ、親プロセスでの復元が重くなるため）。
+    """
+    from app.core.search import tokenize
+
+    vocab: dict[str, int] = {}
+    results = []
+    for result in _parse_notes_chunk(items):
+        if result is not None:
+            record, links, stat_key, _ = result
+            tokens = tuple(
+                array('I', [vocab.setdefault(token, len(vocab)) for token in tokenize(text)])
+                for text in (record.body_text, record.title, record.path)
+            )
+            result = (record, links, stat_key, tokens)
+        results.append(result)
+    return list(vocab), results
+
+
+def _index_worker_count() -> int:
+    return INDEX_WORKERS if INDEX_WORKERS > 0 else (os.cpu_count() or 1)
+
+
+def _read_notes(items: list[tuple[Path, Path]]) -> list[tuple | None]:
+    """複数ノートを_parse_notesで読み込み・パースし、各レコードの本文をstore_body()でbody_storeへ移す。
+
+    戻り値は_parse_notesと同じ (レコード, wikilink名一覧, statキー, トークン) の一覧（読み込めなかったものはNone）。
+    """
+    results = _parse_notes(items)
+    for result in results:
+        if result is not None:
+            result[0].store_body()
+    return results
+
+
+def _parse_notes(items: list[tuple[Path, Path]]) -> list[tuple | None]:
+    """複数ノートを読み込み・パースする。
+
+    件数がPARALLEL_INDEX_MIN_FILES以上かつワーカー数が2以上の場合は
+    ProcessPoolExecutorでシャーディングし、検索用のトークン化もワーカー側で行う
+    （ワーカーから受け取ったシャード内の語彙の番号をトークン列に戻す）。
+    それ以外、または並列処理に失敗した場合はシリアルに処理する（トークンはNone）。
+    """
+    workers = _index_worker_count()
+    str_items = [(str(full_path), str(rel_path)) for full_path, rel_path in items]
+    if workers < 2 or len(items) < PARALLEL_INDEX_MIN_FILES:
+        return _parse_notes_serial(str_items)
+
+    # ワーカーあたり4シャード程度に分割して負荷の偏りを抑える
+    chunk_size = max(1, math.ceil(len(str_items) / (workers * 4)))
+    chunks = [str_items[i:i + chunk_size] for i in range(0, len(str_items), chunk_size)]
+
+    results = []
+    try:
+        ctx = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=ctx) as executor:
+            for vocab, chunk_result in executor.map(_parse_notes_shard, chunks):
+                for result in chunk_result:
+                    if result is not None:
+                        record, links, stat_key, tokens = result
+                        result = (record, links, stat_key, tuple([vocab[i] for i in ids] for ids in tokens))
+                    results.append(result)
+                index_status.advance(len(chunk_result))
+    except Exception as e:
+        logger.warning("Parallel parsing failed, falling back to serial: %s", e)
+        # 並列処理で数えた分の進捗を取り消してシリアルでやり直す
+        index_status.advance(-len(results))
+        return _parse_notes_serial(str_items)
+
+    logger.info("Parsed %d notes with %d worker processes.", len(items), workers)
+    return results
+
+
+def _parse_notes_serial(str_items: list[tuple[str, str]]) -> list[tuple | None]:
+    """シリアルにパースする（進捗を報告するためSERIAL_PROGRESS_CHUNK件ずつ）"""
+    results = []
+    for i in range(0, len(str_items), SERIAL_PROGRESS_CHUNK):
+        chunk_result = _parse_notes_chunk(str_items[i:i + SERIAL_PROGRESS_CHUNK])
+        results.extend(chunk_result)
+        index_status.advance(len(chunk_result))
+    return results
+
+
+def _walk_vault(directory: Path, relative_to: Path) -> tuple[list[tuple[Path, Path]], list[str]]:
+    """Vaultを走査し、(.mdの絶対パス, 相対パス) 一覧とディレクトリ一覧を返す"""
+    note_paths = []
+    dir_list = []
+
     for root, dirs, files in os.walk(directory):
+        rel_root = Path(root).relative_to(relative_to)
+        if str(rel_root) != '.':
+            dir_list.append(str(rel_root).replace('\\', '/'))
+
         for file in files:
             if file.endswith('.md'):
                 full_path = Path(root) / file
-                rel_path = full_path.relative_to(relative_to)
-                
-                mtime = datetime.fromtimestamp(full_path.stat().st_mtime)
-                
-                with open(full_path, 'r', encoding='utf-8', errors='replace') as f:
-                    content = f.read()
-                
-                frontmatter, body = parse_frontmatter(content)
-                
-                # Create preview (plain text, first 200 chars)
-                preview = re.sub(r'<[^>]+>', '', body) # strip HTML if any
-                preview = preview.replace('\n', ' ').strip()[:200]
-                
-                title = frontmatter.get('title') or rel_path.stem
-                tags = frontmatter.get('tags')
-                if tags is None:
-                    tags = []
-                elif isinstance(tags, str):
-                    tags = [tags]
-                
-                # Cleanup tags: remove leading '#' and whitespace
-                tags = [t.strip().lstrip('#') for t in tags if t and str(t).strip()]
-                
-                # Check Visibility
-                published = is_published(frontmatter)
-
-                # マークアップ除去したプレーンテキスト（全文検索・読了時間用）
-                body_text = re.sub(r'<[^>]+>', '', body)
-                body_text = re.sub(r'!\[.*?\]\(.*?\)', '', body_text)
-                body_text = re.sub(r'\[([^\]]*)\]\(.*?\)', r'\1', body_text)
-                body_text = re.sub(r'[#*_~`>\-\|]', '', body_text)
-                body_text = body_text.strip()
-
-                # 読了時間の算出
-                char_count = len(body_text)
-                reading_time = max(1, math.ceil(char_count / READING_SPEED_JP))
-
-                files_list.append({
-                    "name": file,
-                    "path": str(rel_path).replace('\\', '/'),
-                    "title": title,
-                    "mtime": mtime,
-                    "updated": mtime.strftime("%Y-%m-%d %H:%M"),
-                    "tags": tags,
-                    "published": published,
-                    "frontmatter": frontmatter,
-                    "preview": preview,
-                    "body_text": body_text,
-                    "char_count": char_count,
-                    "reading_time": reading_time
-                })
-    
+                note_paths.append((full_path, full_path.relative_to(relative_to)))
+
+    return note_paths, dir_list
+
+
+def scan_vault(directory: Path, relative_to: Path) -> tuple[list[NoteRecord], list[str], dict[str, list[str]], dict[str, tuple[int, int]], dict[str, tuple]]:
+    """Vaultを1回だけ走査し、各ノートを1度だけ読み込み・パースする。
+
+    戻り値は (ファイルレコード一覧, ディレクトリ一覧, {path: [wikilink名]}, {path: (mtime_ns, size)},
+    {path: 検索用トークン})。トークンは並列パース時のみ格納される。
+    ファイルツリー・バックリンク・検索インデックスはすべてこの結果から構築する。
+    """
+    files_list = []
+    links_by_path = {}
+    stats = {}
+    tokens_by_path = {}
+
+    note_paths, dir_list = _walk_vault(directory, relative_to)
+    index_status.set_total(len(note_paths))
+    for result in _read_notes(note_paths):
+        if result is None:
+            continue
+        record, links, stat_key, tokens = result
+        files_list.append(record)
+        links_by_path[record["path"]] = links
+        stats[record["path"]] = stat_key
+        if tokens is not None:
+            tokens_by_path[record["path"]] = tokens
+
     # Sort by mtime descending
-    files_list.sort(key=lambda x: x['mtime'], reverse=True)
+    files_list.sort(key=_file_order)
+    return files_list, dir_list, links_by_path, stats, tokens_by_path
+
+
+def stat_vault(directory: Path, relative_to: Path) -> tuple[dict[str, tuple[int, int]], list[str]]:
+    """ファイルを開かずにstatのみでVaultの現状を取得（差分リフレッシュ用）"""
+    stats = {}
+    note_paths, dir_list = _walk_vault(directory, relative_to)
+    for full_path, rel_path in note_paths:
+        try:
+            stats[str(rel_path).replace('\\', '/')] = _stat_key(full_path.stat())
+        except OSError:
+            continue
+    return stats, dir_list
+
+
+def get_all_files(directory: Path, relative_to: Path) -> list[NoteRecord]:
+    files_list, _, _, _, _ = scan_vault(directory, relative_to)
     return files_list
 
-def get_file_tree(directory: Path, relative_to: Path, published_only: bool = False) -> list[dict]:
+
+def _tree_order(node: dict) -> tuple[int, str, str]:
+    """ツリーの各階層の並び順のキー（フォルダが先、タイトル・名前順、同名はパス順）"""
+    return (0 if node['type'] == 'directory' else 1,
+            node['title'].lower() if 'title' in node else node['name'].lower(), node['path'])
+
+
+def _parent_dir(path: str) -> str:
+    """相対パスの親ディレクトリ（""はルート）"""
+    return path.rpartition('/')[0]
+
+
+def build_file_tree(files: list[NoteRecord], dirs: list[str], published_only: bool = False) -> list[dict]:
+    """スキャン済みのファイルレコードからツリーを構築（ファイルの再読み込みなし）"""
     tree = []
-    
-    # Helper to find or create folder in tree
-    def get_folder(parent_list, folder_name):
-        for item in parent_list:
-            if item['type'] == 'directory' and item['name'] == folder_name:
-                return item
-        new_folder = {"name": folder_name, "type": "directory", "children": []}
-        parent_list.append(new_folder)
-        return new_folder
+    # {相対ディレクトリ: childrenリスト}。兄弟ノードの線形探索を避ける
+    folders = {"": tree}
 
-    for root, dirs, files in os.walk(directory):
-        rel_root = Path(root).relative_to(relative_to)
-        
-        # Build path to this folder in our tree
-        current_level = tree
-        if str(rel_root) != '.':
-            parts = rel_root.parts
-            for part in parts:
-                folder = get_folder(current_level, part)
-                current_level = folder['children']
-        
-        for file in files:
-            if file.endswith('.md'):
-                full_path = Path(root) / file
-                rel_path = full_path.relative_to(relative_to)
-                
-                # Check metadata for title/published
-                with open(full_path, 'r', encoding='utf-8', errors='replace') as f:
-                    content = f.read()
-                
-                frontmatter, _ = parse_frontmatter(content)
-                
-                # Filter if published_only
-                if published_only and not is_published(frontmatter):
-                    continue
-
-                title = frontmatter.get('title') or rel_path.stem
-                current_level.append({
-                    "name": file,
-                    "title": title,
-                    "path": str(rel_path).replace('\\', '/'),
-                    "type": "file"
-                })
+    def get_level(rel_dir):
+        level = folders.get(rel_dir)
+        if level is None:
+            parent, _, name = rel_dir.rpartition('/')
+            level = []
+            get_level(parent).append({"name": name, "path": rel_dir, "type": "directory", "children": level})
+            folders[rel_dir] = level
+        return level
+
+    # 空フォルダもツリーに含める（従来のos.walkベースの挙動を維持）
+    for rel_dir in dirs:
+        get_level(rel_dir)
+
+    for f in files:
+        # Filter if published_only
+        if published_only and not f["published"]:
+            continue
+
+        rel_dir = f["path"].rsplit('/', 1)[0] if '/' in f["path"] else ''
+        get_level(rel_dir).append({
+            "name": f["name"],
+            "title": f["title"],
+            "path": f["path"],
+            "type": "file"
+        })
 
     # Sort tree (folders first, then alphabetical)
     def sort_tree(node_list):
-        node_list.sort(key=lambda x: (0 if x['type'] == 'directory' else 1, x['title'].lower() if 'title' in x else x['name'].lower()))
+        node_list.sort(key=_tree_order)
         for item in node_list:
             if item['type'] == 'directory':
                 sort_tree(item['children'])
-    
+
     sort_tree(tree)
     return tree
 
-def _build_backlink_cache() -> None:
-    """全ファイルの[[wikilink]]を解析し、バックリンクとフォワードリンクのキャッシュを構築"""
-    backlinks = {}   # {target_path: [{title, path}]}
-    forward = {}     # {source_path: [target_path]}
-    wikilink_re = re.compile(r'\[\[([^\]\|#]+)')
 
-    for f in cache.GLOBAL_FILE_CACHE:
-        source_path = f["path"]
-        source_title = f["title"]
+def index_folders(tree: list[dict]) -> dict[str, list[dict]]:
+    """ツリーから {相対ディレクトリ: 直下のノード一覧} を作成（""はルート）。
+    ノードはツリーと共有するため、1階層分の取得がO(1)になる"""
+    folders = {"": tree}
+    stack = [tree]
+    while stack:
+        for node in stack.pop():
+            if node["type"] == "directory":
+                folders[node["path"]] = node["children"]
+                stack.append(node["children"])
+    return folders
 
-        # ファイルを読み込んでwikilinkを抽出
-        full_path = CONTENT_DIR / source_path
-        if not full_path.exists():
-            continue
 
+def get_file_tree(directory: Path, relative_to: Path, published_only: bool = False) -> list[dict]:
+    """Vaultを走査してツリーを構築する。
+
+    ツリーにはタイトルと公開状態のみが必要なため、各ノートはfrontmatterのみを読み込む（本文は読まない）。
+    """
+    note_paths, dir_list = _walk_vault(directory, relative_to)
+    entries = []
+    for full_path, rel_path in note_paths:
         try:
-            with open(full_path, 'r', encoding='utf-8', errors='replace') as fh:
-                content = fh.read()
-        except Exception:
+            st = full_path.stat()
+            frontmatter = read_frontmatter(full_path)
+        except OSError:
             continue
+        path = str(rel_path).replace('\\', '/')
+        entries.append((st.st_mtime_ns, {
+            "name": rel_path.name,
+            "title": frontmatter.get('title') or rel_path.stem,
+            "path": path,
+            "published": is_published(frontmatter),
+        }))
 
-        _, body = parse_frontmatter(content)
-        links = wikilink_re.findall(body)
-        resolved_targets = []
+    # scan_vaultと同じく更新日時の降順
+    entries.sort(key=lambda x: (-x[0], x[1]["path"]))
+    return build_file_tree([entry for _, entry in entries], dir_list, published_only)
+
+
+def _resolve_links(source_path: str, link_names, file_names: dict[str, str]) -> set[str]:
+    """wikilink名をfile_namesで解決したリンク先のパス（自身へのリンクを除く）"""
+    targets = set()
+    for link_name in link_names:
+        target_path = file_names.get(link_name)
+        if target_path and target_path != source_path:
+            targets.add(target_path)
+    return targets
+
+
+def _backlink_entry(f: NoteRecord, path_to_slug: dict[str, str]) -> dict:
+    return {"title": f["title"], "path": f["path"], "slug": path_to_slug.get(f["path"], f["path"])}
+
+
+def _build_backlinks(files: list[NoteRecord], links_by_path: dict[str, list[str]], file_names: dict[str, str],
+                     path_to_slug: dict[str, str]) -> tuple[dict, dict]:
+    """スキャン時に抽出した[[wikilink]]から、バックリンクとフォワードリンクのマップを構築"""
+    backlinks = {}   # {target_path: [{title, path, slug}]} リンク元はfilesの並び順
+    forward = {}     # {source_path: [target_path]}
+
+    for f in files:
+        source_path = f["path"]
+        # リンク先は集合で重複を除く（同じノートへの複数のリンクはバックリンク1件）
+        targets = _resolve_links(source_path, links_by_path.get(source_path, ()), file_names)
+        for target_path in targets:
+            backlinks.setdefault(target_path, []).append(_backlink_entry(f, path_to_slug))
+        forward[source_path] = list(targets)
 
-        for link_name in links:
-            link_name = link_name.strip()
-            # FILE_NAME_CACHEで解決
-            target_path = cache.FILE_NAME_CACHE.get(link_name)
-            if target_path and target_path != source_path:
-                resolved_targets.append(target_path)
-                # バックリンクに追加
-                if target_path not in backlinks:
-                    backlinks[target_path] = []
-                # 重複チェック
-                if not any(bl["path"] == source_path for bl in backlinks[target_path]):
-                    backlinks[target_path].append({
-                        "title": source_title,
-                        "path": source_path,
-                        "slug": cache.PATH_TO_SLUG.get(source_path, source_path)
-                    })
-
-        forward[source_path] = list(set(resolved_targets))
-
-    cache.BACKLINK_CACHE = backlinks
-    cache.FORWARD_LINK_CACHE = forward
     logger.info("Backlink cache built: %d files with backlinks.", len(backlinks))
+    return backlinks, forward
 
 
-def refresh_global_caches() -> None:
-    # Clear per-file caches on full refresh
-    cache.IMAGE_PATH_CACHE = {}
-    cache.MARKDOWN_CACHE = {}
-    
-    # Refresh all files metadata
-    cache.GLOBAL_FILE_CACHE = get_all_files(CONTENT_DIR, CONTENT_DIR)
-    # Refresh tree views (Admin: all, Public: published only)
-    cache.GLOBAL_FILE_TREE_CACHE = get_file_tree(CONTENT_DIR, CONTENT_DIR, published_only=False)
-    cache.GLOBAL_FILE_TREE_CACHE_PUBLIC = get_file_tree(CONTENT_DIR, CONTENT_DIR, published_only=True)
-
-    # ファイル名(stem) → パスの逆引きマッピングを構築
-    cache.FILE_NAME_CACHE = {}
-    for f in cache.GLOBAL_FILE_CACHE:
-        stem = Path(f["name"]).stem
-        # 同名ファイルが複数ある場合は最初のものを優先（Obsidianの最短パス解決に近い動作）
-        if stem not in cache.FILE_NAME_CACHE:
-            cache.FILE_NAME_CACHE[stem] = f["path"]
-
-    # スラッグマッピングの構築
-    slug_to_path = {}
-    path_to_slug = {}
-    for f in cache.GLOBAL_FILE_CACHE:
+def _build_linked_from(links_by_path: dict[str, list[str]]) -> dict[str, frozenset[str]]:
+    """{wikilink名: リンク元のパス} の逆引き（未解決のリンクを含む）"""
+    linked_from: dict[str, set[str]] = {}
+    for source_path, links in links_by_path.items():
+        for link_name in links:
+            linked_from.setdefault(link_name, set()).add(source_path)
+    return {link_name: frozenset(sources) for link_name, sources in linked_from.items()}
+
+
+def _stem(path: str) -> str:
+    return Path(path).stem
+
+
+def _build_file_name_cache(files: list[NoteRecord]) -> tuple[dict[str, str], dict[str, list[str]]]:
+    """ファイル名(stem) → パスの逆引きマッピングと、stemごとの同名ノートの一覧を構築"""
+    stem_paths = {}
+    for f in files:
+        stem_paths.setdefault(_stem(f["path"]), []).append(f["path"])
+    # 同名ファイルが複数ある場合は最初のもの（更新日時が最新のもの）を優先（Obsidianの最短パス解決に近い動作）
+    file_names = {stem: paths[0] for stem, paths in stem_paths.items()}
+    return file_names, stem_paths
+
+
+def _assign_slug(f: NoteRecord, slug_to_path: dict[str, str], path_to_slug: dict[str, str]) -> None:
+    """ノートにスラッグを設定する。未割り当てのパスは既存のスラッグと重複しないものを割り当てる"""
+    slug = path_to_slug.get(f["path"])
+    if slug is None:
         base_slug = slugify_path(f["path"])
         slug = base_slug
         counter = 2
@@ -255,10 +462,77 @@ def refresh_global_caches() -> None:
             counter += 1
         slug_to_path[slug] = f["path"]
         path_to_slug[f["path"]] = slug
-        f["slug"] = slug
+    f.slug = slug
 
-    cache.SLUG_TO_PATH = slug_to_path
-    cache.PATH_TO_SLUG = path_to_slug
+
+def _assign_slugs(files: list[NoteRecord], previous: dict[str, str]) -> tuple[dict[str, str], dict[str, str]]:
+    """スラッグマッピングを構築。previousに存在するパスは既存のスラッグを維持する"""
+    slug_to_path = {}
+    path_to_slug = {}
+
+    # 既存ノートのスラッグを先に確定させ、差分更新でURLが変わらないようにする
+    for f in files:
+        slug = previous.get(f["path"])
+        if slug is not None:
+            slug_to_path[slug] = f["path"]
+            path_to_slug[f["path"]] = slug
+
+    for f in files:
+        _assign_slug(f, slug_to_path, path_to_slug)
+
+    return slug_to_path, path_to_slug
+
+
+def _visibility(f: NoteRecord) -> str:
+    return "public" if f["published"] else "private"
+
+
+def _build_listings(files: list[NoteRecord]) -> tuple[dict[str, dict[str, list[NoteRecord]]], dict[str, dict[str, int]]]:
+    """一覧ページ用のビューを構築。
+
+    visibility ("all" / "public" / "private") ごとに {tag: [レコード]}（filesの並び順=mtime降順を維持、
+    tag=""は全件）と {tag: 件数} を返す。
+    """
+    listings = {"all": {"": files}, "public": {"": []}, "private": {"": []}}
+    for f in files:
+        visibility = _visibility(f)
+        listings[visibility][""].append(f)
+        for tag in dict.fromkeys(f["tags"]):
+            listings["all"].setdefault(tag, []).append(f)
+            listings[visibility].setdefault(tag, []).append(f)
+
+    tag_counts = {
+        visibility: {tag: len(tagged) for tag, tagged in views.items() if tag}
+        for visibility, views in listings.items()
+    }
+    return listings, tag_counts
+
+
+def _invalidate_rendered(changed_paths: set[str], changed_stems: set[str],
+                         linked_from: dict[str, frozenset[str]]) -> None:
+    """差分更新の影響を受けるレンダリング済みHTMLのみをMARKDOWN_CACHEから破棄。
+
+    変更ノートと、解決先が変わったstemへのリンク（[[stem]] / [[stem.md]]）を持つノートが対象。
+    Dataviewを含むノートはエントリ側の世代番号で無効化されるためここでは扱わない。
+    """
+    for path in changed_paths:
+        cache.MARKDOWN_CACHE.pop(path, None)
+    for stem in changed_stems:
+        for link_name in (stem, stem + ".md"):
+            for source_path in linked_from.get(link_name, ()):
+                cache.MARKDOWN_CACHE.pop(source_path, None)
+
+
+def _build_snapshot(files: list[NoteRecord], dirs: list[str], links_by_path: dict[str, list[str]],
+                    stats: dict[str, tuple[int, int]], previous_slugs: dict[str, str],
+                    search_index) -> cache.VaultSnapshot:
+    """レコードから派生データ（ツリー・スラッグ・リンク）を構築し、次世代のスナップショットを返す"""
+    file_names, stem_paths = _build_file_name_cache(files)
+    slug_to_path, path_to_slug = _assign_slugs(files, previous_slugs)
+
+    # Refresh tree views (Admin: all, Public: published only)
+    tree = build_file_tree(files, dirs, published_only=False)
+    tree_public = build_file_tree(files, dirs, published_only=True)
 
     # ファイルツリーにもスラッグを付与
     def _apply_slug_to_tree(nodes):
@@ -267,16 +541,608 @@ def refresh_global_caches() -> None:
                 node["slug"] = path_to_slug.get(node.get("path", ""), "")
             elif node["type"] == "directory":
                 _apply_slug_to_tree(node.get("children", []))
-    _apply_slug_to_tree(cache.GLOBAL_FILE_TREE_CACHE)
-    _apply_slug_to_tree(cache.GLOBAL_FILE_TREE_CACHE_PUBLIC)
+    _apply_slug_to_tree(tree)
+    _apply_slug_to_tree(tree_public)
+
+    folders = index_folders(tree)
+    folders_public = index_folders(tree_public)
+
+    # バックリンクの構築
+    backlinks, forward = _build_backlinks(files, links_by_path, file_names, path_to_slug)
+
+    # 一覧ページ・タグクラウド用のビュー
+    listings, tag_counts = _build_listings(files)
+
+    return cache.VaultSnapshot(
+        generation=cache.get_snapshot().generation + 1,
+        files=files,
+        records={f["path"]: f for f in files},
+        published_paths=frozenset(f["path"] for f in files if f["published"]),
+        listings=listings,
+        tag_counts=tag_counts,
+        all_tags=sorted(tag_counts["all"]),
+        file_tree=tree,
+        file_tree_public=tree_public,
+        folders=folders,
+        folders_public=folders_public,
+        file_names=file_names,
+        stem_paths=stem_paths,
+        backlinks=backlinks,
+        forward_links=forward,
+        search_index=search_index,
+        slug_to_path=slug_to_path,
+        path_to_slug=path_to_slug,
+        wikilinks=links_by_path,
+        linked_from=_build_linked_from(links_by_path),
+        stats=stats,
+        dirs=dirs,
+    )
+
+
+def _merge_sorted(records, removed: list[NoteRecord], added: list[NoteRecord]) -> list[NoteRecord]:
+    """_file_order順のレコード一覧からremoved（前回のレコード）を除き、addedを挿入した新しいリスト。
+    一覧にないremovedのレコードは無視する"""
+    merged = list(records)
+    for f in removed:
+        i = bisect_left(merged, _file_order(f), key=_file_order)
+        if i < len(merged) and merged[i].path == f.path:
+            del merged[i]
+    for f in added:
+        insort(merged, f, key=_file_order)
+    return merged
+
+
+def _in_listing(f: NoteRecord, visibility: str, tag: str) -> bool:
+    return (visibility == "all" or visibility == _visibility(f)) and (not tag or tag in f.tags)
+
 
-    # バックリンクキャッシュの構築
-    _build_backlink_cache()
+def _patch_listings(old: cache.VaultSnapshot, files: list[NoteRecord], gone: list[NoteRecord],
+                    added: list[NoteRecord]) -> tuple[dict, dict, list[str]]:
+    """一覧ページ用のビューのうち、変更ノート（gone: 前回のレコード、added: 新しいレコード）の
+    visibility・タグのものだけを作り直す。戻り値は (listings, tag_counts, all_tags)"""
+    listings = {visibility: dict(views) for visibility, views in old.listings.items()}
+    tag_counts = {visibility: dict(counts) for visibility, counts in old.tag_counts.items()}
+    keys = set()
+    for f in gone + added:
+        for visibility in ("all", _visibility(f)):
+            keys.add((visibility, ""))
+            keys.update((visibility, tag) for tag in f.tags)
 
-    # TF-IDF検索インデックスの構築
+    for visibility, tag in keys:
+        if visibility == "all" and not tag:
+            tagged = files
+        else:
+            tagged = _merge_sorted(old.listings[visibility].get(tag, ()),
+                                   [f for f in gone if _in_listing(f, visibility, tag)],
+                                   [f for f in added if _in_listing(f, visibility, tag)])
+        if not tag:
+            listings[visibility][tag] = tagged
+        elif tagged:
+            listings[visibility][tag] = tagged
+            tag_counts[visibility][tag] = len(tagged)
+        else:
+            listings[visibility].pop(tag, None)
+            tag_counts[visibility].pop(tag, None)
+
+    all_tags = old.all_tags
+    if tag_counts["all"].keys() != old.tag_counts["all"].keys():
+        all_tags = sorted(tag_counts["all"])
+    return listings, tag_counts, all_tags
+
+
+def _patch_tree(folders: dict[str, list[dict]], gone: set[str], added: dict[str, list[dict]],
+                new_dirs: set[str], removed_dirs: set[str]) -> tuple[list[dict], dict[str, list[dict]]]:
+    """ツリーのうち、変更のあった階層とその祖先の階層のみを作り直す（Copy-on-Write）。
+
+    foldersは前回のツリーの階層索引。gone: 取り除くファイルノードのパス /
+    added: {相対ディレクトリ: 追加するファイルノード} / new_dirs・removed_dirs: 追加・削除するディレクトリ。
+    作り直さない階層のリストは前回のツリーと共有する。戻り値は (ツリー, 階層索引)。
+    """
+    folders = dict(folders)
+    for rel_dir in removed_dirs:
+        folders.pop(rel_dir, None)
+
+    levels = set(added) | new_dirs | {_parent_dir(path) for path in gone | removed_dirs}
+    for rel_dir in list(levels):
+        while rel_dir:
+            rel_dir = _parent_dir(rel_dir)
+            levels.add(rel_dir)
+    levels -= removed_dirs
+
+    # 深い階層から作り直し、親の階層では作り直したディレクトリのノードを差し替える
+    replaced_dirs = removed_dirs | levels
+    rebuilt: dict[str, list[str]] = {}  # {相対ディレクトリ: 作り直した子ディレクトリ}
+    for rel_dir in sorted(levels, key=lambda d: d.count('/') if d else -1, reverse=True):
+        children = [
+            node for node in folders.get(rel_dir, ())
+            if node["path"] not in (gone if node["type"] == "file" else replaced_dirs)
+        ]
+        children += added.get(rel_dir, ())
+        children += [
+            {"name": child.rpartition('/')[2], "path": child, "type": "directory", "children": folders[child]}
+            for child in rebuilt.get(rel_dir, ())
+        ]
+        children.sort(key=_tree_order)
+        folders[rel_dir] = children
+        if rel_dir:
+            rebuilt.setdefault(_parent_dir(rel_dir), []).append(rel_dir)
+    return folders[""], folders
+
+
+def _patch_links(old: cache.VaultSnapshot, records: dict[str, NoteRecord], relink: set[str], deleted: set[str],
+                 links_by_path: dict[str, list[str]], file_names: dict[str, str],
+                 path_to_slug: dict[str, str]) -> tuple[dict, dict]:
+    """relinkのノートのリンクを解決し直し、deletedのノートのリンクを取り除いたバックリンク・フォワードリンク。
+    作り直すのは対象ノートの前回・今回のリンク先のバックリンクのみ"""
+    backlinks = dict(old.backlinks)
+    forward = dict(old.forward_links)
+    leaving = relink | deleted
+    targets = set()
+    for source_path in leaving:
+        targets.update(forward.pop(source_path, ()))
+
+    incoming: dict[str, list[str]] = {}
+    for source_path in relink:
+        resolved = _resolve_links(source_path, links_by_path.get(source_path, ()), file_names)
+        forward[source_path] = list(resolved)
+        for target_path in resolved:
+            incoming.setdefault(target_path, []).append(source_path)
+    targets |= incoming.keys()
+
+    for target_path in targets:
+        entries = [entry for entry in backlinks.get(target_path, ()) if entry["path"] not in leaving]
+        sources = incoming.get(target_path)
+        if sources:
+            entries += [_backlink_entry(records[source_path], path_to_slug) for source_path in sources]
+            entries.sort(key=lambda entry: _file_order(records[entry["path"]]))
+        if entries:
+            backlinks[target_path] = entries
+        else:
+            backlinks.pop(target_path, None)
+    return backlinks, forward
+
+
+def _patch_snapshot(old: cache.VaultSnapshot, changed: dict[str, NoteRecord], removed: set[str], dirs: list[str],
+                    links_by_path: dict[str, list[str]], stats: dict[str, tuple[int, int]],
+                    search_index) -> tuple[cache.VaultSnapshot, set[str]]:
+    """前回のスナップショットに変更ノートのみを反映した次世代のスナップショットを返す。
+
+    changedは追加・変更したノートの新しいレコード、removedは削除したパス。
+    派生データ（一覧・ツリー・スラッグ・file_names・リンク）は変更ノートに関係する部分のみを作り直し、
+    それ以外は前回のスナップショットと共有する。結果は_build_snapshotでのフルビルドと同じになる。
+    戻り値は (スナップショット, file_namesの解決先が変わったstem)。
+    """
+    old_records = old.records
+    gone = {path for path in removed | changed.keys() if path in old_records}
+    deleted = gone - changed.keys()
+    records = dict(old_records)
+    for path in deleted:
+        del records[path]
+    records.update(changed)
+    added = sorted(changed.values(), key=_file_order)
+    files = _merge_sorted(old.files, [old_records[path] for path in gone], added)
+
+    # スラッグ（既存ノートのスラッグは維持する）
+    slug_to_path = dict(old.slug_to_path)
+    path_to_slug = dict(old.path_to_slug)
+    for path in deleted:
+        slug_to_path.pop(path_to_slug.pop(path, None), None)
+    for f in added:
+        _assign_slug(f, slug_to_path, path_to_slug)
+
+    # file_names: 変更ノートのstemのみ、同名ノートのうち並び順で先頭のものを選び直す
+    file_names = dict(old.file_names)
+    stem_paths = dict(old.stem_paths)
+    stems = set()
+    for path in gone:
+        stem = _stem(path)
+        stems.add(stem)
+        stem_paths[stem] = [p for p in stem_paths[stem] if p != path]
+    for path in changed:
+        stem = _stem(path)
+        stems.add(stem)
+        stem_paths[stem] = stem_paths.get(stem, []) + [path]
+    for stem in stems:
+        if stem_paths[stem]:
+            file_names[stem] = min(stem_paths[stem], key=lambda p: _file_order(records[p]))
+        else:
+            del stem_paths[stem]
+            file_names.pop(stem, None)
+    changed_stems = {stem for stem in stems if old.file_names.get(stem) != file_names.get(stem)}
+
+    linked_from = dict(old.linked_from)
+    for path in gone:
+        for link_name in set(old.wikilinks.get(path, ())):
+            sources = linked_from[link_name] - {path}
+            if sources:
+                linked_from[link_name] = sources
+            else:
+                del linked_from[link_name]
+    for path in changed:
+        for link_name in set(links_by_path.get(path, ())):
+            linked_from[link_name] = linked_from.get(link_name, frozenset()) | {path}
+
+    # リンクを解決し直すノート: 変更ノートと、解決先が変わったstemへのリンクを持つノート
+    relink = set(changed)
+    for stem in changed_stems:
+        relink |= linked_from.get(stem, frozenset())
+    backlinks, forward = _patch_links(old, records, relink, deleted, links_by_path, file_names, path_to_slug)
+
+    listings, tag_counts, all_tags = _patch_listings(old, files, [old_records[path] for path in gone], added)
+
+    # ツリー（公開ノートのみのツリーも同じディレクトリ構成）
+    nodes: dict[str, list[dict]] = {}
+    nodes_public: dict[str, list[dict]] = {}
+    for f in added:
+        node = {"name": f.name, "title": f.title, "path": f.path, "type": "file", "slug": f.slug}
+        nodes.setdefault(_parent_dir(f.path), []).append(node)
+        if f.published:
+            nodes_public.setdefault(_parent_dir(f.path), []).append(dict(node))
+    old_dirs, new_dirs = set(old.dirs), set(dirs)
+    tree, folders = _patch_tree(old.folders, gone, nodes, new_dirs - old_dirs, old_dirs - new_dirs)
+    tree_public, folders_public = _patch_tree(old.folders_public, gone, nodes_public,
+                                              new_dirs - old_dirs, old_dirs - new_dirs)
+
+    snapshot = cache.VaultSnapshot(
+        generation=old.generation + 1,
+        files=files,
+        records=records,
+        published_paths=(old.published_paths - gone) | {f.path for f in added if f.published},
+        listings=listings,
+        tag_counts=tag_counts,
+        all_tags=all_tags,
+        file_tree=tree,
+        file_tree_public=tree_public,
+        folders=folders,
+        folders_public=folders_public,
+        file_names=file_names,
+        stem_paths=stem_paths,
+        backlinks=backlinks,
+        forward_links=forward,
+        search_index=search_index,
+        slug_to_path=slug_to_path,
+        path_to_slug=path_to_slug,
+        wikilinks=links_by_path,
+        linked_from=linked_from,
+        stats=stats,
+        dirs=dirs,
+    )
+    return snapshot, changed_stems
+
+
+def _apply_stat_diff(stats: dict[str, tuple[int, int]], dirs: list[str],
+                     force: set[str] | None = None, candidates: list[str] | None = None) -> bool:
+    """前回スナップショットとの差分（追加・変更・削除）のみを再パース・再インデックスする。
+
+    mtime/sizeが変わったノート（およびforceのノート）を読み込み、内容のハッシュが
+    前回と同じもの（同期でのコピーやtouchのみ）は検索インデックス・レンダリング結果を再利用する。
+    candidatesを指定した場合は、そのパスのみを差分の対象とする（変更箇所が分かっている場合）。
+    変更があった場合はTrueを返す。
+    """
+    old = cache.get_snapshot()
+    prev_stats = old.stats
+    force = force or set()
+
+    if candidates is None:
+        added = [p for p in stats if p not in prev_stats]
+        modified = [p for p in stats if p in prev_stats and (stats[p] != prev_stats[p] or p in force)]
+        removed = [p for p in prev_stats if p not in stats]
+    else:
+        candidates = list(dict.fromkeys(candidates))
+        added = [p for p in candidates if p in stats and p not in prev_stats]
+        modified = [p for p in candidates
+                    if p in stats and p in prev_stats and (stats[p] != prev_stats[p] or p in force)]
+        removed = [p for p in candidates if p in prev_stats and p not in stats]
+
+    if not (added or modified or removed) and dirs == old.dirs:
+        logger.info("Incremental refresh: no changes.")
+        return False
+
+    old_records = old.records
+    links_by_path = dict(old.wikilinks)
+    stats = dict(stats)
+    for path in removed:
+        links_by_path.pop(path, None)
+
+    changed_records = {}
+    updated = []
+    identical = 0
+    tokens_by_path = {}
+    changed = added + modified
+    index_status.set_total(len(changed))
+    results = _read_notes([(CONTENT_DIR / path, Path(path)) for path in changed])
+    for path, result in zip(changed, results):
+        if result is None:
+            # 走査後に削除された場合
+            logger.debug("Note vanished during incremental refresh: %s", path)
+            links_by_path.pop(path, None)
+            stats.pop(path, None)
+            removed.append(path)
+            continue
+        record, links, stat_key, tokens = result
+        changed_records[path] = record
+        links_by_path[path] = links
+        stats[path] = stat_key
+        old_record = old_records.get(path)
+        if old_record is not None and old_record.content_hash == record.content_hash:
+            identical += 1
+            continue
+        updated.append(record)
+        if tokens is not None:
+            tokens_by_path[path] = tokens
+
+    # 検索インデックスは公開中のものを複製し、変更ノートのみ差し替える
+    idx = old.search_index.clone() if old.search_index is not None else None
+    if idx is not None:
+        with idx.batch():
+            for path in removed:
+                if path in old_records:
+                    idx.remove_document(old_records[path])
+            for record in updated:
+                old_record = old_records.get(record["path"])
+                if old_record is not None:
+                    idx.update_document(old_record, record, tokens_by_path.get(record["path"]))
+                else:
+                    idx.add_document(record, tokens_by_path.get(record["path"]))
+        # 削除の積み重ねで欠番が増えたら、リフレッシュワーカー上で詰め直してから公開する
+        if idx.needs_compaction():
+            idx = idx.compact()
+
+    # 派生データ（一覧・ツリー・リンクなど）は変更ノートに関係する部分のみを作り直す
+    snapshot, changed_stems = _patch_snapshot(old, changed_records, set(removed), dirs, links_by_path, stats, idx)
+    cache.publish_snapshot(snapshot)
+
+    if idx is None:
+        # 検索インデックス未構築（ウォームスタート直後）の場合はメタデータを先に公開してから構築
+        from app.core.search import SearchIndex
+        index_status.set_phase(PHASE_INDEXING)
+        idx = SearchIndex()
+        idx.build(snapshot.files, tokens_by_path)
+        cache.publish_snapshot(snapshot.replace(search_index=idx))
+
+    changed_paths = set(removed) | {r["path"] for r in updated}
+    _invalidate_rendered(changed_paths, changed_stems, snapshot.linked_from)
+
+    logger.info(
+        "Incremental refresh: %d added, %d modified (%d with identical content), %d removed (%d files total).",
+        len(added), len(modified), identical, len(removed), len(snapshot.files)
+    )
+    return True
+
+
+def _save_snapshot() -> None:
+    """現在のスナップショットをメタデータキャッシュファイル・検索インデックスのセグメントに永続化。
+    書き出し済みの世代であれば何もしない"""
+    global _saved_generation
+    with _save_lock:
+        snapshot = cache.get_snapshot()
+        if snapshot.generation == _saved_generation:
+            return
+        save_metadata_cache(
+            snapshot.files, snapshot.dirs, snapshot.wikilinks,
+            snapshot.stats, snapshot.path_to_slug
+        )
+        save_slug_table()
+        if snapshot.search_index is not None:
+            fingerprint = index_fingerprint(snapshot.files)
+            if fingerprint is not None:
+                write_segment(snapshot.search_index, fingerprint)
+        _saved_generation = snapshot.generation
+
+
+def _schedule_save() -> None:
+    """差分リフレッシュ後の永続化を予約する。
+
+    最初の予約からSNAPSHOT_SAVE_DELAY_SECONDS後に、その時点で公開中のスナップショットを
+    バックグラウンドのスレッドで1回だけ書き出す（リフレッシュの経路では書き出さない）。
+    """
+    global _save_timer
+    with _save_timer_lock:
+        if _save_timer is not None:
+            return
+        _save_timer = threading.Timer(SNAPSHOT_SAVE_DELAY_SECONDS, _run_scheduled_save)
+        _save_timer.name = "snapshot-save"
+        _save_timer.daemon = True
+        _save_timer.start()
+
+
+def _cancel_scheduled_save() -> bool:
+    """予約中の永続化を取り消す。予約があった場合はTrue"""
+    global _save_timer
+    with _save_timer_lock:
+        if _save_timer is None:
+            return False
+        _save_timer.cancel()
+        _save_timer = None
+        return True
+
+
+def _run_scheduled_save() -> None:
+    global _save_timer
+    with _save_timer_lock:
+        _save_timer = None
+    try:
+        _save_snapshot()
+    except Exception as e:
+        logger.warning("Failed to save snapshot: %s", e, exc_info=True)
+
+
+def flush_snapshot() -> None:
+    """予約中の永続化があれば取り消して、その場で書き出す（シャットダウン時）"""
+    if _cancel_scheduled_save():
+        _save_snapshot()
+
+
+def refresh_paths(paths: list[str], force: bool = True) -> None:
+    """指定ノートのみを再インデックスする（エディタ保存など変更箇所が分かっている場合）。
+
+    pathsはCONTENT_DIRからの相対パス。存在しないパスは削除として扱う。
+    force=Falseの場合はmtime/sizeが変わったノートのみ再パースする（ファイル監視用）。
+    """
+    with _refresh_lock:
+        if not cache.get_snapshot().stats:
+            refresh_global_caches()
+            return
+        try:
+            _refresh_paths(paths, force)
+        except Exception as e:
+            index_status.fail(str(e))
+            raise
+        index_status.recover()
+
+
+def _refresh_paths(paths: list[str], force: bool) -> None:
+    snapshot = cache.get_snapshot()
+    stats = dict(snapshot.stats)
+    dirs = list(snapshot.dirs)
+    known_dirs = set(dirs)
+    paths = [path.replace('\\', '/') for path in paths]
+    for path in paths:
+        try:
+            stats[path] = _stat_key((CONTENT_DIR / path).stat())
+        except FileNotFoundError:
+            stats.pop(path, None)
+            continue
+        # 新規フォルダ配下のノートの場合はツリー用のディレクトリ一覧にも追加
+        parts = path.split('/')[:-1]
+        for i in range(1, len(parts) + 1):
+            rel_dir = '/'.join(parts[:i])
+            if rel_dir not in known_dirs:
+                known_dirs.add(rel_dir)
+                dirs.append(rel_dir)
+
+    if _apply_stat_diff(stats, dirs, force=set(paths) if force else None, candidates=paths):
+        _schedule_save()
+
+
+def _matches_image(link_name: str, filename: str) -> bool:
+    """リンク名が画像ファイル名を指すか（拡張子省略リンクも考慮）"""
+    return link_name == filename or filename.lower().startswith(link_name.lower() + '.')
+
+
+def invalidate_images(filenames: set[str], all_images: bool = False) -> None:
+    """画像の追加・変更・削除を反映。
+
+    IMAGE_PATH_CACHEの該当エントリと、その画像を埋め込んでいるノートのレンダリング結果を破棄する。
+    all_images=Trueの場合は画像キャッシュ全体を破棄する。
+    """
+    if all_images:
+        cache.IMAGE_PATH_CACHE = {}
+        cache.MARKDOWN_CACHE = {}
+        logger.info("Image caches cleared.")
+        return
+    if not filenames:
+        return
+
+    for key in list(cache.IMAGE_PATH_CACHE):
+        if any(_matches_image(key, name) for name in filenames):
+            cache.IMAGE_PATH_CACHE.pop(key, None)
+
+    for path, links in cache.get_snapshot().wikilinks.items():
+        if path in cache.MARKDOWN_CACHE and any(
+            _matches_image(link, name) for link in links for name in filenames
+        ):
+            cache.MARKDOWN_CACHE.pop(path, None)
+    logger.info("Image caches invalidated for %d files.", len(filenames))
+
+
+def refresh_global_caches(incremental: bool = False, force: set[str] | None = None) -> None:
+    """グローバルキャッシュを更新する。
+
+    incremental=True の場合はVaultをstatして前回との差分のみを反映する。
+    forceのノートはmtime/sizeが同じでも読み込み、内容のハッシュで変更を判定する
+    （mtimeを保持したままコピーされた同期ファイルなど）。
+    前回のスナップショットがない場合は常にフルリビルドとなる。
+    """
+    with _refresh_lock:
+        try:
+            _refresh_global_caches(incremental, force)
+        except Exception as e:
+            index_status.fail(str(e))
+            raise
+        index_status.recover()
+
+
+def _refresh_global_caches(incremental: bool, force: set[str] | None = None) -> None:
+    if incremental and cache.get_snapshot().stats:
+        stats, dirs = stat_vault(CONTENT_DIR, CONTENT_DIR)
+        if _apply_stat_diff(stats, dirs, force):
+            _schedule_save()
+        return
+
+    # Refresh all files metadata (各ノートの読み込み・パースはここで1回のみ)
+    index_status.set_phase(PHASE_SCANNING)
+    start_segment()
+    files, dirs, links_by_path, stats, tokens_by_path = scan_vault(CONTENT_DIR, CONTENT_DIR)
+
+    # 全文検索インデックスの構築（並列パース時はワーカーでトークン化済み）
     from app.core.search import SearchIndex
+    index_status.set_phase(PHASE_INDEXING)
     idx = SearchIndex()
-    idx.build(cache.GLOBAL_FILE_CACHE)
-    cache.SEARCH_INDEX = idx
+    idx.build(files, tokens_by_path)
+
+    # 新しいスナップショットを1回の参照差し替えで公開（既存ノートのスラッグは維持する）
+    previous_slugs = cache.get_snapshot().path_to_slug
+    cache.publish_snapshot(_build_snapshot(files, dirs, links_by_path, stats, previous_slugs, idx))
+    index_status.set_serving("fresh", True)
+    index_status.set_phase(PHASE_READY)
+
+    # Clear per-file caches on full refresh
+    cache.IMAGE_PATH_CACHE = {}
+    cache.MARKDOWN_CACHE = {}
+
+    logger.info("Global cache refreshed: %d files indexed.", len(files))
+    _cancel_scheduled_save()
+    _save_snapshot()
+
+
+def initialize_caches() -> None:
+    """起動時のキャッシュ初期化。
+
+    永続化されたメタデータキャッシュがあればそれを読み込み、
+    mtime/sizeが変わったノートのみを再検証する。なければフルリビルド。
+    """
+    with _refresh_lock:
+        try:
+            _initialize_caches()
+        except Exception as e:
+            index_status.fail(str(e))
+            raise
+
+
+def _initialize_caches() -> None:
+    global _saved_generation
+    index_status.set_phase(PHASE_LOADING)
+    data = load_metadata_cache()
+    if data is None:
+        refresh_global_caches()
+        return
+
+    start_segment()
+    files = data["files"]
+    for f in files:
+        f.store_body()
+    # 保存時と同じ内容のノートに対するセグメントがあれば、トークン化せずにmmapで開く
+    idx = open_segment(index_fingerprint(files))
+    snapshot = _build_snapshot(files, data["dirs"], data["links"], data["stats"], data["slugs"], idx)
+    cache.publish_snapshot(snapshot)
+    if idx is not None:
+        # 読み込んだ内容のままであれば書き出し直さない
+        _saved_generation = snapshot.generation
+    index_status.set_serving("stale", idx is not None)
+    logger.info("Metadata cache loaded: %d files. Revalidating stale entries.", len(files))
+
+    # 変更のあったノートのみ再パース（検索インデックスが未構築の場合はここで構築される）
+    index_status.set_phase(PHASE_REVALIDATING)
+    refresh_global_caches(incremental=True)
 
-    logger.info("Global cache refreshed: %d files indexed.", len(cache.GLOBAL_FILE_CACHE))
+    snapshot = cache.get_snapshot()
+    if snapshot.search_index is None:
+        from app.core.search import SearchIndex
+        index_status.set_phase(PHASE_INDEXING)
+        idx = SearchIndex()
+        idx.build(snapshot.files)
+        cache.publish_snapshot(snapshot.replace(search_index=idx))
+        _schedule_save()
+    index_status.set_serving("fresh", True)
+    index_status.set_phase(PHASE_READY)
@@ -71,7 +71,7 @@ def render_cardlink(tokens, idx, options, env):
         """
     if info == "dataview":
         from app.core.dataview import process_dataview
-        return process_dataview(token.content)
+        return process_dataview(token.content, (env or {}).get("snapshot"))
     # Important: Fallback to default for other code blocks
     return default_fence_renderer(tokens, idx, options, env)
 
@@ -0,0 +1,117 @@
+"""インデックス用メタデータのディスク永続化（再起動時のウォームスタート用）"""
+import base64
+import json
+import logging
+import os
+from datetime import date, datetime
+
+from app.config import CONTENT_DIR, METADATA_CACHE_FILE
+from app.core.records import NoteRecord
+
+logger = logging.getLogger("app.metadata_cache")
+
+# レコード構造・値の表現を変更した場合はインクリメントする（古いキャッシュは破棄される）
+METADATA_CACHE_VERSION = 4
+
+
+def _encode_value(value):
+    """JSON非対応の値（frontmatterの日付・圧縮済み本文など）をタグ付きの辞書に変換"""
+    if isinstance(value, bytes):
+        return {"$bytes": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, date):
+        return {"$date": value.isoformat()}
+    # 読み込み時に元の値に戻せない文字列化はしない（保存自体を失敗させる）
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _encode_structure(value):
+    """frontmatterのうちjson.dumpがdefaultを通さずに変換してしまう構造をタグ付きの辞書に変換する。
+
+    set（!!set）・tuple（!!omap・!!pairsの要素）はそれぞれ$set・$tupleに、キーが文字列でない
+    （数値・日付など）か$で始まるキー1つだけのマッピングは、[キー, 値] の一覧として$mapにする。
+    """
+    if isinstance(value, dict):
+        if all(isinstance(key, str) for key in value) and not (len(value) == 1 and next(iter(value)).startswith("$")):
+            return {key: _encode_structure(item) for key, item in value.items()}
+        return {"$map": [[_encode_structure(key), _encode_structure(item)] for key, item in value.items()]}
+    if isinstance(value, list):
+        return [_encode_structure(item) for item in value]
+    if isinstance(value, tuple):
+        return {"$tuple": [_encode_structure(item) for item in value]}
+    if isinstance(value, (set, frozenset)):
+        return {"$set": [_encode_structure(item) for item in value]}
+    return value
+
+
+def _decode_object(obj: dict):
+    if len(obj) == 1:
+        if "$datetime" in obj:
+            return datetime.fromisoformat(obj["$datetime"])
+        if "$date" in obj:
+            return date.fromisoformat(obj["$date"])
+        if "$bytes" in obj:
+            return base64.b64decode(obj["$bytes"])
+        if "$map" in obj:
+            return {key: item for key, item in obj["$map"]}
+        if "$tuple" in obj:
+            return tuple(obj["$tuple"])
+        if "$set" in obj:
+            return set(obj["$set"])
+    return obj
+
+
+def save_metadata_cache(files: list[NoteRecord], dirs: list[str], links_by_path: dict[str, list[str]],
+                        stats: dict[str, tuple[int, int]], path_to_slug: dict[str, str]) -> None:
+    """メタデータスナップショットを書き出す（一時ファイル経由でアトミックに置き換え）"""
+    records = [f.to_dict() for f in files]
+    for record in records:
+        record["frontmatter"] = _encode_structure(record["frontmatter"])
+
+    data = {
+        "version": METADATA_CACHE_VERSION,
+        "content_dir": str(CONTENT_DIR),
+        "files": records,
+        "dirs": dirs,
+        "links": links_by_path,
+        "stats": stats,
+        "slugs": path_to_slug,
+    }
+
+    tmp_path = METADATA_CACHE_FILE.with_name(METADATA_CACHE_FILE.name + ".tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, default=_encode_value)
+        os.replace(tmp_path, METADATA_CACHE_FILE)
+        logger.info("Metadata cache saved: %d files.", len(records))
+    except Exception as e:
+        logger.warning("Failed to save metadata cache: %s", e)
+
+
+def load_metadata_cache() -> dict | None:
+    """メタデータスナップショットを読み込む。
+
+    存在しない・バージョン不一致・別のコンテンツディレクトリのものはNoneを返す。
+    戻り値のキー: files, dirs, links, stats, slugs
+    """
+    if not METADATA_CACHE_FILE.exists():
+        return None
+
+    try:
+        with open(METADATA_CACHE_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f, object_hook=_decode_object)
+    except Exception as e:
+        logger.warning("Failed to load metadata cache: %s", e)
+        return None
+
+    if data.get("version") != METADATA_CACHE_VERSION:
+        logger.info("Metadata cache version mismatch. Ignoring.")
+        return None
+    if data.get("content_dir") != str(CONTENT_DIR):
+        logger.info("Metadata cache was built for another content dir. Ignoring.")
+        return None
+
+    data["files"] = [NoteRecord.from_dict(record) for record in data["files"]]
+    data["stats"] = {path: tuple(key) for path, key in data["stats"].items()}
+    return data
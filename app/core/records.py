@@ -0,0 +1,115 @@
+"""ファイルキャッシュ用のノートレコード（メモリ効率のため__slots__で保持）"""
+import math
+import sys
+from datetime import datetime
+
+from app.config import READING_SPEED_JP
+from app.core.body_store import BodyRef, compressed_body, load_body, store_body
+
+# dict互換アクセス（record["title"] / record.get("title") / "title" in record）で参照できるキー
+RECORD_KEYS = (
+    "name", "path", "title", "mtime", "updated", "tags", "published",
+    "frontmatter", "preview", "body_text", "char_count", "reading_time", "slug", "content_hash",
+)
+
+
+class NoteRecord:
+    """1ノート分のメタデータ。
+
+    更新日時は整数(mtime_ns)で保持し、mtime(datetime)・updated(表示用文字列)・
+    reading_time・nameは参照時に算出する。本文テキストは圧縮済みのバイト列か、
+    store_body()の後はbody_storeのセグメントへの参照として保持する。
+    content_hashはファイル内容のハッシュで、mtimeに依存しない変更検知に使う。
+    テンプレートやDataviewからは従来のdictと同じキー名で属性・添字アクセスできる。
+    """
+
+    __slots__ = (
+        "path", "title", "mtime_ns", "tags", "published",
+        "frontmatter", "preview", "_body", "char_count", "slug", "content_hash",
+    )
+
+    def __init__(self, path: str, title: str, mtime_ns: int, tags: list[str], published: bool,
+                 frontmatter: dict, preview: str, body: bytes | BodyRef, char_count: int, slug: str | None = None,
+                 content_hash: str | None = None):
+        self.path = path
+        self.title = title
+        self.mtime_ns = mtime_ns
+        # タグ・frontmatterのキーは多くのノートで共通のためintern
+        self.tags = [sys.intern(t) for t in tags]
+        self.published = published
+        self.frontmatter = {sys.intern(k) if isinstance(k, str) else k: v for k, v in frontmatter.items()}
+        self.preview = preview
+        self._body = body
+        self.char_count = char_count
+        self.slug = slug
+        self.content_hash = content_hash
+
+    def __reduce__(self):
+        # プロセス間で受け渡した場合も__init__を通してinternする
+        return (NoteRecord, (self.path, self.title, self.mtime_ns, self.tags, self.published,
+                             self.frontmatter, self.preview, compressed_body(self._body), self.char_count, self.slug,
+                             self.content_hash))
+
+    def __repr__(self) -> str:
+        return f"NoteRecord({self.path!r})"
+
+    @property
+    def name(self) -> str:
+        return self.path.rsplit('/', 1)[-1]
+
+    @property
+    def mtime(self) -> datetime:
+        return datetime.fromtimestamp(self.mtime_ns / 1e9)
+
+    @property
+    def updated(self) -> str:
+        return self.mtime.strftime("%Y-%m-%d %H:%M")
+
+    @property
+    def body_text(self) -> str:
+        return load_body(self._body)
+
+    @property
+    def reading_time(self) -> int:
+        return max(1, math.ceil(self.char_count / READING_SPEED_JP))
+
+    def store_body(self) -> None:
+        """本文をBODY_STOREの格納先へ移す（パース結果を親プロセスで受け取った後に呼ぶ）"""
+        self._body = store_body(self._body)
+
+    # dict互換アクセス
+    def __getitem__(self, key: str):
+        if key not in RECORD_KEYS:
+            raise KeyError(key)
+        return getattr(self, key)
+
+    def get(self, key: str, default=None):
+        if key not in RECORD_KEYS:
+            return default
+        value = getattr(self, key)
+        return default if value is None else value
+
+    def __contains__(self, key: str) -> bool:
+        return key in RECORD_KEYS
+
+    def to_dict(self) -> dict:
+        """永続化用のdict（本文は圧縮済みバイト列のまま）"""
+        return {
+            "path": self.path,
+            "title": self.title,
+            "mtime_ns": self.mtime_ns,
+            "tags": self.tags,
+            "published": self.published,
+            "frontmatter": self.frontmatter,
+            "preview": self.preview,
+            "body": compressed_body(self._body),
+            "char_count": self.char_count,
+            "slug": self.slug,
+            "content_hash": self.content_hash,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "NoteRecord":
+        return cls(data["path"], data["title"], data["mtime_ns"], data["tags"], data["published"],
+                   data["frontmatter"], data["preview"], data["body"], data["char_count"], data.get("slug"),
+                   data["content_hash"])
@@ -1,10 +1,34 @@
-"""TF-IDF全文検索エンジン（外部依存なし）"""
+"""BM25F全文検索エンジン
+
+転置インデックスは語彙ID・文書IDで引くフィールド（本文・タイトル・パス）ごとのポスティングで、
+文書ごとの出現位置を差分符号化してarray('I')に保持する。スコアはBM25F（フィールドの重みと
+文書長で正規化したTFを合算してからTFを飽和させる）で、上位limit件はMaxScoreで枝刈りして選ぶ。
+クエリの引用符で囲んだフレーズと連続して出現する語は出現位置で判定して上位に並べる。
+複数語のクエリでは、BM25Fの上位候補（SEARCH_PROXIMITY_CANDIDATES件）に、本文でクエリ語を含む
+最短の区間が短いほど大きい近接度の加点を加えて並べ直す（候補外の文書には加点しない）。
+スニペットとハイライト範囲も出現位置から作る。
+
+ポスティングはsearch_segmentのセグメントファイルからmmapで開いたもの（読み取り専用）を
+そのまま参照でき、差分更新ではclone()で変更する語彙のみ複製する（Copy-on-Write）。
+スニペット用の本文はレコードのbody_text（body_storeの圧縮済み本文を展開したもの）から読む。
+"""
 import math
 import re
 import logging
+import threading
 import unicodedata
-
-from app import cache as app_cache
+from array import array
+from bisect import bisect_left
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from heapq import merge, nlargest, nsmallest
+from itertools import accumulate, repeat
+from operator import sub
+
+from app.config import (
+    SEARCH_BM25_B, SEARCH_BM25_K1, SEARCH_COMPACT_DEAD_RATIO, SEARCH_COMPACT_MIN_DEAD, SEARCH_FIELD_WEIGHTS,
+    SEARCH_PROXIMITY_CANDIDATES, SEARCH_PROXIMITY_WEIGHT, SEARCH_TERM_CACHE_SIZE,
+)
 
 logger = logging.getLogger("app.search")
 
@@ -77,186 +101,912 @@ def tokenize_query(query: str) -> list[str]:
     return tokenize(query)
 
 
+def _is_word_char(ch: str) -> bool:
+    """_ASCII_WORD_REの単語を構成する文字か"""
+    return ch.isascii() and (ch.isalnum() or ch == '_')
+
+
+def _token_offsets(text: str, token: str):
+    """tokenize(text)でtokenとなる箇所の開始文字位置を順に返す（textは小文字化済み）。
+
+    str.findで出現箇所を探し、トークンの境界になっている箇所のみを返す。
+    ASCIIの単語は前後が単語の文字でないこと、CJK1文字は前後がCJK文字でないことを確認する
+    （CJKのバイグラムはCJK文字の並びの中の2文字であれば常にトークン）。
+    """
+    size = len(token)
+    if _is_word_char(token[0]):
+        is_boundary = _is_word_char
+    elif size == 1:
+        is_boundary = _is_cjk
+    else:
+        is_boundary = None
+    i = text.find(token)
+    while i >= 0:
+        if is_boundary is None or not (
+            (i > 0 and is_boundary(text[i - 1])) or (i + size < len(text) and is_boundary(text[i + size]))
+        ):
+            yield i
+        i = text.find(token, i + 1)
+
+
+# 引用符（"..." / “...”）で囲んだフレーズ
+_PHRASE_RE = re.compile(r'"([^"]+)"|“([^”]+)”')
+
+
+def parse_query(query: str) -> tuple[list[list[str]], list[list[str]]]:
+    """クエリから (必須フレーズ, 近接フレーズ) のトークン列を取り出す。
+
+    必須フレーズ: 引用符で囲んだ部分。トークンが連続して出現する文書のみに絞り込む。
+    近接フレーズ: 引用符の外の空白区切りの各部分のうち複数トークンになるもの
+    （3文字以上の日本語はバイグラムの列になる）。連続して出現する文書を上位に並べる。
+    """
+    required = []
+    for m in _PHRASE_RE.finditer(query):
+        tokens = tokenize(m.group(1) or m.group(2))
+        if tokens:
+            required.append(tokens)
+    proximity = []
+    for chunk in _PHRASE_RE.sub(" ", query).split():
+        tokens = tokenize(chunk)
+        if len(tokens) >= 2:
+            proximity.append(tokens)
+    return required, proximity
+
+
+def _gallop(seq, target: int, lo: int = 0) -> int:
+    """seq[lo:]（昇順）で最初にtarget以上となる添字。
+
+    範囲を1, 2, 4, ...と広げてからその範囲内を二分探索する（ギャロッピング探索）。
+    カーソルを前に進めながら繰り返し引く場合、近くにある値ほど少ない比較で見つかる。
+    """
+    size = len(seq)
+    if lo >= size or seq[lo] >= target:
+        return lo
+    prev, step = lo, 1
+    cur = lo + 1
+    while cur < size and seq[cur] < target:
+        prev = cur
+        step *= 2
+        cur = prev + step
+    return bisect_left(seq, target, prev + 1, min(cur, size))
+
+
+# フィールド（本文・タイトル・パス）
+FIELD_BODY, FIELD_TITLE, FIELD_PATH = 0, 1, 2
+FIELDS = (FIELD_BODY, FIELD_TITLE, FIELD_PATH)
+
+# 上限スコアによる枝刈りの判定に持たせる余裕（浮動小数点の加算順序による誤差で候補を落とさないため）
+_BOUND_MARGIN = 1 + 1e-9
+
+
+def as_array(values) -> array:
+    """array('I')またはmemoryview（'I'）を書き込み可能なarray('I')に複製する"""
+    if isinstance(values, array):
+        return values[:]
+    result = array('I')
+    result.frombytes(values.cast('B'))
+    return result
+
+
+class Postings:
+    """1語彙・1フィールド分のポスティングリスト。
+
+    docs: 文書ID（昇順） / tfs: 文書ごとの出現回数 /
+    positions: 文書ごとの出現位置を差分符号化し、docsの順に連結したもの。
+    いずれもarray('I')で保持する（ディスク上のセグメントから開いたものは読み取り専用のmemoryview）。
+    """
+
+    __slots__ = ("docs", "tfs", "positions")
+
+    def __init__(self, docs: array | None = None, tfs: array | None = None, positions: array | None = None):
+        self.docs = docs if docs is not None else array('I')
+        self.tfs = tfs if tfs is not None else array('I')
+        self.positions = positions if positions is not None else array('I')
+
+    def copy(self) -> "Postings":
+        return Postings(as_array(self.docs), as_array(self.tfs), as_array(self.positions))
+
+    def _find(self, doc_id: int) -> int:
+        """doc_idの添字（含まれない場合は-1）"""
+        i = bisect_left(self.docs, doc_id)
+        return i if i < len(self.docs) and self.docs[i] == doc_id else -1
+
+    def __contains__(self, doc_id: int) -> bool:
+        return self._find(doc_id) >= 0
+
+    def add(self, doc_id: int, positions: list[int]) -> None:
+        """文書を追加（含まれていないdoc_idに限る）。positionsは昇順"""
+        deltas = [positions[0]] + [b - a for a, b in zip(positions, positions[1:])]
+        if not self.docs or doc_id > self.docs[-1]:
+            self.docs.append(doc_id)
+            self.tfs.append(len(positions))
+            self.positions.extend(deltas)
+            return
+        # 更新（update_document）で既存の文書IDに戻す場合は途中に挿入する
+        i = bisect_left(self.docs, doc_id)
+        start = sum(self.tfs[:i])
+        self.docs.insert(i, doc_id)
+        self.tfs.insert(i, len(positions))
+        self.positions[start:start] = array('I', deltas)
+
+    def remove(self, doc_id: int) -> bool:
+        i = self._find(doc_id)
+        if i < 0:
+            return False
+        start = sum(self.tfs[:i])
+        del self.positions[start:start + self.tfs[i]]
+        del self.docs[i]
+        del self.tfs[i]
+        return True
+
+    def decode(self) -> dict[int, list[int]]:
+        """{文書ID: [出現位置]} に展開する（テスト・デバッグ用）"""
+        result = {}
+        offset = 0
+        for doc_id, tf in zip(self.docs, self.tfs):
+            positions = list(accumulate(self.positions[offset:offset + tf]))
+            result[doc_id] = positions
+            offset += tf
+        return result
+
+
+class TermScores:
+    """1語分の文書ごとのスコア寄与（IDF・フィールドの重み・文書長の正規化・TFの飽和を適用済み）。
+
+    docs: 語がいずれかのフィールドに出現する文書ID（昇順） / scores: docsと同じ順の寄与 /
+    upper_bound: 寄与の最大値（MaxScoreでの枝刈りに使う）
+    """
+
+    __slots__ = ("docs", "scores", "upper_bound")
+
+    def __init__(self, docs, scores: array):
+        self.docs = docs
+        self.scores = scores
+        self.upper_bound = max(scores)
+
+
 class SearchIndex:
-    """転置インデックス + TF-IDFスコアリングの検索エンジン"""
+    """転置インデックス + BM25Fスコアリングの検索エンジン
+
+    文書はパスではなく整数の文書IDで管理し、語彙は1つの辞書（vocab: 語 → 語彙ID）で引く。
+    ポスティングはフィールドごとに語彙IDで添字アクセスするリストに、Postings（array('I')）として保持する。
+    セグメントファイルから開いた場合（search_segment.open_segment）、vocab・ポスティングの表は
+    同じインターフェースでファイル上のデータを参照するオブジェクトになる。
+    """
 
     def __init__(self):
-        # {term: {doc_path: [positions]}}
-        self.inverted_index: dict[str, dict[str, list[int]]] = {}
-        # 文書ごとのトークン数
-        self.doc_lengths: dict[str, int] = {}
-        # タイトル用インデックス
-        self.title_index: dict[str, dict[str, list[int]]] = {}
-        # パス用インデックス
-        self.path_index: dict[str, dict[str, list[int]]] = {}
+        # {term: 語彙ID}（本文・タイトル・パスで共通）
+        self.vocab: dict[str, int] = {}
+        # フィールドごとの [語彙ID → Postings | None]
+        self._postings: tuple[list, list, list] = ([], [], [])
+        # {path: 文書ID} / 文書ID → path（削除済みはNone）
+        self._doc_ids: dict[str, int] = {}
+        self._doc_paths: list[str | None] = []
+        # フィールドごとの [文書ID → トークン数]
+        self._field_lengths: tuple[array, array, array] = (array('I'), array('I'), array('I'))
         # 総文書数
         self.doc_count: int = 0
-
-    def build(self, file_cache: list[dict]) -> None:
-        """GLOBAL_FILE_CACHEからインデックスを構築"""
-        self.inverted_index = {}
-        self.doc_lengths = {}
-        self.title_index = {}
-        self.path_index = {}
+        # 構築・文書の追加・削除の時点で計算しておく値（検索時には計算しない）:
+        # フィールドごとの [文書ID → 文書長の正規化係数] / [文書ID → パスの昇順での順位] / 順位順のパス
+        self._norms: tuple[list[float], ...] = ([], [], [])
+        self._path_ranks: list[int] = []
+        self._sorted_paths: list[str] = []
+        # batch()の入れ子の深さ（0以外の間は正規化係数の計算を終了時にまとめる）
+        self._batch_depth = 0
+        # 検索時に計算して保持する値（文書の追加・削除で破棄）:
+        # 語ごとのスコア寄与とフレーズを含む文書（LRU。キーは語彙ID / 語彙IDのタプル）
+        self._term_scores: OrderedDict = OrderedDict()
+        self._term_scores_lock = threading.Lock()
+        # clone後に複製済みのポスティング（本文・タイトル・パス）
+        self._owned_terms: tuple[set, set, set] = (set(), set(), set())
+
+    @property
+    def vocab_size(self) -> int:
+        """本文に出現する語彙数"""
+        return sum(1 for p in self._postings[FIELD_BODY] if p is not None and p.docs)
+
+    def _term_id(self, token: str) -> int:
+        term_id = self.vocab.get(token)
+        if term_id is None:
+            term_id = self.vocab[token] = len(self.vocab)
+            for field_postings in self._postings:
+                field_postings.append(None)
+        return term_id
+
+    def _new_doc_id(self, path: str, lengths) -> int:
+        """lengthsはフィールドごとのトークン数"""
+        doc_id = len(self._doc_paths)
+        self._doc_paths.append(path)
+        for field_lengths, length in zip(self._field_lengths, lengths):
+            field_lengths.append(length)
+        self._doc_ids[path] = doc_id
+        return doc_id
+
+    def _index_tokens(self, field: int, doc_id: int, tokens: list[str], owned: set | None = None) -> None:
+        """トークン列を語ごとの出現位置にまとめてポスティングへ追加"""
+        grouped: dict[str, list[int]] = {}
+        for pos, token in enumerate(tokens):
+            positions = grouped.get(token)
+            if positions is None:
+                grouped[token] = [pos]
+            else:
+                positions.append(pos)
+
+        field_postings = self._postings[field]
+        for token, positions in grouped.items():
+            term_id = self._term_id(token)
+            postings = field_postings[term_id]
+            if postings is None:
+                postings = field_postings[term_id] = Postings()
+                if owned is not None:
+                    owned.add(term_id)
+            elif owned is not None and term_id not in owned:
+                # cloneと共有しているポスティングは書き込み前に複製する
+                postings = field_postings[term_id] = postings.copy()
+                owned.add(term_id)
+            postings.add(doc_id, positions)
+
+    def build(self, file_cache: list[dict], tokens_by_path: dict[str, tuple] | None = None) -> None:
+        """ファイルレコード一覧（スナップショットのfiles）からインデックスを構築
+
+        tokens_by_pathにトークン化済みの (本文, タイトル, パス) があればそれを使う（並列パース時）。
+        """
+        self.__init__()
         self.doc_count = len(file_cache)
 
         for f in file_cache:
             path = f["path"]
-            body_text = f.get("body_text", "")
-            title = f.get("title", "")
-
-            # 本文インデックス
-            body_tokens = tokenize(body_text)
-            self.doc_lengths[path] = len(body_tokens)
-            for pos, token in enumerate(body_tokens):
-                if token not in self.inverted_index:
-                    self.inverted_index[token] = {}
-                if path not in self.inverted_index[token]:
-                    self.inverted_index[token][path] = []
-                self.inverted_index[token][path].append(pos)
-
-            # タイトルインデックス
-            title_tokens = tokenize(title)
-            for pos, token in enumerate(title_tokens):
-                if token not in self.title_index:
-                    self.title_index[token] = {}
-                if path not in self.title_index[token]:
-                    self.title_index[token][path] = []
-                self.title_index[token][path].append(pos)
-
-            # パスインデックス
-            path_tokens = tokenize(path)
-            for pos, token in enumerate(path_tokens):
-                if token not in self.path_index:
-                    self.path_index[token] = {}
-                if path not in self.path_index[token]:
-                    self.path_index[token][path] = []
-                self.path_index[token][path].append(pos)
+            pre_tokens = tokens_by_path.get(path) if tokens_by_path else None
+            if pre_tokens is not None:
+                body_tokens, title_tokens, path_tokens = pre_tokens
+            else:
+                body_tokens = tokenize(f.get("body_text", ""))
+                title_tokens = tokenize(f.get("title", ""))
+                path_tokens = tokenize(path)
+
+            doc_id = self._new_doc_id(path, (len(body_tokens), len(title_tokens), len(path_tokens)))
+            self._index_tokens(FIELD_BODY, doc_id, body_tokens)
+            self._index_tokens(FIELD_TITLE, doc_id, title_tokens)
+            self._index_tokens(FIELD_PATH, doc_id, path_tokens)
+        self._prepare_scores()
 
         logger.info(
             "検索インデックス構築完了: %d文書, %d語彙",
-            self.doc_count, len(self.inverted_index)
+            self.doc_count, self.vocab_size
         )
 
-    def _score_document(self, path: str, query_tokens: list[str]) -> float:
-        """TF-IDF計算（対数TF + log IDF）。タイトル・パスにボーナス加算"""
-        score = 0.0
-        doc_len = self.doc_lengths.get(path, 1)
-
-        for token in query_tokens:
-            # 本文スコア
-            postings = self.inverted_index.get(token, {})
-            if path in postings:
-                tf = len(postings[path])
-                log_tf = 1 + math.log(tf) if tf > 0 else 0
-                df = len(postings)
-                idf = math.log((self.doc_count + 1) / (df + 1))
-                score += log_tf * idf
-
-            # タイトルボーナス（3倍重み）
-            title_postings = self.title_index.get(token, {})
-            if path in title_postings:
-                tf = len(title_postings[path])
-                log_tf = 1 + math.log(tf) if tf > 0 else 0
-                df = len(title_postings)
-                idf = math.log((self.doc_count + 1) / (df + 1))
-                score += log_tf * idf * 3.0
-
-            # パスボーナス（1.5倍重み）
-            path_postings = self.path_index.get(token, {})
-            if path in path_postings:
-                tf = len(path_postings[path])
-                log_tf = 1 + math.log(tf) if tf > 0 else 0
-                df = len(path_postings)
-                idf = math.log((self.doc_count + 1) / (df + 1))
-                score += log_tf * idf * 1.5
+    def clone(self) -> "SearchIndex":
+        """差分更新用の複製を返す（Copy-on-Write）。
+
+        語彙ごとのポスティングは共有し、add_document/remove_documentで
+        変更する語彙のみ複製するため、公開中のインデックスは変更されない。
+        """
+        idx = SearchIndex()
+        idx.vocab = self.vocab.copy()
+        idx._postings = tuple(field_postings.copy() for field_postings in self._postings)
+        idx._doc_ids = dict(self._doc_ids)
+        idx._doc_paths = list(self._doc_paths)
+        idx._field_lengths = tuple(lengths[:] for lengths in self._field_lengths)
+        idx.doc_count = self.doc_count
+        # 正規化係数・順位は差し替えで更新するため共有し、順位順のパスのみ複製する
+        idx._norms = self._norms
+        idx._path_ranks = self._path_ranks
+        idx._sorted_paths = list(self._sorted_paths)
+        return idx
+
+    @contextmanager
+    def batch(self):
+        """複数の文書をまとめて追加・削除・更新する間、正規化係数の計算を終了時の1回にまとめる"""
+        self._batch_depth += 1
+        try:
+            yield self
+        finally:
+            self._batch_depth -= 1
+            if not self._batch_depth:
+                self._update_norms()
+
+    def _field_tokens(self, f: dict, tokens: tuple | None = None) -> tuple[list[str], list[str], list[str]]:
+        """(本文, タイトル, パス) のトークン列"""
+        if tokens is None:
+            tokens = (tokenize(f.get("body_text", "")), tokenize(f.get("title", "")), tokenize(f["path"]))
+        return tokens
+
+    def add_document(self, f: dict, tokens: tuple | None = None) -> None:
+        """ファイルレコード1件をインデックスに追加（tokensはトークン化済みの場合に指定）"""
+        path = f["path"]
+        if path in self._doc_ids:
+            raise ValueError(f"already indexed: {path}")
+        field_tokens = self._field_tokens(f, tokens)
+        doc_id = self._new_doc_id(path, [len(tokens) for tokens in field_tokens])
+        for field, tokens in enumerate(field_tokens):
+            self._index_tokens(field, doc_id, tokens, self._owned_terms[field])
+        self.doc_count += 1
+        self._insert_rank(path)
+        if not self._batch_depth:
+            self._update_norms()
+
+    def _unindex(self, doc_id: int, f: dict) -> None:
+        """レコードfのトークンについて、doc_idをポスティングから除く"""
+        for field, tokens in enumerate(self._field_tokens(f)):
+            field_postings = self._postings[field]
+            owned = self._owned_terms[field]
+            for token in set(tokens):
+                term_id = self.vocab.get(token)
+                if term_id is None:
+                    continue
+                postings = field_postings[term_id]
+                if postings is None or doc_id not in postings:
+                    continue
+                if term_id not in owned:
+                    postings = field_postings[term_id] = postings.copy()
+                    owned.add(term_id)
+                postings.remove(doc_id)
+
+    def remove_document(self, f: dict) -> None:
+        """インデックス済みのファイルレコード1件を削除（登録時と同じレコードを渡す）"""
+        path = f["path"]
+        doc_id = self._doc_ids.get(path)
+        if doc_id is None:
+            return
+        self._unindex(doc_id, f)
+        self._delete_rank(doc_id)
+        del self._doc_ids[path]
+        self._doc_paths[doc_id] = None
+        for field_lengths in self._field_lengths:
+            field_lengths[doc_id] = 0
+        self.doc_count -= 1
+        if not self._batch_depth:
+            self._update_norms()
+
+    def update_document(self, old: dict, new: dict, tokens: tuple | None = None) -> None:
+        """インデックス済みのレコードoldをnewに差し替える（同じパスなら文書IDを維持する）"""
+        doc_id = self._doc_ids.get(old["path"])
+        if doc_id is None or old["path"] != new["path"]:
+            self.remove_document(old)
+            self.add_document(new, tokens)
+            return
+        self._unindex(doc_id, old)
+        field_tokens = self._field_tokens(new, tokens)
+        for field, tokens in enumerate(field_tokens):
+            self._field_lengths[field][doc_id] = len(tokens)
+            self._index_tokens(field, doc_id, tokens, self._owned_terms[field])
+        if not self._batch_depth:
+            self._update_norms()
+
+    @property
+    def dead_documents(self) -> int:
+        """削除済みで文書IDが欠番になっている件数"""
+        return len(self._doc_paths) - self.doc_count
+
+    def needs_compaction(self) -> bool:
+        """削除による文書IDの欠番が一定割合を超えたか"""
+        return self.dead_documents > max(SEARCH_COMPACT_MIN_DEAD, self.doc_count * SEARCH_COMPACT_DEAD_RATIO)
+
+    def compact(self) -> "SearchIndex":
+        """欠番を詰めて文書IDを振り直し、ポスティングが空の語彙を除いたインデックスを返す。
+
+        文書の並び順は保つため、各ポスティングの文書IDは昇順のまま付け替えるだけでよい。
+        """
+        idx = SearchIndex()
+        remap = array('I', [0]) * len(self._doc_paths)
+        for doc_id, path in enumerate(self._doc_paths):
+            if path is not None:
+                remap[doc_id] = idx._new_doc_id(path, [lengths[doc_id] for lengths in self._field_lengths])
+        idx.doc_count = self.doc_count
+
+        dropped = 0
+        for token, term_id in self.vocab.items():
+            fields = [field_postings[term_id] for field_postings in self._postings]
+            if not any(p is not None and p.docs for p in fields):
+                dropped += 1
+                continue
+            new_term_id = idx._term_id(token)
+            for field, postings in enumerate(fields):
+                if postings is not None and postings.docs:
+                    idx._postings[field][new_term_id] = Postings(
+                        array('I', [remap[d] for d in postings.docs]), as_array(postings.tfs), as_array(postings.positions)
+                    )
+        idx._prepare_scores()
+        logger.info(
+            "検索インデックスを圧縮: 欠番%d件, 空の語彙%d件を削除",
+            len(self._doc_paths) - idx.doc_count, dropped
+        )
+        return idx
+
+    def postings(self, field: int = FIELD_BODY) -> dict[str, dict[str, list[int]]]:
+        """{term: {path: [出現位置]}} に展開する（テスト・デバッグ用）"""
+        result = {}
+        for token, term_id in self.vocab.items():
+            postings = self._postings[field][term_id]
+            if postings is None or not postings.docs:
+                continue
+            result[token] = {self._doc_paths[doc_id]: positions for doc_id, positions in postings.decode().items()}
+        return result
+
+    def _prepare_scores(self) -> None:
+        """正規化係数・順位をすべて計算し直す（構築・圧縮・セグメントの読み込み時）。
+
+        公開後のインデックスは変更されないため、検索時にはこれらを計算しない。
+        """
+        ranks = [0] * len(self._doc_paths)
+        live = sorted((path, doc_id) for doc_id, path in enumerate(self._doc_paths) if path is not None)
+        for rank, (_, doc_id) in enumerate(live):
+            ranks[doc_id] = rank
+        self._path_ranks = ranks
+        self._sorted_paths = [path for path, _ in live]
+        self._update_norms()
+
+    def _update_norms(self) -> None:
+        """フィールドごとの [文書ID → 重み / (1 - b + b * 文書長 / 平均文書長)] を計算し直し、
+        語ごとのスコア寄与のキャッシュを破棄する（平均文書長が変わるため文書の追加・削除のたびに必要）"""
+        b = SEARCH_BM25_B
+        norms = []
+        for weight, lengths in zip(SEARCH_FIELD_WEIGHTS, self._field_lengths):
+            avg_length = sum(lengths) / self.doc_count if self.doc_count else 0
+            if avg_length:
+                norms.append([weight / (1 - b + b * length / avg_length) for length in lengths])
+            else:
+                norms.append([weight] * len(lengths))
+        self._norms = tuple(norms)
+        with self._term_scores_lock:
+            self._term_scores.clear()
+
+    def _insert_rank(self, path: str) -> None:
+        """追加した文書（末尾の文書ID）の順位を挿入し、後ろの順位を1つずつずらす"""
+        rank = bisect_left(self._sorted_paths, path)
+        self._sorted_paths.insert(rank, path)
+        ranks = [r + 1 if r >= rank else r for r in self._path_ranks]
+        ranks.append(rank)
+        self._path_ranks = ranks
+
+    def _delete_rank(self, doc_id: int) -> None:
+        """削除する文書の順位を除き、後ろの順位を1つずつ詰める（欠番の文書の順位は参照しない）"""
+        rank = self._path_ranks[doc_id]
+        del self._sorted_paths[rank]
+        ranks = [r - 1 if r > rank else r for r in self._path_ranks]
+        ranks[doc_id] = 0
+        self._path_ranks = ranks
+
+    def _scores_for(self, term_id: int) -> TermScores | None:
+        """語の文書ごとのスコア寄与。BM25F: フィールドの重みと文書長で正規化したTFを合算して
+        飽和関数 tf / (k1 + tf) とIDF（dfはいずれかのフィールドに出現する文書数）を掛ける。
+        """
+        with self._term_scores_lock:
+            cached = self._term_scores.get(term_id)
+            if cached is not None:
+                self._term_scores.move_to_end(term_id)
+                return cached
+
+        norms = self._norms
+        k1 = SEARCH_BM25_K1
+        fields = [
+            (postings, norms[field]) for field in FIELDS
+            if (postings := self._postings[field][term_id]) is not None and postings.docs
+        ]
+        if not fields:
+            return None
+        if len(fields) == 1:
+            # 1フィールドのみに出現する語（大半の語）はポスティングの文書IDをそのまま使う
+            postings, norm = fields[0]
+            docs = postings.docs
+            weighted = [tf * norm[doc_id] for doc_id, tf in zip(docs, postings.tfs)]
+        else:
+            merged: dict[int, float] = {}
+            for postings, norm in fields:
+                for doc_id, tf in zip(postings.docs, postings.tfs):
+                    merged[doc_id] = merged.get(doc_id, 0.0) + tf * norm[doc_id]
+            docs = array('I', sorted(merged))
+            weighted = [merged[doc_id] for doc_id in docs]
+        df = len(docs)
+        idf = math.log(1 + (self.doc_count - df + 0.5) / (df + 0.5))
+        term_scores = TermScores(docs, array('d', [idf * tf / (k1 + tf) for tf in weighted]))
+
+        with self._term_scores_lock:
+            self._term_scores[term_id] = term_scores
+            if len(self._term_scores) > SEARCH_TERM_CACHE_SIZE:
+                self._term_scores.popitem(last=False)
+        return term_scores
+
+    def _query_terms(self, query_tokens: list[str]) -> list[tuple[float, int, TermScores]]:
+        """クエリの語ごとの (上限スコア, クエリ中の出現回数, スコア寄与) を上限スコアの昇順で返す。
+
+        文書のスコアはこの順序で寄与を加算したものとする（評価方法によらず同じ値になるように）。
+        """
+        terms = []
+        for token, query_tf in Counter(query_tokens).items():
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            term_scores = self._scores_for(term_id)
+            if term_scores is not None:
+                terms.append((term_scores.upper_bound * query_tf, query_tf, term_scores))
+        terms.sort(key=lambda t: t[0])
+        return terms
+
+    def _score_documents(self, query_tokens: list[str]) -> dict[int, float]:
+        """すべての候補文書のスコア {文書ID: スコア}（Term-at-a-time。検証・比較用）"""
+        scores: dict[int, float] = {}
+        for _, query_tf, term_scores in self._query_terms(query_tokens):
+            for doc_id, score in zip(term_scores.docs, term_scores.scores):
+                scores[doc_id] = scores.get(doc_id, 0.0) + score * query_tf
+        return scores
+
+    def _top_k(self, query_tokens: list[str], limit: int, published_set: frozenset[str] | None,
+               include: set[int] | frozenset[int] | None = None, exclude: set[int] | None = None) -> list[tuple[int, float]]:
+        """スコア上位limit件の (文書ID, スコア) をMaxScoreで求める（Term-at-a-time）。
+
+        published_set・include（文書ID）にない文書とexclude（文書ID）の文書は対象外。
+
+        語を上限スコアの降順に処理して文書ごとのスコアを累積する。暫定のlimit件目のスコア（閾値）が
+        未処理の語の上限スコアの和を超えたら、以降の語（非必須語）のみを含む文書は上位に入りえないため
+        新しい候補を作らず、累積値 + 残りの上限スコアが閾値に届かない候補も捨てる。
+        非必須語は残った候補のみをポスティングの二分探索で引くため、寄与の小さいポスティングの大半は読まない。
+        結果は全文書を評価した場合の上位limit件（同点はパス順）と一致する。
+        """
+        terms = self._query_terms(query_tokens)
+        if not terms or limit <= 0:
+            return []
+        doc_paths = self._doc_paths
+        ranks = self._path_ranks
+        if include is not None and len(include) * 8 < sum(len(t[2].docs) for t in terms):
+            # 対象が少なければ対象の文書のみをスコア計算する
+            results = [
+                (doc_id, self._exact_score(terms, doc_id)) for doc_id in include
+                if (published_set is None or doc_paths[doc_id] in published_set)
+                and (exclude is None or doc_id not in exclude)
+            ]
+            return nsmallest(limit, [r for r in results if r[1] > 0], key=lambda x: (-x[1], ranks[x[0]]))
+
+        filtered = published_set is not None or include is not None or exclude is not None
+
+        def accepted(doc_id: int) -> bool:
+            return ((published_set is None or doc_paths[doc_id] in published_set)
+                    and (include is None or doc_id in include)
+                    and (exclude is None or doc_id not in exclude))
+
+        def visible_scores(acc: dict[int, float]):
+            if not filtered:
+                return acc.values()
+            return (score for doc_id, score in acc.items() if accepted(doc_id))
+
+        # remaining[i]: 上限スコアの降順でi番目以降の語の上限スコアの和
+        ordered = terms[::-1]
+        remaining = [bound * _BOUND_MARGIN for bound in accumulate(t[0] for t in terms)][::-1] + [0.0]
+
+        acc: dict[int, float] = {}
+        threshold = 0.0
+        essential = True
+        for i, (_, query_tf, term_scores) in enumerate(ordered):
+            docs, scores = term_scores.docs, term_scores.scores
+            if not acc:
+                acc = dict(zip(docs, scores)) if query_tf == 1 else {
+                    doc_id: score * query_tf for doc_id, score in zip(docs, scores)
+                }
+            elif essential:
+                for doc_id, score in zip(docs, scores):
+                    acc[doc_id] = acc.get(doc_id, 0.0) + score * query_tf
+            elif len(acc) * 8 < len(docs):
+                # 候補が少なければ候補ごとにポスティングを二分探索する
+                size = len(docs)
+                for doc_id in acc:
+                    j = bisect_left(docs, doc_id)
+                    if j < size and docs[j] == doc_id:
+                        acc[doc_id] += scores[j] * query_tf
+            else:
+                term_map = dict(zip(docs, scores))
+                for doc_id in acc.keys() & term_map.keys():
+                    acc[doc_id] += term_map[doc_id] * query_tf
+
+            top = nlargest(limit, visible_scores(acc))
+            if len(top) < limit:
+                continue
+            threshold = top[-1]
+            rest = remaining[i + 1]
+            if essential and rest < threshold:
+                essential = False
+            if not essential:
+                acc = {doc_id: score for doc_id, score in acc.items() if score * _BOUND_MARGIN + rest >= threshold}
+
+        if filtered:
+            acc = {doc_id: score for doc_id, score in acc.items() if accepted(doc_id)}
+        if len(acc) > limit:
+            acc = {doc_id: score for doc_id, score in acc.items() if score * _BOUND_MARGIN >= threshold}
+
+        # 上位に入りうる文書は、加算順序を揃えたスコアで比較する
+        results = [(doc_id, self._exact_score(terms, doc_id)) for doc_id in acc]
+        return nsmallest(limit, results, key=lambda x: (-x[1], ranks[x[0]]))
+
+    def _phrase_docs(self, tokens: list[str]) -> frozenset[int]:
+        """tokensがいずれかのフィールドで連続して出現する文書IDの集合（位置情報から判定する）"""
+        term_ids = [self.vocab.get(token) for token in tokens]
+        if None in term_ids:
+            return frozenset()
+        key = tuple(term_ids)
+        with self._term_scores_lock:
+            cached = self._term_scores.get(key)
+            if cached is not None:
+                self._term_scores.move_to_end(key)
+                return cached
+
+        matched: set[int] = set()
+        for field in FIELDS:
+            matched |= self._phrase_docs_in_field(field, term_ids)
+        matched = frozenset(matched)
+        with self._term_scores_lock:
+            self._term_scores[key] = matched
+            if len(self._term_scores) > SEARCH_TERM_CACHE_SIZE:
+                self._term_scores.popitem(last=False)
+        return matched
+
+    def _phrase_docs_in_field(self, field: int, term_ids: list[int]) -> set[int]:
+        lists = [self._postings[field][term_id] for term_id in term_ids]
+        if any(postings is None or not postings.docs for postings in lists):
+            return set()
+        # 出現文書数が最少の語の文書を起点に、他の語の文書をギャロッピング探索で照合する
+        order = sorted(range(len(lists)), key=lambda j: len(lists[j].docs))
+        cursors = [0] * len(lists)
+        offsets = [0] * len(lists)  # cursorsの文書の出現位置がpositions上で始まる位置
+        matched = set()
+        for doc_id in lists[order[0]].docs:
+            found = True
+            for j in order:
+                postings = lists[j]
+                i = _gallop(postings.docs, doc_id, cursors[j])
+                if i > cursors[j]:
+                    offsets[j] += sum(postings.tfs[cursors[j]:i])
+                    cursors[j] = i
+                if i == len(postings.docs):
+                    return matched
+                if postings.docs[i] != doc_id:
+                    found = False
+                    break
+            if not found:
+                continue
 
+            # 先頭位置の候補を、j番目の語が (先頭位置 + j) に出現するものに絞り込む
+            # （文書内の出現回数が少ない語から順に、ずらした出現位置の集合と積を取る）
+            starts = None
+            for tf, j in sorted((lists[j].tfs[cursors[j]], j) for j in order):
+                offset = offsets[j]
+                shifted = set(map(sub, accumulate(lists[j].positions[offset:offset + tf]), repeat(j)))
+                if starts is None:
+                    starts = shifted
+                else:
+                    starts &= shifted
+                if not starts:
+                    break
+            if starts:
+                matched.add(doc_id)
+        return matched
+
+    @staticmethod
+    def _exact_score(terms: list[tuple[float, int, TermScores]], doc_id: int) -> float:
+        """_query_termsの順で寄与を加算したスコア"""
+        score = 0.0
+        for _, query_tf, term_scores in terms:
+            j = bisect_left(term_scores.docs, doc_id)
+            if j < len(term_scores.docs) and term_scores.docs[j] == doc_id:
+                score += term_scores.scores[j] * query_tf
         return score
 
-    def _generate_snippet(self, body_text: str, query_tokens: set[str],
-                          max_len: int = 120) -> str:
-        """マッチ箇所前後のスニペットを生成"""
-        text_lower = body_text.lower()
-        best_pos = -1
-        best_density = 0
-
-        # スライディングウィンドウでマッチ密度が最大の箇所を探す
-        window = max_len
-        for start in range(0, max(1, len(body_text) - window + 1), 20):
-            chunk = text_lower[start:start + window]
-            density = sum(1 for t in query_tokens if t in chunk)
-            if density > best_density:
-                best_density = density
-                best_pos = start
-            if best_density >= len(query_tokens):
-                break
+    def _body_matches(self, doc_id: int, term_ids: list[int]):
+        """(本文でのクエリ語の (出現位置, term_idsの添字) を出現位置順に返すイテレータ, 本文に含まれる語の数)。
 
-        if best_pos < 0:
+        ポスティングの位置情報を語ごとに復号しながらマージする（読み進めた分のみ復号する）。
+        """
+        streams = []
+        field_postings = self._postings[FIELD_BODY]
+        for j, term_id in enumerate(term_ids):
+            postings = field_postings[term_id]
+            if postings is None:
+                continue
+            i = postings._find(doc_id)
+            if i < 0:
+                continue
+            offset = sum(postings.tfs[:i])
+            streams.append(zip(accumulate(postings.positions[offset:offset + postings.tfs[i]]), repeat(j)))
+        return merge(*streams), len(streams)
+
+    def _proximities(self, doc_ids: list[int], term_ids: list[int], query_terms: int) -> dict[int, float]:
+        """文書ごとの本文でのクエリ語の近接度の加点（0〜SEARCH_PROXIMITY_WEIGHT）。
+
+        本文に出現するクエリ語（k語）をすべて含む最短の区間の長さをspanとして、
+        SEARCH_PROXIMITY_WEIGHT * (k - 1) / (クエリの語数 - 1) * k / span。
+        k語が連続して出現する場合に最大となり、離れるほど小さくなる。k < 2 の場合は0。
+        出現位置は語ごとにポスティングを文書IDの昇順に1回たどって取り出す。
+        """
+        targets = sorted(doc_ids)
+        matches: dict[int, list[tuple[int, int]]] = {doc_id: [] for doc_id in targets}
+        present = dict.fromkeys(targets, 0)
+        field_postings = self._postings[FIELD_BODY]
+        for j, term_id in enumerate(term_ids):
+            postings = field_postings[term_id]
+            if postings is None or not postings.docs:
+                continue
+            docs, tfs = postings.docs, postings.tfs
+            cursor = offset = 0
+            for doc_id in targets:
+                i = _gallop(docs, doc_id, cursor)
+                if i == len(docs):
+                    break
+                offset += sum(tfs[cursor:i])
+                cursor = i
+                if docs[i] == doc_id:
+                    matches[doc_id] += zip(accumulate(postings.positions[offset:offset + tfs[i]]), repeat(j))
+                    present[doc_id] += 1
+
+        boosts = {}
+        for doc_id in targets:
+            k = present[doc_id]
+            if k < 2:
+                boosts[doc_id] = 0.0
+                continue
+            last: dict[int, int] = {}
+            span = None
+            for pos, j in sorted(matches[doc_id]):
+                last[j] = pos
+                if len(last) == k:
+                    width = pos - min(last.values()) + 1
+                    if span is None or width < span:
+                        span = width
+                        if span == k:
+                            break
+            boosts[doc_id] = SEARCH_PROXIMITY_WEIGHT * (k - 1) / (query_terms - 1) * k / span
+        return boosts
+
+    def _ranked(self, query_tokens: list[str], term_ids: list[int], limit: int,
+                published_set: frozenset[str] | None, include: set[int] | frozenset[int] | None = None,
+                exclude: set[int] | None = None) -> list[tuple[int, float]]:
+        """スコア上位limit件の (文書ID, スコア)（同点はパス順）。
+
+        複数語のクエリでは、_top_kで求めたBM25Fの上位max(limit, SEARCH_PROXIMITY_CANDIDATES)件に
+        近接度の加点を加えて並べ直す。
+        """
+        query_terms = len(set(query_tokens))
+        if query_terms < 2 or len(term_ids) < 2 or limit <= 0:
+            return self._top_k(query_tokens, limit, published_set, include=include, exclude=exclude)
+        candidates = self._top_k(query_tokens, max(limit, SEARCH_PROXIMITY_CANDIDATES), published_set,
+                                 include=include, exclude=exclude)
+        boosts = self._proximities([doc_id for doc_id, _ in candidates], term_ids, query_terms)
+        ranks = self._path_ranks
+        return nsmallest(limit, [(doc_id, score + boosts[doc_id]) for doc_id, score in candidates],
+                         key=lambda x: (-x[1], ranks[x[0]]))
+
+    def _generate_snippet(self, body_text: str, doc_id: int, terms: list[tuple[str, int]],
+                          max_len: int = 120, lead: int = 20) -> tuple[str, list[list[int]]]:
+        """マッチ箇所前後のスニペットと、スニペット内のマッチ箇所（[開始, 終了] の文字位置）を生成。
+
+        termsは (語, 語彙ID)。本文でのクエリ語の出現位置をポスティングから出現順に求め、
+        語ごとのn回目の出現位置を本文中のn番目のトークンの文字位置に対応付ける。
+        異なる語を最も多く含む最初の範囲を選ぶ（範囲の先頭のマッチの前にlead文字を残す）。
+        本文は選んだ範囲の末尾までの各語の出現箇所のみを探す。
+        """
+        matches, target = self._body_matches(doc_id, [term_id for _, term_id in terms])
+        if not target:
             # フォールバック: 先頭を返す
-            return body_text[:max_len] + ("..." if len(body_text) > max_len else "")
+            return body_text[:max_len] + ("..." if len(body_text) > max_len else ""), []
+
+        text_lower = body_text.lower()
+        to_body = None
+        if len(text_lower) != len(body_text):
+            # 小文字化で文字数が変わる文字を含む場合は、小文字化後の位置を本文の位置に対応付ける
+            to_body = [i for i, ch in enumerate(body_text) for _ in ch.lower()]
+        offsets = [_token_offsets(text_lower, token) for token, _ in terms]
+
+        # 範囲に含まれる異なる語の数が最大となる最初の範囲（尺取り法）
+        span = max_len - lead
+        hits = []  # (開始, 終了, 語) を出現順に、必要になった分だけ求める
+        counts: Counter = Counter()
+        best, best_first = 0, 0
+        first = 0
+        window_end = None
+        for _, j in matches:
+            hit_start = next(offsets[j], None)
+            if hit_start is None:
+                break
+            hit_end = hit_start + len(terms[j][0])
+            if to_body is not None:
+                hit_start, hit_end = to_body[hit_start], to_body[hit_end - 1] + 1
+            hits.append((hit_start, hit_end, j))
+            if window_end is not None:
+                # 範囲の末尾までのマッチを読み進める
+                if hit_start >= window_end:
+                    break
+                continue
 
-        start = best_pos
+            counts[j] += 1
+            while hit_end - hits[first][0] > span:
+                first_term = hits[first][2]
+                counts[first_term] -= 1
+                if not counts[first_term]:
+                    del counts[first_term]
+                first += 1
+            if len(counts) > best:
+                best, best_first = len(counts), first
+                if best == target:
+                    window_end = max(0, hits[best_first][0] - lead) + max_len
+        if not hits:
+            return body_text[:max_len] + ("..." if len(body_text) > max_len else ""), []
+
+        start = max(0, hits[best_first][0] - lead)
         end = min(len(body_text), start + max_len)
         prefix = "..." if start > 0 else ""
         suffix = "..." if end < len(body_text) else ""
-        return prefix + body_text[start:end] + suffix
-
-    def search(self, query: str, is_localhost: bool, file_cache: list[dict],
-               limit: int = 20) -> list[dict]:
-        """TF-IDFスコア付き検索を実行"""
-        query_tokens = tokenize_query(query)
-        if not query_tokens:
-            return []
 
-        query_token_set = set(query_tokens)
-
-        # 候補文書を収集（いずれかのトークンを含む文書）
-        candidate_paths: set[str] = set()
-        for token in query_token_set:
-            if token in self.inverted_index:
-                candidate_paths.update(self.inverted_index[token].keys())
-            if token in self.title_index:
-                candidate_paths.update(self.title_index[token].keys())
-            if token in self.path_index:
-                candidate_paths.update(self.path_index[token].keys())
-
-        # 公開フィルタ用のルックアップ
-        published_set = None
-        if not is_localhost:
-            published_set = {f["path"] for f in file_cache if f.get("published")}
-
-        # ファイル情報のルックアップ
-        file_lookup = {f["path"]: f for f in file_cache}
-
-        # スコアリングと結果構築
-        scored_results = []
-        for path in candidate_paths:
-            if published_set is not None and path not in published_set:
+        # 範囲内のマッチ箇所（重なる・隣接するバイグラムはまとめる）
+        highlights: list[list[int]] = []
+        for hit_start, hit_end, _ in hits:
+            if hit_start >= end:
+                break
+            if hit_start < start or hit_end > end:
                 continue
+            hit_start += len(prefix) - start
+            hit_end += len(prefix) - start
+            if highlights and hit_start <= highlights[-1][1]:
+                highlights[-1][1] = max(highlights[-1][1], hit_end)
+            else:
+                highlights.append([hit_start, hit_end])
+        return prefix + body_text[start:end] + suffix, highlights
 
-            score = self._score_document(path, query_tokens)
-            if score > 0:
-                scored_results.append((path, score))
+    def search(self, query: str, is_localhost: bool, records: dict[str, dict],
+               published_paths: frozenset[str], limit: int = 20) -> list[dict]:
+        """BM25Fスコア（複数語のクエリでは近接度の加点を含む）付き検索を実行。
 
-        # スコア降順ソート
-        scored_results.sort(key=lambda x: x[1], reverse=True)
+        records・published_pathsはスナップショットのパス→レコード・公開パス集合
+        （リフレッシュ時に1回だけ構築されたものを使い、クエリごとには作らない）。
+        """
+        query_tokens = tokenize_query(query)
+        if not query_tokens:
+            return []
 
-        # 結果を構築
+        published_set = None if is_localhost else published_paths
+
+        # 引用符で囲んだフレーズは、連続して出現する文書のみに絞り込む
+        required, proximity = parse_query(query)
+        include = None
+        if required:
+            include = frozenset.intersection(*(self._phrase_docs(tokens) for tokens in required))
+            if not include:
+                return []
+
+        # 近接フレーズが連続して出現する数の多い文書から順に、スコア（近接度の加点を含む）上位limit件
+        # （同点はパス順。文書IDの振り方によらず結果を一定にする）
+        term_ids = [term_id for token in dict.fromkeys(query_tokens) if (term_id := self.vocab.get(token)) is not None]
+        phrase_counts = Counter()
+        for tokens in proximity:
+            phrase_counts.update(self._phrase_docs(tokens))
+        if include is not None:
+            phrase_counts = Counter({doc_id: n for doc_id, n in phrase_counts.items() if doc_id in include})
+        top_results = []
+        for n in sorted(set(phrase_counts.values()), reverse=True):
+            tier = {doc_id for doc_id, count in phrase_counts.items() if count == n}
+            top_results += self._ranked(query_tokens, term_ids, limit - len(top_results), published_set, include=tier)
+            if len(top_results) >= limit:
+                break
+        if len(top_results) < limit:
+            top_results += self._ranked(query_tokens, term_ids, limit - len(top_results), published_set,
+                                        include=include, exclude=set(phrase_counts) or None)
+
+        # 結果を構築（スニペットには索引にあるクエリ語を重複なしで使う）
+        terms = [
+            (token, term_id) for token in dict.fromkeys(query_tokens)
+            if (term_id := self.vocab.get(token)) is not None
+        ]
         results = []
-        for path, score in scored_results[:limit]:
-            f = file_lookup.get(path)
+        for doc_id, score in top_results:
+            path = self._doc_paths[doc_id]
+            f = records.get(path)
             if not f:
                 continue
 
-            snippet = self._generate_snippet(
-                f.get("body_text", ""), query_token_set
-            )
+            snippet, highlights = self._generate_snippet(f.get("body_text", ""), doc_id, terms)
 
             results.append({
                 "title": f["title"],
                 "path": f["path"],
-                "slug": app_cache.PATH_TO_SLUG.get(f["path"], f["path"]),
+                "slug": f.get("slug", f["path"]),
                 "snippet": snippet,
+                "highlights": highlights,
                 "score": round(score, 4),
             })
 
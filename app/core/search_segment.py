@@ -0,0 +1,263 @@
+"""検索インデックスのディスク永続化（mmapで開くセグメントファイル）
+
+フルビルド・差分リフレッシュ後にSearchIndexを1つのファイルに書き出し、起動時はmmapで開く。
+語彙・ポスティングはファイル上のまま参照する（語彙はバイト列の二分探索、
+ポスティングはmemoryview）ため、起動時に本文のトークン化やPythonオブジェクトへの展開は行わない。
+差分リフレッシュで変更した語彙のみ、Copy-on-Writeでメモリ上のarrayに複製される。
+
+ファイル構成（数値はネイティブのバイトオーダー。ヘッダーにバイトオーダーを記録し、異なる場合は使わない）:
+    ヘッダー: MAGIC, バイトオーダー, 文書数, 語彙数, 内容のフィンガープリント, セクション表
+    文書表: パスのオフセット / パス（UTF-8） / フィールドごとのトークン数
+    語彙: 語のオフセット / 語（UTF-8、バイト順にソート。語彙IDはこの順序）
+    フィールド（本文・タイトル・パス）ごと: 語彙IDごとの文書の開始位置 / 出現位置の開始位置 /
+        文書ID / 出現回数 / 差分符号化した出現位置
+"""
+import hashlib
+import logging
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from app.config import SEARCH_INDEX_FILE
+from app.core.search import Postings, SearchIndex, as_array
+
+logger = logging.getLogger("app.search_segment")
+
+# トークナイザー・ファイル構成を変更した場合は更新する（古いファイルは使われない）
+MAGIC = b"OVSIDX02"
+_FIELDS = 3
+# 文書表（2 + フィールド数）・語彙（2）・フィールドごとのポスティング（5）
+_FIELDS_START = 4 + _FIELDS
+_SECTIONS = _FIELDS_START + 5 * _FIELDS
+_HEADER = struct.Struct(f"=8scxxxII32s{_SECTIONS * 2}Q")
+_BYTEORDER = b"<" if sys.byteorder == "little" else b">"
+
+
+def index_fingerprint(files) -> str | None:
+    """インデックス対象のノート（パスと内容のハッシュ）から算出する値。内容のハッシュがないものがあればNone"""
+    h = hashlib.blake2b(digest_size=16)
+    for path, content_hash in sorted((f["path"], f["content_hash"]) for f in files):
+        if content_hash is None:
+            return None
+        h.update(f"{path}\0{content_hash}\n".encode("utf-8"))
+    return h.hexdigest()
+
+
+def _join_strings(values) -> tuple[array, bytes]:
+    """文字列の並びを (オフセット, 連結したUTF-8) にする"""
+    offsets = array('I', [0])
+    blob = bytearray()
+    for value in values:
+        blob += value
+        offsets.append(len(blob))
+    return offsets, bytes(blob)
+
+
+def write_segment(idx: SearchIndex, fingerprint: str) -> None:
+    """インデックスをSEARCH_INDEX_FILEに書き出す（一時ファイル経由でアトミックに置き換え）"""
+    if idx.dead_documents:
+        idx = idx.compact()
+
+    doc_path_offsets, doc_path_blob = _join_strings(p.encode("utf-8") for p in idx._doc_paths)
+    terms = sorted((token.encode("utf-8"), term_id) for token, term_id in idx.vocab.items())
+    term_offsets, term_blob = _join_strings(term for term, _ in terms)
+    sections = [doc_path_offsets, doc_path_blob, *idx._field_lengths, term_offsets, term_blob]
+
+    for field in range(_FIELDS):
+        field_postings = idx._postings[field]
+        doc_starts = array('I', [0])
+        position_starts = array('I', [0])
+        docs, tfs, positions = array('I'), array('I'), array('I')
+        for _, term_id in terms:
+            postings = field_postings[term_id]
+            if postings is not None and postings.docs:
+                docs.frombytes(memoryview(postings.docs).cast('B'))
+                tfs.frombytes(memoryview(postings.tfs).cast('B'))
+                positions.frombytes(memoryview(postings.positions).cast('B'))
+            doc_starts.append(len(docs))
+            position_starts.append(len(positions))
+        sections += [doc_starts, position_starts, docs, tfs, positions]
+
+    # セクションは8バイト境界に揃えて配置する
+    table = []
+    offset = _HEADER.size
+    for section in sections:
+        data = section if isinstance(section, bytes) else section.tobytes()
+        offset += -offset % 8
+        table += [offset, len(data)]
+        offset += len(data)
+
+    tmp_path = SEARCH_INDEX_FILE.with_name(SEARCH_INDEX_FILE.name + ".tmp")
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(_HEADER.pack(MAGIC, _BYTEORDER, idx.doc_count, len(terms),
+                                 fingerprint.encode("ascii"), *table))
+            for section, start in zip(sections, table[::2]):
+                f.write(b"\0" * (start - f.tell()))
+                f.write(section if isinstance(section, bytes) else section.tobytes())
+        os.replace(tmp_path, SEARCH_INDEX_FILE)
+        logger.info("Search index segment saved: %d docs, %d terms.", idx.doc_count, len(terms))
+    except Exception as e:
+        logger.warning("Failed to save search index segment: %s", e)
+
+
+class SearchSegment:
+    """mmapで開いたセグメントファイル"""
+
+    def __init__(self, fileobj):
+        self._map = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        header = _HEADER.unpack_from(self._map)
+        magic, byteorder, self.doc_count, self.term_count, fingerprint = header[:5]
+        if magic != MAGIC or byteorder != _BYTEORDER:
+            raise ValueError("unsupported search index segment")
+        self.fingerprint = fingerprint.decode("ascii")
+
+        view = memoryview(self._map)
+        table = header[5:]
+        sections = [view[start:start + length] for start, length in zip(table[::2], table[1::2])]
+        self._doc_path_offsets = sections[0].cast("I")
+        self._doc_path_blob = sections[1]
+        self.field_lengths = [section.cast("I") for section in sections[2:2 + _FIELDS]]
+        self._term_offsets = sections[2 + _FIELDS].cast("I")
+        self._term_blob_start = table[2 * (3 + _FIELDS)]
+        self._fields = [
+            tuple(section.cast("I") for section in sections[_FIELDS_START + 5 * field:_FIELDS_START + 5 * (field + 1)])
+            for field in range(_FIELDS)
+        ]
+
+    def doc_paths(self) -> list[str]:
+        offsets = self._doc_path_offsets
+        blob = self._doc_path_blob
+        return [bytes(blob[offsets[i]:offsets[i + 1]]).decode("utf-8") for i in range(self.doc_count)]
+
+    def find_term(self, token: str) -> int:
+        """語彙ID（含まれない場合は-1）。ソート済みの語をファイル上で二分探索する"""
+        key = token.encode("utf-8")
+        offsets = self._term_offsets
+        base = self._term_blob_start
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            term = self._map[base + offsets[mid]:base + offsets[mid + 1]]
+            if term < key:
+                lo = mid + 1
+            elif term > key:
+                hi = mid
+            else:
+                return mid
+        return -1
+
+    def terms(self):
+        """(語, 語彙ID) を語彙ID順に返す"""
+        offsets = self._term_offsets
+        base = self._term_blob_start
+        for term_id in range(self.term_count):
+            yield self._map[base + offsets[term_id]:base + offsets[term_id + 1]].decode("utf-8"), term_id
+
+    def postings(self, field: int, term_id: int) -> Postings | None:
+        doc_starts, position_starts, docs, tfs, positions = self._fields[field]
+        start, end = doc_starts[term_id], doc_starts[term_id + 1]
+        if start == end:
+            return None
+        return Postings(docs[start:end], tfs[start:end],
+                        positions[position_starts[term_id]:position_starts[term_id + 1]])
+
+
+class SegmentVocab:
+    """セグメントの語彙と、差分更新で追加した語彙（extra）を合わせた {語: 語彙ID}"""
+
+    def __init__(self, segment: SearchSegment, extra: dict[str, int] | None = None):
+        self._segment = segment
+        self._extra = extra if extra is not None else {}
+
+    def get(self, token: str, default=None):
+        term_id = self._extra.get(token)
+        if term_id is not None:
+            return term_id
+        term_id = self._segment.find_term(token)
+        return default if term_id < 0 else term_id
+
+    def __contains__(self, token: str) -> bool:
+        return self.get(token) is not None
+
+    def __setitem__(self, token: str, term_id: int) -> None:
+        self._extra[token] = term_id
+
+    def __len__(self) -> int:
+        return self._segment.term_count + len(self._extra)
+
+    def items(self):
+        yield from self._segment.terms()
+        yield from self._extra.items()
+
+    def copy(self) -> "SegmentVocab":
+        return SegmentVocab(self._segment, dict(self._extra))
+
+
+class SegmentPostingsTable:
+    """1フィールド分の [語彙ID → Postings | None]。
+
+    セグメント上のポスティングを参照し、差分更新で置き換えたもの・追加した語彙の分はoverridesに持つ。
+    """
+
+    def __init__(self, segment: SearchSegment, field: int, overrides: dict | None = None, extra: int = 0):
+        self._segment = segment
+        self._field = field
+        self._overrides = overrides if overrides is not None else {}
+        self._extra = extra
+
+    def __len__(self) -> int:
+        return self._segment.term_count + self._extra
+
+    def __getitem__(self, term_id: int) -> Postings | None:
+        postings = self._overrides.get(term_id)
+        if postings is not None or term_id in self._overrides:
+            return postings
+        if term_id < self._segment.term_count:
+            return self._segment.postings(self._field, term_id)
+        return None
+
+    def __setitem__(self, term_id: int, postings: Postings | None) -> None:
+        self._overrides[term_id] = postings
+
+    def __iter__(self):
+        for term_id in range(len(self)):
+            yield self[term_id]
+
+    def append(self, postings: Postings | None) -> None:
+        if postings is not None:
+            self._overrides[len(self)] = postings
+        self._extra += 1
+
+    def copy(self) -> "SegmentPostingsTable":
+        return SegmentPostingsTable(self._segment, self._field, dict(self._overrides), self._extra)
+
+
+def open_segment(fingerprint: str | None) -> SearchIndex | None:
+    """SEARCH_INDEX_FILEをmmapで開く。内容がfingerprintと一致しない・読めない場合はNone"""
+    if fingerprint is None or not SEARCH_INDEX_FILE.exists():
+        return None
+    try:
+        with open(SEARCH_INDEX_FILE, "rb") as f:
+            segment = SearchSegment(f)
+    except Exception as e:
+        logger.warning("Failed to open search index segment: %s", e)
+        return None
+    if segment.fingerprint != fingerprint:
+        logger.info("Search index segment is stale. Ignoring.")
+        return None
+
+    idx = SearchIndex()
+    idx.vocab = SegmentVocab(segment)
+    idx._postings = tuple(SegmentPostingsTable(segment, field) for field in range(_FIELDS))
+    idx._doc_paths = segment.doc_paths()
+    idx._doc_ids = {path: doc_id for doc_id, path in enumerate(idx._doc_paths)}
+    # 文書ごとのトークン数は差分更新で書き換えるため、メモリ上にコピーする（文書数分のみ）
+    idx._field_lengths = tuple(as_array(lengths) for lengths in segment.field_lengths)
+    idx.doc_count = segment.doc_count
+    idx._prepare_scores()
+    logger.info("Search index segment opened: %d docs, %d terms.", segment.doc_count, segment.term_count)
+    return idx
+
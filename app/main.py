@@ -8,10 +8,11 @@ logger = logging.getLogger("app.main")
 
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
-from app.config import STATICS_DIR
+from app.config import STATICS_DIR, WATCH_ENABLED
 from app.api.routes import router
-from app.core.indexing import refresh_global_caches
+from app.core.indexing import flush_snapshot, initialize_caches
 from app.services.sync import background_sync_loop
+from app.services.watcher import start_watcher, stop_watcher
 
 app = FastAPI(title="Obsidian Viewer")
 
@@ -25,7 +26,19 @@ app.include_router(router)
 async def startup_event():
     logger.info("Obsidian Viewer starting up")
     # Initialize cache in a thread to avoid blocking startup
+    # (永続化済みのメタデータキャッシュがあれば差分のみ再検証)
     loop = asyncio.get_event_loop()
-    loop.run_in_executor(None, refresh_global_caches)
+    loop.run_in_executor(None, initialize_caches)
     # Start background sync
     asyncio.create_task(background_sync_loop())
+    # コンテンツ・画像の変更をリアルタイムにインデックスへ反映
+    if WATCH_ENABLED:
+        start_watcher()
+
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    stop_watcher()
+    # 差分リフレッシュで予約中の永続化があれば書き出してから終了する
+    loop = asyncio.get_event_loop()
+    await loop.run_in_executor(None, flush_snapshot)
@@ -1,5 +1,6 @@
 """コンテンツレンダリングサービス"""
 import re
+from app import cache
 from app.core.markdown import md, process_admonition_blocks
 from app.services.images import process_obsidian_images
 
@@ -19,10 +20,14 @@ def _inject_note_icons(html: str) -> str:
     )
 
 
-def render_markdown(body: str) -> str:
-    """Markdownレンダリングパイプラインを統合実行する"""
+def render_markdown(body: str, snapshot: cache.VaultSnapshot | None = None) -> str:
+    """Markdownレンダリングパイプラインを統合実行する
+
+    内部リンクとDataviewはsnapshot（省略時は現在公開中のもの）に対して解決する。
+    """
+    snapshot = snapshot or cache.get_snapshot()
     body = process_admonition_blocks(body)
-    body = process_obsidian_images(body)
-    html = md.render(body)
+    body = process_obsidian_images(body, snapshot)
+    html = md.render(body, {"snapshot": snapshot})
     html = _inject_note_icons(html)
     return html
@@ -34,7 +34,9 @@ def find_image_in_static(filename: str) -> str | None:
                     
     return None
 
-def process_obsidian_images(content: str) -> str:
+def process_obsidian_images(content: str, snapshot: cache.VaultSnapshot | None = None) -> str:
+    snapshot = snapshot or cache.get_snapshot()
+
     def replace_image(match):
         full_match = match.group(0)
         filename = match.group(1).strip()
@@ -64,9 +66,9 @@ def process_obsidian_images(content: str) -> str:
         # .md拡張子付きの場合はstemで検索
         lookup_name = filename[:-3] if filename.endswith('.md') else filename
 
-        target_path = cache.FILE_NAME_CACHE.get(lookup_name)
+        target_path = snapshot.file_names.get(lookup_name)
         if target_path:
-            slug = cache.PATH_TO_SLUG.get(target_path, target_path)
+            slug = snapshot.path_to_slug.get(target_path, target_path)
             return f'<a href="/view/{slug}" class="internal-link">{display_name}</a>'
         else:
             return f'<span class="internal-link-broken">{display_name}</span>'
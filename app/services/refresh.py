@@ -0,0 +1,205 @@
+"""インデックス更新の要求キュー
+
+エディタ保存・再インデックス・同期・ファイル監視からの更新要求を1つのワーカースレッドで処理する。
+デバウンス期間内に届いた要求は1回のリフレッシュにまとめ、イベントループはブロックしない。
+要求ごとに番号(ticket)を返すため、呼び出し側は完了を待つか、状態をポーリングできる。
+イベントループからの完了待ちはスレッドを使わず、ワーカーがloop.call_soon_threadsafeでFutureを解決する。
+"""
+import asyncio
+import logging
+import threading
+import time
+
+from app import cache
+from app.config import REFRESH_DEBOUNCE_SECONDS, REFRESH_MAX_DELAY_SECONDS
+
+logger = logging.getLogger("app.refresh")
+
+
+class RefreshQueue:
+    """リフレッシュ要求を集約して1つのワーカースレッドで順に反映する"""
+
+    def __init__(self, debounce: float, max_delay: float):
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self._cond = threading.Condition()
+        # 保留中の要求（full > incremental > paths の順に包含する。incremental時のpathsはforce対象）
+        self._paths: set[str] = set()
+        self._force = False
+        self._incremental = False
+        self._full = False
+        self._requested = 0  # 最後に受け付けた要求の番号
+        self._completed = 0  # 反映済みの要求の番号
+        self._running = False
+        self._first_request = 0.0
+        self._last_request = 0.0
+        self._last_error: str | None = None
+        self._last_duration: float | None = None
+        self._thread: threading.Thread | None = None
+        # 非同期の完了待ち [(ticket, イベントループ, Future)]
+        self._async_waiters: list[tuple[int, asyncio.AbstractEventLoop, asyncio.Future]] = []
+
+    def _has_pending(self) -> bool:
+        return self._full or self._incremental or bool(self._paths)
+
+    def request(self, paths: list[str] | None = None, force: bool = True,
+                incremental: bool = False, full: bool = False) -> int:
+        """更新要求を登録し、完了待ちに使う要求番号を返す"""
+        with self._cond:
+            if not (full or incremental or paths):
+                return self._requested
+            now = time.monotonic()
+            if not self._has_pending():
+                self._first_request = now
+            self._last_request = now
+
+            if full:
+                self._full = True
+            elif incremental:
+                self._incremental = True
+            if paths and not full:
+                # 差分リフレッシュと併せて要求されたpathsは、force時に内容のハッシュで再判定する
+                self._paths.update(paths)
+                self._force = self._force or force
+
+            self._requested += 1
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="refresh-worker", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+            return self._requested
+
+    def wait(self, ticket: int, timeout: float | None = None) -> bool:
+        """要求番号ticketまでの反映が完了するまで待つ。タイムアウトした場合はFalse"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._completed >= ticket, timeout)
+
+    async def wait_async(self, ticket: int, timeout: float | None = None) -> bool:
+        """イベントループをブロックせず、スレッドも占有せずにticketまでの反映完了を待つ。
+        タイムアウトした場合はFalse"""
+        loop = asyncio.get_running_loop()
+        with self._cond:
+            if self._completed >= ticket:
+                return True
+            waiter = (ticket, loop, loop.create_future())
+            self._async_waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter[2], timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            with self._cond:
+                if waiter in self._async_waiters:
+                    self._async_waiters.remove(waiter)
+
+    def _wake_async_waiters(self) -> None:
+        """反映済みになった非同期の完了待ちを、それぞれのイベントループ上で解決する（_condを保持した状態で呼ぶ）"""
+        pending = []
+        for ticket, loop, future in self._async_waiters:
+            if ticket > self._completed:
+                pending.append((ticket, loop, future))
+                continue
+            try:
+                loop.call_soon_threadsafe(_resolve, future)
+            except RuntimeError:
+                # 待っていたイベントループが終了済み
+                pass
+        self._async_waiters = pending
+
+    def status(self) -> dict:
+        with self._cond:
+            if self._running:
+                state = "running"
+            elif self._has_pending():
+                state = "pending"
+            else:
+                state = "idle"
+            return {
+                "state": state,
+                "requested": self._requested,
+                "completed": self._completed,
+                "generation": cache.get_snapshot().generation,
+                "last_error": self._last_error,
+                "last_duration_ms": round(self._last_duration * 1000, 1) if self._last_duration is not None else None,
+            }
+
+    def _take_pending(self) -> tuple[int, bool, bool, list[str], bool]:
+        """デバウンス後に保留中の要求を取り出す（_condを保持した状態で呼ぶ）"""
+        while not self._has_pending():
+            self._cond.wait()
+
+        # 連続した要求はまとめて反映（ただし最大遅延を超えたら反映する）
+        while True:
+            now = time.monotonic()
+            remaining = min(self._last_request + self.debounce, self._first_request + self.max_delay) - now
+            if remaining <= 0:
+                break
+            self._cond.wait(remaining)
+
+        job = (self._requested, self._full, self._incremental, sorted(self._paths), self._force)
+        self._paths = set()
+        self._force = self._incremental = self._full = False
+        self._running = True
+        return job
+
+    def _run(self) -> None:
+        from app.core.indexing import refresh_global_caches, refresh_paths
+
+        while True:
+            with self._cond:
+                ticket, full, incremental, paths, force = self._take_pending()
+
+            t0 = time.perf_counter()
+            error = None
+            try:
+                if full:
+                    refresh_global_caches()
+                elif incremental:
+                    refresh_global_caches(incremental=True, force=set(paths) if force else None)
+                else:
+                    refresh_paths(paths, force=force)
+            except Exception as e:
+                error = str(e)
+                logger.error("Refresh failed: %s", e, exc_info=True)
+            duration = time.perf_counter() - t0
+
+            with self._cond:
+                self._running = False
+                self._completed = ticket
+                self._last_error = error
+                self._last_duration = duration
+                self._cond.notify_all()
+                self._wake_async_waiters()
+
+
+def _resolve(future: asyncio.Future) -> None:
+    if not future.done():
+        future.set_result(None)
+
+
+refresh_queue = RefreshQueue(REFRESH_DEBOUNCE_SECONDS, REFRESH_MAX_DELAY_SECONDS)
+
+
+def request_refresh(paths: list[str] | None = None, force: bool = True,
+                    incremental: bool = False, full: bool = False) -> int:
+    """リフレッシュを要求する。
+
+    full=True: フルリビルド / incremental=True: stat差分による差分リフレッシュ
+    （pathsを指定するとforce=Trueの場合はmtime/sizeが同じでも内容を再確認する） /
+    それ以外: pathsのノートのみ再インデックス（force=Falseならmtime/sizeが変わったもののみ）。
+    """
+    return refresh_queue.request(paths, force=force, incremental=incremental, full=full)
+
+
+def wait_for_refresh(ticket: int, timeout: float | None = None) -> bool:
+    return refresh_queue.wait(ticket, timeout)
+
+
+async def wait_for_refresh_async(ticket: int, timeout: float | None = None) -> bool:
+    """イベントループをブロックせずに反映完了を待つ（executorのスレッドは使わない）"""
+    return await refresh_queue.wait_async(ticket, timeout)
+
+
+def refresh_status() -> dict:
+    return refresh_queue.status()
@@ -5,8 +5,9 @@ import logging
 from datetime import datetime, timezone, timedelta
 from pathlib import Path
 from app.config import CONFIG_FILE, CONTENT_DIR, STATICS_DIR, IMAGES_DIR, PROTECTED_ITEMS
+from app import cache
 from app.models.sync import SyncConfig
-from app.core.indexing import refresh_global_caches
+from app.services.refresh import request_refresh
 from app.events import config_updated_event
 
 from app.utils.messages import get_system, get_error
@@ -44,8 +45,12 @@ def save_config(config: SyncConfig) -> None:
     except Exception as e:
         logger.error("Failed to save config: %s", e)
 
-def sync_directory(src_dir: Path, dest_dir: Path, last_sync_timestamp: float | None, is_content: bool = False) -> int:
-    """ディレクトリを同期し、同期されたファイル数を返します。"""
+def sync_directory(src_dir: Path, dest_dir: Path, last_sync_timestamp: float | None, is_content: bool = False,
+                   copied_notes: list[str] | None = None) -> int:
+    """ディレクトリを同期し、同期されたファイル数を返します。
+
+    copied_notesを渡した場合はコピーしたノート(.md)のdest_dirからの相対パスを追加します。
+    """
     sync_count = 0
     if not last_sync_timestamp:
         if is_content:
@@ -72,6 +77,8 @@ def sync_directory(src_dir: Path, dest_dir: Path, last_sync_timestamp: float | N
                 shutil.copy2(item, dest_item)
         
         sync_count = sum(1 for f in src_dir.rglob('*') if f.is_file())
+        if copied_notes is not None:
+            copied_notes.extend(f.relative_to(src_dir).as_posix() for f in src_dir.rglob('*.md') if f.is_file())
     else:
         logger.info("Differentially copying files from %s to %s", src_dir, dest_dir)
         for item in src_dir.rglob('*'):
@@ -82,6 +89,8 @@ def sync_directory(src_dir: Path, dest_dir: Path, last_sync_timestamp: float | N
                     dest_file.parent.mkdir(parents=True, exist_ok=True)
                     shutil.copy2(item, dest_file)
                     sync_count += 1
+                    if copied_notes is not None and item.suffix == '.md':
+                        copied_notes.append(rel_path.as_posix())
     return sync_count
 
 def perform_sync(config: SyncConfig) -> tuple[bool, str]:
@@ -110,7 +119,9 @@ def perform_sync(config: SyncConfig) -> tuple[bool, str]:
         if not src_path.exists():
             return False, get_error("E002")
 
-        note_count = sync_directory(src_path, CONTENT_DIR, last_sync_timestamp, is_content=True)
+        copied_notes: list[str] = []
+        note_count = sync_directory(src_path, CONTENT_DIR, last_sync_timestamp, is_content=True,
+                                    copied_notes=copied_notes)
 
         # 2. 画像の同期（オプション）
         image_count = 0
@@ -127,8 +138,14 @@ def perform_sync(config: SyncConfig) -> tuple[bool, str]:
         logger.info("Sync successful at %s", config.last_sync)
         save_config(config)
 
-        # キャッシュリフレッシュのトリガー
-        refresh_global_caches()
+        # 画像が更新された場合は画像パスの解決結果とレンダリング済みHTMLを破棄
+        if image_count:
+            cache.IMAGE_PATH_CACHE = {}
+            cache.MARKDOWN_CACHE = {}
+
+        # キャッシュリフレッシュのトリガー（変更のあったノートのみ差分反映、リフレッシュキュー経由）。
+        # copy2はmtimeを保持するため、コピーしたノートはmtime/sizeではなく内容のハッシュで変更を判定する
+        request_refresh(copied_notes, incremental=True)
         
         success_msg = f"ノート{note_count}件、画像ファイル{image_count}件を同期しました。"
         return True, success_msg
@@ -0,0 +1,226 @@
+"""inotifyによるコンテンツ・画像ディレクトリの監視（Linux専用、ctypesのみ使用）
+
+イベントはパス単位で集約し、デバウンス後にまとめてインデックスへ反映する。
+"""
+import ctypes
+import ctypes.util
+import errno
+import logging
+import os
+import select
+import struct
+import threading
+import time
+from pathlib import Path
+
+from app.config import CONTENT_DIR, IMAGES_DIR, WATCH_DEBOUNCE_SECONDS, WATCH_MAX_DELAY_SECONDS
+
+logger = logging.getLogger("app.watcher")
+
+# <sys/inotify.h>
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_MODIFY | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class InotifyWatcher:
+    """複数ディレクトリを再帰的に監視し、変更パスを集約してコールバックに渡す"""
+
+    def __init__(self, roots: list[Path], on_changes):
+        # on_changes(root, rel_paths: set[str], rescan: bool)
+        self.roots = [Path(r) for r in roots]
+        self.on_changes = on_changes
+        self._libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._fd = -1
+        self._wd_to_dir: dict[int, tuple[Path, Path]] = {}  # {wd: (root, 絶対パス)}
+        self._pending: dict[Path, set[str]] = {}
+        self._rescan: set[Path] = set()
+        self._first_event = 0.0
+        self._last_event = 0.0
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    def _add_watch(self, root: Path, directory: Path) -> None:
+        wd = self._libc.inotify_add_watch(self._fd, os.fsencode(str(directory)), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            logger.warning("inotify_add_watch failed for %s: %s", directory, os.strerror(err))
+            return
+        self._wd_to_dir[wd] = (root, directory)
+
+    def _add_tree(self, root: Path, directory: Path) -> None:
+        for current, dirs, _ in os.walk(directory):
+            dirs[:] = [d for d in dirs if not d.startswith('.')]
+            self._add_watch(root, Path(current))
+
+    def start(self) -> None:
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        for root in self.roots:
+            if root.exists():
+                self._add_tree(root, root)
+        self._thread = threading.Thread(target=self._run, name="inotify-watcher", daemon=True)
+        self._thread.start()
+        logger.info("Watching %d directories under %s", len(self._wd_to_dir), ", ".join(map(str, self.roots)))
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=2)
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+    def _mark(self, root: Path, path: Path) -> None:
+        now = time.monotonic()
+        if not self._pending and not self._rescan:
+            self._first_event = now
+        self._last_event = now
+        self._pending.setdefault(root, set()).add(path.relative_to(root).as_posix())
+
+    def _mark_rescan(self, root: Path) -> None:
+        now = time.monotonic()
+        if not self._pending and not self._rescan:
+            self._first_event = now
+        self._last_event = now
+        self._rescan.add(root)
+
+    def _handle_event(self, wd: int, mask: int, name: str) -> None:
+        if mask & IN_Q_OVERFLOW:
+            # イベント取りこぼし → 全ルートを差分リフレッシュ
+            for root in self.roots:
+                self._mark_rescan(root)
+            return
+
+        entry = self._wd_to_dir.get(wd)
+        if entry is None:
+            return
+        root, directory = entry
+
+        if mask & IN_IGNORED:
+            self._wd_to_dir.pop(wd, None)
+            return
+        if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+            # 監視ディレクトリ自体が消えた・移動した
+            self._mark_rescan(root)
+            return
+        if not name or name.startswith('.'):
+            return
+
+        path = directory / name
+        if mask & IN_ISDIR:
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                self._add_tree(root, path)
+            # ディレクトリ単位の増減は配下のファイルが分からないため差分リフレッシュで検出
+            self._mark_rescan(root)
+            return
+
+        self._mark(root, path)
+
+    def _read_events(self) -> None:
+        try:
+            data = os.read(self._fd, 64 * 1024)
+        except BlockingIOError:
+            return
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                return
+            raise
+
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = data[offset:offset + length].rstrip(b"\0").decode("utf-8", "surrogateescape")
+            offset += length
+            self._handle_event(wd, mask, name)
+
+    def _flush(self) -> None:
+        pending, rescan = self._pending, self._rescan
+        self._pending, self._rescan = {}, set()
+        for root in self.roots:
+            paths = pending.get(root, set())
+            if root in rescan or paths:
+                try:
+                    self.on_changes(root, paths, root in rescan)
+                except Exception as e:
+                    logger.error("Failed to apply watched changes under %s: %s", root, e, exc_info=True)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            readable, _, _ = select.select([self._fd], [], [], WATCH_DEBOUNCE_SECONDS / 2)
+            if readable:
+                self._read_events()
+
+            if self._pending or self._rescan:
+                now = time.monotonic()
+                quiet = now - self._last_event >= WATCH_DEBOUNCE_SECONDS
+                overdue = now - self._first_event >= WATCH_MAX_DELAY_SECONDS
+                # 連続した書き込みはまとめて反映（ただし最大遅延を超えたら反映する）
+                if quiet or overdue:
+                    self._flush()
+
+
+def _apply_changes(root: Path, rel_paths: set[str], rescan: bool) -> None:
+    """集約済みの変更をインデックスへ反映（ノートの再インデックスはリフレッシュキュー経由）"""
+    from app.core.indexing import invalidate_images
+    from app.services.refresh import request_refresh
+
+    if root == CONTENT_DIR:
+        if rescan:
+            request_refresh(incremental=True)
+        else:
+            notes = sorted(p for p in rel_paths if p.endswith('.md'))
+            if notes:
+                request_refresh(notes, force=False)
+    elif root == IMAGES_DIR:
+        invalidate_images({Path(p).name for p in rel_paths}, all_images=rescan)
+
+
+_watcher: InotifyWatcher | None = None
+
+
+def start_watcher() -> InotifyWatcher | None:
+    """CONTENT_DIRとIMAGES_DIRの監視を開始。inotifyが使えない環境ではNoneを返す"""
+    global _watcher
+    if _watcher is not None:
+        return _watcher
+    if not hasattr(select, "select") or not os.path.exists("/proc/sys/fs/inotify"):
+        logger.info("inotify is not available. File watcher disabled.")
+        return None
+
+    try:
+        watcher = InotifyWatcher([CONTENT_DIR, IMAGES_DIR], _apply_changes)
+        watcher.start()
+    except Exception as e:
+        logger.warning("Failed to start file watcher: %s", e)
+        return None
+
+    _watcher = watcher
+    return watcher
+
+
+def stop_watcher() -> None:
+    global _watcher
+    if _watcher is not None:
+        _watcher.stop()
+        _watcher = None
@@ -1,22 +1,95 @@
-"""パスのスラッグ化ユーティリティ（日本語→ローマ字変換）"""
+"""パスのスラッグ化ユーティリティ（日本語→ローマ字変換）
+
+セグメント→スラッグの変換結果はメモ化し、SLUG_TABLE_FILEに永続化して再起動後も再利用する。
+pykakasiは未変換のセグメントが現れた時点で初めてimportする（起動時間短縮のため）。
+"""
+import json
+import logging
+import os
 import re
-import pykakasi
+import threading
 
-_kakasi = pykakasi.kakasi()
+from app.config import SLUG_TABLE_FILE
 
+logger = logging.getLogger("app.slug")
 
-def slugify_segment(text: str) -> str:
-    """単一パスセグメントをスラッグ化"""
-    result = _kakasi.convert(text)
-    romaji = "".join([item['hepburn'] for item in result])
+# 変換ロジックを変更した場合はインクリメントする（古いテーブルは破棄される）
+SLUG_TABLE_VERSION = 1
+
+_kakasi = None
+_table: dict[str, str] | None = None  # {segment: slug}
+_dirty = False
+_lock = threading.Lock()
+
+
+def _get_kakasi():
+    global _kakasi
+    if _kakasi is None:
+        import pykakasi
+        _kakasi = pykakasi.kakasi()
+    return _kakasi
+
+
+def _romanize(text: str) -> str:
+    # ASCIIのみのセグメントはローマ字変換不要
+    if text.isascii():
+        romaji = text
+    else:
+        romaji = "".join([item['hepburn'] for item in _get_kakasi().convert(text)])
     romaji = romaji.lower()
     romaji = re.sub(r'[^a-z0-9]+', '-', romaji)
     return romaji.strip('-')
 
 
+def _load_table() -> dict[str, str]:
+    if not SLUG_TABLE_FILE.exists():
+        return {}
+    try:
+        with open(SLUG_TABLE_FILE, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except Exception as e:
+        logger.warning("Failed to load slug table: %s", e)
+        return {}
+    if data.get("version") != SLUG_TABLE_VERSION:
+        return {}
+    return data.get("segments", {})
+
+
+def slugify_segment(text: str) -> str:
+    """単一パスセグメントをスラッグ化"""
+    global _table, _dirty
+    with _lock:
+        if _table is None:
+            _table = _load_table()
+        slug = _table.get(text)
+        if slug is None:
+            slug = _romanize(text)
+            _table[text] = slug
+            _dirty = True
+    return slug
+
+
 def slugify_path(file_path: str) -> str:
     """ファイルパス全体をスラッグ化（.md除去 + 各セグメント変換）"""
     if file_path.endswith('.md'):
         file_path = file_path[:-3]
     segments = file_path.split('/')
     return '/'.join(slugify_segment(seg) for seg in segments if seg)
+
+
+def save_slug_table() -> None:
+    """新しいセグメントが追加されていればテーブルを書き出す（一時ファイル経由でアトミックに置き換え）"""
+    global _dirty
+    with _lock:
+        if not _dirty or _table is None:
+            return
+        data = {"version": SLUG_TABLE_VERSION, "segments": dict(_table)}
+        _dirty = False
+
+    tmp_path = SLUG_TABLE_FILE.with_name(SLUG_TABLE_FILE.name + ".tmp")
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp_path, SLUG_TABLE_FILE)
+    except Exception as e:
+        logger.warning("Failed to save slug table: %s", e)
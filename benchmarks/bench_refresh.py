@@ -0,0 +1,69 @@
+"""refresh_global_caches() のベンチマーク
+
+使い方:
+    OBSIDIAN_CONTENT_DIR=/path/to/vault python benchmarks/bench_refresh.py [--repeat 3]
+
+各回の所要時間と、.mdファイルのopen回数（sys.auditフックで計測）を出力する。
+最後にファイルレコードの1ノートあたりのメモリ使用量（tracemallocで計測）を出力する。
+"""
+import argparse
+import gc
+import statistics
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app import cache  # noqa: E402
+from app.config import BODY_STORE, CONTENT_DIR  # noqa: E402
+from app.core.indexing import refresh_global_caches, scan_vault  # noqa: E402
+
+_md_opens = 0
+
+
+def _audit_hook(event: str, args: tuple) -> None:
+    global _md_opens
+    if event == "open" and str(args[0]).endswith(".md"):
+        _md_opens += 1
+
+
+def _record_memory_per_note() -> tuple[int, int]:
+    """scan_vault()が返すファイルレコードの保持メモリを計測し、(件数, 1ノートあたりのバイト数)を返す"""
+    gc.collect()
+    tracemalloc.start()
+    files = scan_vault(CONTENT_DIR, CONTENT_DIR)[0]
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return len(files), retained // max(1, len(files))
+
+
+def main() -> None:
+    global _md_opens
+    parser = argparse.ArgumentParser(description="refresh_global_caches benchmark")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    sys.addaudithook(_audit_hook)
+
+    timings = []
+    for i in range(args.repeat):
+        _md_opens = 0
+        t0 = time.perf_counter()
+        refresh_global_caches()
+        elapsed = time.perf_counter() - t0
+        timings.append(elapsed)
+        print(f"run {i + 1}: {elapsed * 1000:.1f} ms, md opens={_md_opens}")
+
+    print(f"content_dir: {CONTENT_DIR}")
+    print(f"files: {len(cache.get_snapshot().files)}")
+    print(f"median: {statistics.median(timings) * 1000:.1f} ms")
+
+    count, per_note = _record_memory_per_note()
+    print(f"record memory: {per_note} bytes/note ({count} notes, body store: {BODY_STORE})")
+
+
+if __name__ == "__main__":
+    main()
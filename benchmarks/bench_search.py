@@ -0,0 +1,108 @@
+"""検索クエリの評価方法（全候補のスコア計算 / MaxScoreによる上位k件）のベンチマーク
+
+使い方:
+    python benchmarks/bench_search.py --notes 5000 [--seed 1] [--limit 20]
+    OBSIDIAN_CONTENT_DIR=/path/to/vault python benchmarks/bench_search.py --vault
+
+候補文書数（いずれかのクエリ語を含む文書数）の異なるクエリについて、
+全候補をスコア計算してから上位limit件を選ぶ場合と、SearchIndex._top_k（MaxScore）の
+レイテンシを候補文書数の昇順に出力する。スニペット生成は含まない。
+語ごとのスコア寄与は事前に計算済み（キャッシュ済み）の状態で計測する。
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from heapq import nsmallest
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+# 候補文書数が多くなりやすい語（CJKのバイグラム・頻出する英単語）
+BROAD_QUERIES = ("環境", "設定", "環境構築", "データベースの設定", "の設定を確認", "python docker", "cache index query")
+
+
+def _median_ms(func, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(samples)
+
+
+def _queries(idx, rng: random.Random, count: int) -> list[str]:
+    """出現文書数の異なる語（1〜3語）を組み合わせたクエリ"""
+    from app.core.search import FIELD_BODY
+
+    terms = sorted(
+        (len(p.docs), token) for token, term_id in idx.vocab.items()
+        if (p := idx._postings[FIELD_BODY][term_id]) is not None and p.docs and len(token) > 1
+    )
+    queries = list(BROAD_QUERIES)
+    for _ in range(count):
+        picked = [terms[int(len(terms) * rng.random() ** 0.5)][1] for _ in range(rng.randint(1, 3))]
+        queries.append(" ".join(picked))
+    return queries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Search top-k benchmark (exhaustive vs MaxScore)")
+    parser.add_argument("--vault", action="store_true", help="OBSIDIAN_CONTENT_DIRのVaultを使う（省略時は合成Vaultを生成）")
+    parser.add_argument("--notes", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--limit", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=30, help="ランダムに組み合わせるクエリ数")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory(prefix="obsidian-bench-")
+    if not args.vault:
+        from gen_vault import generate
+        vault = Path(workdir.name) / "vault"
+        generate(vault, args.notes, args.seed)
+        os.environ["OBSIDIAN_CONTENT_DIR"] = str(vault)
+    os.environ["OBSIDIAN_METADATA_CACHE_FILE"] = str(Path(workdir.name) / "metadata_cache.json")
+
+    import logging
+    logging.disable(logging.INFO)
+    from app import cache
+    from app.core.indexing import refresh_global_caches
+    from app.core.search import tokenize_query
+
+    refresh_global_caches()
+    snapshot = cache.get_snapshot()
+    idx = snapshot.search_index
+    ranks = idx._path_ranks
+
+    def exhaustive(tokens: list[str]) -> list[tuple[int, float]]:
+        scores = idx._score_documents(tokens)
+        return nsmallest(args.limit, scores.items(), key=lambda x: (-x[1], ranks[x[0]]))
+
+    rows = []
+    for query in _queries(idx, random.Random(args.seed), args.queries):
+        tokens = tokenize_query(query)
+        candidates = len(idx._score_documents(tokens))
+        if not candidates:
+            continue
+        assert exhaustive(tokens) == idx._top_k(tokens, args.limit, None), query
+        rows.append((
+            candidates, query, len(set(tokens)),
+            _median_ms(lambda: exhaustive(tokens), args.repeat),
+            _median_ms(lambda: idx._top_k(tokens, args.limit, None), args.repeat),
+        ))
+
+    print(f"{idx.doc_count} documents, limit={args.limit}")
+    print(f"{'candidates':>10} {'terms':>5} {'exhaustive ms':>14} {'top-k ms':>9} {'speedup':>8}  query")
+    for candidates, query, terms, exhaustive_ms, top_k_ms in sorted(rows):
+        print(f"{candidates:>10} {terms:>5} {exhaustive_ms:>14.2f} {top_k_ms:>9.2f} "
+              f"{exhaustive_ms / top_k_ms:>7.1f}x  {query}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""インデックス構築・レンダリング・エンドポイントのオフラインベンチマークスイート
+
+使い方:
+    python benchmarks/bench_suite.py --notes 10000 --output results.json
+    python benchmarks/bench_suite.py --vault /path/to/vault --output results.json
+    python benchmarks/bench_suite.py --notes 10000 --output new.json --baseline results.json
+
+--vault を省略した場合は benchmarks/gen_vault.py で合成Vaultを一時ディレクトリに生成する
+（--notes / --seed が同じなら同じVault）。計測項目:
+  - refresh_global_caches のフェーズ別所要時間（走査・パース・検索インデックス・スナップショット構築・永続化）
+  - フルリビルド・差分リフレッシュ（変更なし）・ウォームスタートの所要時間
+  - SearchIndex.build（トークン化込み）と検索クエリのレイテンシ
+  - Markdownレンダリングのスループット
+  - 主要エンドポイントのレイテンシ（ASGIアプリを直接呼び出し、ネットワークは介さない）
+  - ピークRSS（並列パースのワーカープロセスは別計上）
+結果はJSONで保存する。--baseline を指定すると比較し、閾値を超えて悪化した項目があれば終了コード1を返す。
+"""
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from urllib.parse import quote
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+sys.path.insert(0, str(BENCH_DIR))
+
+SEARCH_QUERIES = (
+    "python", "docker compose", "環境構築", "api", "設定", "データベース",
+    "test", "linux コマンド", "セキュリティ", "error handling",
+)
+
+
+def _percentiles(samples_ms: list[float]) -> dict:
+    ordered = sorted(samples_ms)
+
+    def pick(q: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(len(ordered) * q))], 3)
+
+    return {"p50": pick(0.5), "p90": pick(0.9), "p99": pick(0.99), "max": round(ordered[-1], 3)}
+
+
+def _timed(func, *args, **kwargs) -> tuple[object, float]:
+    t0 = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - t0) * 1000
+
+
+def _peak_rss_mb(who: int = resource.RUSAGE_SELF) -> float:
+    # Linuxのru_maxrssはKB単位（macOSはバイト単位）
+    rss = resource.getrusage(who).ru_maxrss
+    if sys.platform == "darwin":
+        rss /= 1024
+    return round(rss / 1024, 1)
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR.parent,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def bench_refresh_phases() -> dict:
+    """refresh_global_caches() と同じ処理をフェーズごとに計測"""
+    from app import cache
+    from app.config import CONTENT_DIR
+    from app.core.body_store import start_segment
+    from app.core.indexing import _build_snapshot, _read_notes, _save_snapshot, _walk_vault
+    from app.core.search import SearchIndex
+
+    start_segment()
+    (note_paths, dirs), walk_ms = _timed(_walk_vault, CONTENT_DIR, CONTENT_DIR)
+    results, parse_ms = _timed(_read_notes, note_paths)
+
+    files, links_by_path, stats, tokens_by_path = [], {}, {}, {}
+    for result in results:
+        if result is None:
+            continue
+        record, links, stat_key, tokens = result
+        files.append(record)
+        links_by_path[record.path] = links
+        stats[record.path] = stat_key
+        if tokens is not None:
+            tokens_by_path[record.path] = tokens
+    files.sort(key=lambda x: x.mtime_ns, reverse=True)
+
+    idx = SearchIndex()
+    _, index_ms = _timed(idx.build, files, tokens_by_path)
+    snapshot, snapshot_ms = _timed(_build_snapshot, files, dirs, links_by_path, stats, {}, idx)
+    cache.publish_snapshot(snapshot)
+    _, persist_ms = _timed(_save_snapshot)
+
+    return {
+        "notes": len(files),
+        "phase_walk_ms": round(walk_ms, 1),
+        "phase_parse_ms": round(parse_ms, 1),
+        "phase_search_index_ms": round(index_ms, 1),
+        "phase_snapshot_ms": round(snapshot_ms, 1),
+        "phase_persist_ms": round(persist_ms, 1),
+        "parallel_tokens": bool(tokens_by_path),
+    }
+
+
+def bench_refresh(repeat: int) -> dict:
+    from app import cache
+    from app.core.indexing import initialize_caches, refresh_global_caches
+
+    full = [_timed(refresh_global_caches)[1] for _ in range(repeat)]
+    incremental = [_timed(refresh_global_caches, incremental=True)[1] for _ in range(repeat)]
+
+    # ウォームスタート: 永続化済みのメタデータキャッシュから起動する場合
+    cache.publish_snapshot(cache.VaultSnapshot())
+    cache.MARKDOWN_CACHE = {}
+    gc.collect()
+    _, warm_ms = _timed(initialize_caches)
+
+    return {
+        "refresh_full_ms": round(statistics.median(full), 1),
+        "refresh_incremental_noop_ms": round(statistics.median(incremental), 1),
+        "warm_start_ms": round(warm_ms, 1),
+    }
+
+
+def bench_search() -> dict:
+    from app import cache
+    from app.core.search import SearchIndex
+
+    snapshot = cache.get_snapshot()
+    # 並列パース時のワーカー側トークン化を含まない、シリアルでの構築時間
+    _, build_ms = _timed(SearchIndex().build, snapshot.files)
+
+    samples = []
+    for _ in range(5):
+        for q in SEARCH_QUERIES:
+            _, ms = _timed(snapshot.search_index.search, q, True, snapshot.records, snapshot.published_paths)
+            samples.append(ms)
+    return {
+        "search_index_build_ms": round(build_ms, 1),
+        "search_query_ms": _percentiles(samples),
+    }
+
+
+def bench_render(sample: int, seed: int) -> dict:
+    from app import cache
+    from app.config import CONTENT_DIR
+    from app.core.indexing import parse_frontmatter
+    from app.services.content import render_markdown
+
+    snapshot = cache.get_snapshot()
+    rng = random.Random(seed)
+    paths = [f.path for f in snapshot.files]
+    paths = rng.sample(paths, min(sample, len(paths)))
+
+    samples = []
+    t0 = time.perf_counter()
+    for path in paths:
+        t1 = time.perf_counter()
+        with open(CONTENT_DIR / path, "r", encoding="utf-8") as f:
+            _, body = parse_frontmatter(f.read())
+        render_markdown(body, snapshot)
+        samples.append((time.perf_counter() - t1) * 1000)
+    total = time.perf_counter() - t0
+    return {
+        "render_notes": len(paths),
+        "render_notes_per_s": round(len(paths) / total, 1) if total else None,
+        "render_ms": _percentiles(samples),
+    }
+
+
+async def _asgi_get(app, url: str, local: bool = True) -> int:
+    """ASGIアプリにGETリクエストを1件送り、ステータスコードを返す（レスポンス本文は読み捨て）"""
+    path, _, query = url.partition("?")
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": quote(path).encode(),
+        "query_string": quote(query, safe="=&").encode(),
+        "root_path": "",
+        "headers": [(b"host", b"localhost" if local else b"viewer.example.com")],
+        "client": ("127.0.0.1" if local else "192.0.2.2", 50000),
+        "server": ("localhost", 8000),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await app(scope, receive, send)
+    return status
+
+
+async def _bench_endpoints(requests: int, seed: int) -> dict:
+    from app import cache
+    from app.main import app
+
+    snapshot = cache.get_snapshot()
+    rng = random.Random(seed)
+    public = [f for f in snapshot.files if f.published]
+    tag = snapshot.all_tags[0] if snapshot.all_tags else ""
+    view_targets = [f"/view/{snapshot.path_to_slug[f.path]}" for f in rng.sample(public, min(requests, len(public)))]
+
+    endpoints = {
+        "home": ("/", True),
+        "home_public": ("/", False),
+        "home_tag_page": (f"/?tag={tag}&page=2", True),
+        "search": ("/api/search?q=環境構築 設定", True),
+        "tree": ("/api/tree", True),
+        "graph": ("/api/graph", True),
+        "dashboard": ("/dashboard", True),
+        "healthz": ("/healthz", True),
+    }
+
+    results = {}
+    for name, (url, local) in endpoints.items():
+        status = await _asgi_get(app, url, local)  # ウォームアップ
+        samples = []
+        for _ in range(requests):
+            t0 = time.perf_counter()
+            await _asgi_get(app, url, local)
+            samples.append((time.perf_counter() - t0) * 1000)
+        results[name] = {"status": status, **_percentiles(samples)}
+
+    # ノート表示: 初回（レンダリングあり）と2回目以降（レンダリング結果のキャッシュ）
+    cache.MARKDOWN_CACHE = {}
+    for name in ("view_cold", "view_warm"):
+        samples = []
+        statuses = set()
+        for url in view_targets:
+            t0 = time.perf_counter()
+            statuses.add(await _asgi_get(app, url, False))
+            samples.append((time.perf_counter() - t0) * 1000)
+        results[name] = {"status": max(statuses) if statuses else None, **_percentiles(samples)}
+    return results
+
+
+def bench_endpoints(requests: int, seed: int) -> dict:
+    return asyncio.run(_bench_endpoints(requests, seed))
+
+
+def _flatten(metrics: dict, prefix: str = "") -> dict:
+    flat = {}
+    for key, value in metrics.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def _is_higher_better(name: str) -> bool:
+    return name.endswith("_per_s")
+
+
+def _is_compared(name: str) -> bool:
+    # p99・maxはサンプル数が少ないと揺らぎが大きいため比較しない
+    leaf = name.rsplit(".", 1)[-1]
+    return leaf.endswith(("_ms", "_mb", "_per_s")) or leaf in ("p50", "p90")
+
+
+def compare(current: dict, baseline: dict, threshold: float, min_ms: float) -> list[str]:
+    """baselineからthreshold（比率）を超えて悪化した項目の一覧を返す。min_ms未満の計測値は揺らぎが大きいため除外"""
+    cur = _flatten(current["metrics"])
+    base = _flatten(baseline["metrics"])
+    regressions = []
+    for name, value in cur.items():
+        old = base.get(name)
+        if old is None or not _is_compared(name) or old <= 0:
+            continue
+        if not name.endswith(("_mb", "_per_s")) and max(old, value) < min_ms:
+            continue
+        ratio = value / old
+        worse = ratio < 1 - threshold if _is_higher_better(name) else ratio > 1 + threshold
+        if worse:
+            regressions.append(f"{name}: {old} -> {value} ({(ratio - 1) * 100:+.0f}%)")
+    return regressions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Offline benchmark suite (indexing, rendering, endpoints)")
+    parser.add_argument("--vault", type=Path, default=None, help="既存のVault（省略時は合成Vaultを生成）")
+    parser.add_argument("--notes", type=int, default=5000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--render-sample", type=int, default=300)
+    parser.add_argument("--requests", type=int, default=50)
+    parser.add_argument("--output", type=Path, default=None)
+    parser.add_argument("--baseline", type=Path, default=None)
+    parser.add_argument("--threshold", type=float, default=0.2, help="悪化とみなす比率（既定: 20%%）")
+    parser.add_argument("--min-ms", type=float, default=5.0, help="比較対象とする最小の計測値(ms)")
+    args = parser.parse_args()
+
+    workdir = tempfile.TemporaryDirectory(prefix="obsidian-bench-")
+    vault = args.vault
+    gen_ms = None
+    if vault is None:
+        from gen_vault import generate
+        vault = Path(workdir.name) / "vault"
+        _, gen_ms = _timed(generate, vault, args.notes, args.seed)
+
+    # app.configは読み込み時に環境変数を参照するため、appのimportより前に設定する
+    os.environ["OBSIDIAN_CONTENT_DIR"] = str(vault)
+    os.environ["OBSIDIAN_METADATA_CACHE_FILE"] = str(Path(workdir.name) / "metadata_cache.json")
+    os.environ["OBSIDIAN_WATCH"] = "0"
+
+    import logging
+    from app.config import BODY_STORE, INDEX_WORKERS
+    import app.main  # noqa: F401  ロギング設定を先に済ませてから抑制する
+    logging.getLogger("app").setLevel(logging.WARNING)
+
+    metrics = {}
+    steps = (
+        ("indexing", bench_refresh_phases),
+        ("refresh", lambda: bench_refresh(args.repeat)),
+        ("search", bench_search),
+        ("render", lambda: bench_render(args.render_sample, args.seed)),
+        ("endpoints", lambda: bench_endpoints(args.requests, args.seed)),
+    )
+    for name, step in steps:
+        print(f"running {name}...", file=sys.stderr)
+        metrics[name] = step()
+    metrics["memory"] = {
+        "peak_rss_mb": _peak_rss_mb(),
+        "peak_rss_workers_mb": _peak_rss_mb(resource.RUSAGE_CHILDREN),
+    }
+
+    result = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "index_workers": INDEX_WORKERS,
+            "body_store": BODY_STORE,
+            "vault": str(args.vault) if args.vault else None,
+            "generated_notes": None if args.vault else args.notes,
+            "seed": args.seed,
+            "generate_ms": round(gen_ms, 1) if gen_ms is not None else None,
+        },
+        "metrics": metrics,
+    }
+
+    text = json.dumps(result, ensure_ascii=False, indent=2)
+    if args.output:
+        args.output.write_text(text + "\n", encoding="utf-8")
+        print(f"results written to {args.output}", file=sys.stderr)
+    else:
+        print(text)
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(result, baseline, args.threshold, args.min_ms)
+        if regressions:
+            print(f"{len(regressions)} regression(s) against {args.baseline}:", file=sys.stderr)
+            for line in regressions:
+                print(f"  {line}", file=sys.stderr)
+            sys.exit(1)
+        print(f"no regressions against {args.baseline}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
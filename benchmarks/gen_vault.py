@@ -0,0 +1,202 @@
+"""ベンチマーク用の合成Obsidian Vault生成スクリプト
+
+使い方:
+    python benchmarks/gen_vault.py /path/to/vault --notes 10000 [--seed 1] [--images 500]
+
+同じ --notes / --seed からは常に同じVault（内容・フォルダ構成・mtime）を生成する。
+ノートは日本語・英語混在の本文に、frontmatter・タグ・wikilink・コールアウト・
+Dataviewブロック・画像埋め込みを含む。リンク先は一部のノートに偏らせる（ハブノート）。
+画像は attachments/ に最小のPNGとして書き出す（ビューアで表示するには static/images への同期が必要）。
+"""
+import argparse
+import os
+import random
+import shutil
+import sys
+import time
+from pathlib import Path
+
+# 生成するノートのmtimeの基準（ノートごとに1分ずつずらす）
+BASE_MTIME = 1_700_000_000
+
+JA_WORDS = (
+    "環境構築", "設定", "データベース", "セキュリティ", "サーバー", "手順", "テスト", "設計",
+    "運用", "監視", "障害対応", "パフォーマンス", "インデックス", "キャッシュ", "認証", "ネットワーク",
+    "バックアップ", "移行", "レビュー", "議事録", "読書メモ", "学習", "振り返り", "改善",
+)
+JA_PARTICLES = ("の", "を", "に", "で", "と", "は", "が", "から")
+JA_ENDINGS = ("する。", "した。", "を確認する。", "について整理した。", "が必要になる。", "を見直す。")
+EN_WORDS = (
+    "docker", "compose", "python", "linux", "command", "api", "error", "handling", "deploy",
+    "cache", "index", "query", "latency", "throughput", "config", "token", "search", "build",
+    "release", "pipeline", "kubernetes", "nginx", "postgres", "redis", "memory", "profile",
+)
+FOLDERS_JA = ("プロジェクト", "日記", "技術メモ", "読書", "会議", "アイデア", "資料")
+FOLDERS_EN = ("projects", "notes", "journal", "archive", "inbox", "reference", "drafts")
+TAGS = (
+    "infra", "dev", "memo", "日本語", "db", "python", "security", "ops", "book", "meeting",
+    "idea", "linux", "network", "設計", "振り返り", "todo", "research", "frontend", "backend", "tips",
+)
+CALLOUT_TYPES = ("note", "tip", "warning", "info", "important", "example", "quote", "bug")
+CODE_LANGS = ("python", "bash", "yaml", "sql", "javascript")
+
+# 1x1の透過PNG
+_PNG = bytes.fromhex(
+    "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+    "1f15c4890000000d49444154789c6360000002000154a24f5d0000000049454e44ae426082"
+)
+
+
+def _ja_sentence(rng: random.Random) -> str:
+    words = [rng.choice(JA_WORDS) + rng.choice(JA_PARTICLES) for _ in range(rng.randint(2, 5))]
+    return "".join(words) + rng.choice(JA_ENDINGS)
+
+
+def _en_sentence(rng: random.Random) -> str:
+    words = [rng.choice(EN_WORDS) for _ in range(rng.randint(6, 14))]
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraph(rng: random.Random) -> str:
+    ja_ratio = 0.7
+    return " ".join(
+        _ja_sentence(rng) if rng.random() < ja_ratio else _en_sentence(rng)
+        for _ in range(rng.randint(2, 6))
+    )
+
+
+def _folders(rng: random.Random, count: int) -> list[str]:
+    """最大3階層のフォルダ一覧（空文字はVault直下）"""
+    folders = [""]
+    while len(folders) < count:
+        parent = rng.choice(folders)
+        if parent.count("/") >= 2:
+            continue
+        name = rng.choice(FOLDERS_JA if rng.random() < 0.5 else FOLDERS_EN)
+        name = f"{name}{rng.randint(1, 99)}"
+        path = f"{parent}/{name}" if parent else name
+        if path not in folders:
+            folders.append(path)
+    return folders
+
+
+def _note_name(rng: random.Random, i: int) -> str:
+    if rng.random() < 0.6:
+        return f"{rng.choice(JA_WORDS)}{rng.choice(JA_WORDS)}-{i}"
+    return f"{rng.choice(EN_WORDS)}-{rng.choice(EN_WORDS)}-{i}"
+
+
+def _link_target(rng: random.Random, names: list[str]) -> str:
+    # 先頭付近のノートにリンクが集中するよう偏らせる
+    return names[int(len(names) * rng.random() ** 3)]
+
+
+def _frontmatter(rng: random.Random, name: str, i: int) -> str:
+    lines = ["---"]
+    if rng.random() < 0.8:
+        lines.append(f"title: {name.replace('-', ' ')}")
+    tags = rng.sample(TAGS, rng.randint(0, 4))
+    if tags:
+        if len(tags) == 1 and rng.random() < 0.5:
+            lines.append(f"tags: {tags[0]}")
+        else:
+            lines.append("tags: [" + ", ".join(tags) + "]")
+    lines.append(f"publish: {'true' if i % 3 else 'false'}")
+    lines.append(f"date: {time.strftime('%Y-%m-%d', time.gmtime(BASE_MTIME + i * 60))}")
+    if rng.random() < 0.3:
+        lines.append(f"description: {_ja_sentence(rng)}")
+    lines.append("---")
+    return "\n".join(lines)
+
+
+def _body(rng: random.Random, names: list[str], images: int) -> str:
+    blocks = [f"# {rng.choice(JA_WORDS)}"]
+    for _ in range(rng.randint(3, 12)):
+        r = rng.random()
+        if r < 0.45:
+            blocks.append(_paragraph(rng))
+        elif r < 0.55:
+            blocks.append(f"## {rng.choice(JA_WORDS)}{rng.choice(('について', 'の手順', 'メモ'))}")
+        elif r < 0.65:
+            blocks.append("\n".join(f"- {_ja_sentence(rng)}" for _ in range(rng.randint(2, 5))))
+        elif r < 0.73:
+            lang = rng.choice(CODE_LANGS)
+            code = "\n".join(" ".join(rng.choice(EN_WORDS) for _ in range(5)) for _ in range(rng.randint(2, 8)))
+            blocks.append(f"```{lang}\n{code}\n```")
+        elif r < 0.83:
+            callout = rng.choice(CALLOUT_TYPES)
+            blocks.append(f"> [!{callout}] {rng.choice(JA_WORDS)}\n> {_paragraph(rng)}")
+        elif r < 0.88:
+            blocks.append("| 項目 | 値 |\n| --- | --- |\n" + "\n".join(
+                f"| {rng.choice(JA_WORDS)} | {rng.randint(1, 1000)} |" for _ in range(rng.randint(2, 5))))
+        elif r < 0.92 and images:
+            blocks.append(f"![[image-{rng.randrange(images)}.png|{rng.choice((200, 300, 480))}]]")
+        elif r < 0.94:
+            tag = rng.choice(TAGS)
+            blocks.append(f"```dataview\nLIST FROM #{tag} SORT mtime DESC LIMIT {rng.choice((5, 10, 20))}\n```")
+        else:
+            blocks.append(f"{_en_sentence(rng)} #{rng.choice(TAGS)}")
+
+    links = []
+    for _ in range(rng.randint(0, 6)):
+        target = _link_target(rng, names)
+        r = rng.random()
+        if r < 0.2:
+            links.append(f"[[{target}|{rng.choice(JA_WORDS)}]]")
+        elif r < 0.3:
+            links.append(f"[[{target}#{rng.choice(JA_WORDS)}]]")
+        elif r < 0.35:
+            links.append(f"[[missing-{rng.randrange(1000)}]]")
+        else:
+            links.append(f"[[{target}]]")
+    if links:
+        blocks.append("関連: " + " ".join(links))
+    return "\n\n".join(blocks) + "\n"
+
+
+def generate(out: Path, notes: int, seed: int = 1, images: int | None = None, folders: int | None = None) -> None:
+    """outに合成Vaultを生成する（既存のoutは削除して作り直す）"""
+    rng = random.Random(seed)
+    images = notes // 20 if images is None else images
+    folders = max(1, int(notes ** 0.5) // 2) if folders is None else folders
+
+    if out.exists():
+        shutil.rmtree(out)
+    out.mkdir(parents=True)
+
+    folder_list = _folders(rng, folders)
+    names = [_note_name(rng, i) for i in range(notes)]
+
+    for i, name in enumerate(names):
+        folder = folder_list[int(len(folder_list) * rng.random() ** 1.5)]
+        directory = out / folder if folder else out
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f"{name}.md"
+        text = _frontmatter(rng, name, i) + "\n" + _body(rng, names, images)
+        path.write_text(text, encoding="utf-8")
+        mtime = BASE_MTIME + i * 60
+        os.utime(path, (mtime, mtime))
+
+    if images:
+        attachments = out / "attachments"
+        attachments.mkdir()
+        for i in range(images):
+            (attachments / f"image-{i}.png").write_bytes(_PNG)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate a synthetic Obsidian vault")
+    parser.add_argument("out", type=Path)
+    parser.add_argument("--notes", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--images", type=int, default=None, help="画像ファイル数（既定: ノート数/20）")
+    parser.add_argument("--folders", type=int, default=None, help="フォルダ数（既定: √ノート数/2）")
+    args = parser.parse_args()
+
+    t0 = time.perf_counter()
+    generate(args.out, args.notes, args.seed, args.images, args.folders)
+    print(f"generated {args.notes} notes in {args.out} ({time.perf_counter() - t0:.1f} s)", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
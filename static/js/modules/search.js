@@ -11,6 +11,28 @@ function highlightMatch(text, query) {
     return text.replace(new RegExp(`(${escaped})`, 'gi'), '<mark class="search-highlight">$1</mark>');
 }
 
+/**
+ * サーバーが返したマッチ箇所（[開始, 終了]）をハイライトしてテキストを要素に追加する
+ * 位置はコードポイント単位（サーバー側の文字列の添字）のため、Array.fromで分割して扱う
+ */
+function appendHighlighted(el, text, ranges) {
+    const chars = Array.from(text);
+    let pos = 0;
+    for (const [start, end] of ranges) {
+        if (start > pos) {
+            el.appendChild(document.createTextNode(chars.slice(pos, start).join('')));
+        }
+        const mark = document.createElement('mark');
+        mark.className = 'search-highlight';
+        mark.textContent = chars.slice(start, end).join('');
+        el.appendChild(mark);
+        pos = end;
+    }
+    if (pos < chars.length) {
+        el.appendChild(document.createTextNode(chars.slice(pos).join('')));
+    }
+}
+
 /**
  * 検索結果アイテムを生成する共通関数
  */
@@ -29,7 +51,11 @@ function createSearchResultItem(item, query, closeCallback) {
     if (item.snippet) {
         const snippetEl = document.createElement('div');
         snippetEl.className = 'search-result-snippet';
-        snippetEl.innerHTML = highlightMatch(item.snippet, query);
+        if (item.highlights) {
+            appendHighlighted(snippetEl, item.snippet, item.highlights);
+        } else {
+            snippetEl.innerHTML = highlightMatch(item.snippet, query);
+        }
         link.appendChild(snippetEl);
     }
 
@@ -416,6 +416,95 @@ function initSidebar() {
 
     // --- Sidebar Resize Logic ---
     initSidebarResize();
+
+    // --- File Tree (lazy folder expansion) ---
+    initFileTree();
+}
+
+// ==============================================
+// File Tree - /api/tree から1階層ずつ取得して展開する
+// ==============================================
+
+function initFileTree() {
+    const panel = document.getElementById('sidebar-files');
+    const tab = document.querySelector('.sidebar-tab[data-panel="sidebar-files"]');
+    if (!panel || !tab) return;
+
+    // 初回にFilesタブを開いた時点でルート階層のみ読み込む
+    let loaded = false;
+    tab.addEventListener('click', () => {
+        if (loaded) return;
+        loaded = true;
+
+        const rootList = document.createElement('ul');
+        rootList.className = 'file-tree';
+        panel.innerHTML = '';
+        panel.appendChild(rootList);
+        loadTreeFolder('', rootList);
+    });
+}
+
+function loadTreeFolder(path, container) {
+    container.innerHTML = '<li class="file-tree-loading">読み込み中...</li>';
+    return fetch(`/api/tree?path=${encodeURIComponent(path)}`)
+        .then(res => {
+            if (!res.ok) throw new Error('Failed to load');
+            return res.json();
+        })
+        .then(data => {
+            container.innerHTML = '';
+            if (data.items.length === 0) {
+                container.innerHTML = '<li class="file-tree-empty">ファイルはありません</li>';
+                return;
+            }
+            const fragment = document.createDocumentFragment();
+            data.items.forEach(item => fragment.appendChild(createTreeNode(item)));
+            container.appendChild(fragment);
+        })
+        .catch(() => {
+            container.innerHTML = '<li class="file-tree-empty">ツリーを読み込めませんでした</li>';
+        });
+}
+
+function createTreeNode(item) {
+    const li = document.createElement('li');
+    li.className = 'file-tree-item';
+
+    if (item.type === 'directory') {
+        const label = document.createElement('div');
+        label.className = 'file-tree-folder';
+        label.textContent = item.name;
+        label.title = `${item.path} (${item.count})`;
+
+        const children = document.createElement('ul');
+        children.className = 'file-tree-children';
+        children.hidden = true;
+
+        // 子階層は初めて展開したときに取得する
+        let loaded = false;
+        label.addEventListener('click', () => {
+            const expanded = li.classList.toggle('expanded');
+            children.hidden = !expanded;
+            if (expanded && !loaded) {
+                loaded = true;
+                loadTreeFolder(item.path, children);
+            }
+        });
+
+        li.appendChild(label);
+        li.appendChild(children);
+    } else {
+        const link = document.createElement('a');
+        link.className = 'file-tree-file';
+        link.href = `/view/${item.slug}`;
+        link.textContent = item.title;
+        link.title = item.path;
+        if (decodeURIComponent(window.location.pathname) === `/view/${item.slug}`) {
+            link.classList.add('active');
+        }
+        li.appendChild(link);
+    }
+    return li;
 }
 
 function initSidebarResize() {
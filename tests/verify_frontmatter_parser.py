@@ -0,0 +1,146 @@
+"""parse_frontmatter（str.find + 簡易YAMLの高速パス）が従来の実装と同じ結果を返すことを検証するスクリプト
+
+使い方: python tests/verify_frontmatter_parser.py [Vaultのパス ...]
+固定のケース（BOM・先頭の空白・CRLF・tests/reproduce_frontmatter.py のケースなど）に加え、
+content/ と引数で指定したVault内の全ノートで従来の実装（正規表現 + yaml.safe_load）と比較する。
+固定のケースはファイルに書き出し、先頭のみを読むread_frontmatterの結果も比較する。
+"""
+import re
+import sys
+import tempfile
+from pathlib import Path
+
+import yaml
+
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+from app.core import frontmatter as frontmatter_module  # noqa: E402
+from app.core.frontmatter import parse_frontmatter, read_frontmatter  # noqa: E402
+
+
+def legacy_parse_frontmatter(content: str) -> tuple[dict, str]:
+    """変更前の実装"""
+    frontmatter = {}
+    body = content
+    if content.startswith('\ufeff'):
+        content = content[1:]
+        body = content
+
+    content_normalized = content.replace('\r\n', '\n')
+
+    if content_normalized.strip().startswith("---"):
+        match = re.match(r'^\s*---\s*\n(.*?)\n---(?:\s*\n|$)', content_normalized, re.DOTALL)
+        if match:
+            yaml_content = match.group(1)
+            try:
+                frontmatter = yaml.safe_load(yaml_content) or {}
+                body = content_normalized[match.end():]
+            except Exception:
+                pass
+    return frontmatter, body
+
+
+CASES = [
+    "---\ntitle: Demo\ntags: [a, b]\npublish: true\n---\n# Body\n",
+    "\ufeff---\ntitle: BOM\n---\nbody",
+    "  \n---\ntitle: leading space\n---\nbody",
+    "---\r\ntitle: CRLF\r\ntags:\r\n  - x\r\n  - y\r\n---\r\nbody\r\n",
+    "---  \ntitle: trailing spaces on opening\n---   \n\n\nbody",
+    "---\n\ntitle: blank first line\n---\nbody",
+    "---\ntitle: no body\n---",
+    "---\ntitle: closing with trailing spaces\n---   ",
+    "---\ntitle: x\n----\nnot closed\n---\nbody",
+    "---\ntitle: x\n---not closing\nmore\n---\nbody",
+    "---\n---\nempty block\n---\n",
+    "---\ntags:\n- a\n- b\ndate: 2024-01-02\nupdated: 2024-01-02 10:20:30\n---\n",
+    "---\ntags: infra\npublish: yes\ncount: 0x1F\nratio: 1.5e3\ntime: 1:20\nnothing: ~\nempty:\n---\n",
+    "---\ntitle: \"quoted: value\"\nalias: 'single'\nother: 'it''s'\nesc: \"a\\tb\"\n---\n",
+    "---\ntitle: a # comment\nurl: https://example.com/a?b=c\n---\n",
+    "---\nnested:\n  child: 1\n  list: [1, 2]\n---\n",
+    "---\nlist: [a, [b, c], {d: e}]\nflow: {a: 1}\n---\n",
+    "---\ndesc: |\n  multi\n  line\nfolded: >\n  a\n  b\n---\n",
+    "---\ntitle: continued\n  plain scalar\n---\n",
+    "---\n- just\n- a list\n---\n",
+    "---\njust a scalar\n---\n",
+    "---\ninvalid: [unclosed\n---\nbody",
+    "---\nkey: value\nkey: duplicate\n---\n",
+    "---\n日本語キー: 値\nタグ: [日本語, タグ]\n---\n",
+    "---\ntrue: bool key\n1: int key\n---\n",
+    "---\nanchor: &a 1\nref: *a\n---\n",
+    "---\ntags: [a, b,]\nempty: []\nq: [\"x\", 'y']\n---\n",
+    "---\ncontrol: a\x07b\n---\n",
+    "---\nwinline: a\rb\n---\n",
+    "---\ntags:\n  - a\n    - b\n---\n",
+    "---\ntags:\n  -\n---\n",
+    "---\nmerge: <<\nneg: -5\nat: @x\n---\n",
+    "no frontmatter\n---\nx\n---\n",
+    "--\nnot: fm\n--\n",
+    "",
+    "---",
+    "---\n",
+]
+
+
+# libyaml(CSafeLoader)とPython実装のSafeLoaderで結果が異なる入力。
+# libyamlが使えない環境でのみ従来の実装と比較する
+LOADER_DIFFERENCES = [
+    "---\ntab:\tvalue\n---\n",
+]
+
+
+def check(content: str, label: str) -> bool:
+    expected = legacy_parse_frontmatter(content)
+    actual = parse_frontmatter(content)
+    # 2回目はキャッシュから返る
+    cached = parse_frontmatter(content)
+    ok = actual == expected and cached == expected and type(actual[0]) is type(expected[0])
+    if not ok:
+        print(f"MISMATCH: {label}\n  expected: {expected!r}\n  actual:   {actual!r}")
+    return ok
+
+
+def check_header_read(content: str, label: str, tmp_dir: Path) -> bool:
+    """read_frontmatter（先頭のみの読み込み）が全文をテキストモードで読んだ場合と一致するか"""
+    path = tmp_dir / "note.md"
+    path.write_bytes(content.encode("utf-8"))
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        expected = parse_frontmatter(f.read())[0]
+    ok = True
+    # 読み込み単位の境界がブロック内の様々な位置に来るようにする
+    for chunk in (1, 2, 3, 7, 4096):
+        frontmatter_module._READ_CHUNK = chunk
+        actual = read_frontmatter(path)
+        if actual != expected:
+            print(f"MISMATCH (read_frontmatter, chunk={chunk}): {label}\n  expected: {expected!r}\n  actual:   {actual!r}")
+            ok = False
+    frontmatter_module._READ_CHUNK = 4096
+    return ok
+
+
+def main() -> None:
+    failures = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        for i, content in enumerate(CASES):
+            failures += not check(content, f"case {i}: {content[:40]!r}")
+            failures += not check_header_read(content, f"case {i}: {content[:40]!r}", Path(tmp))
+    if not yaml.__with_libyaml__:
+        for content in LOADER_DIFFERENCES:
+            failures += not check(content, f"loader difference: {content[:40]!r}")
+
+    vaults = [root_dir / "content"] + [Path(p) for p in sys.argv[1:]]
+    notes = 0
+    for vault in vaults:
+        for path in sorted(vault.rglob("*.md")):
+            with open(path, "r", encoding="utf-8", errors="replace") as f:
+                failures += not check(f.read(), str(path))
+            notes += 1
+
+    if failures:
+        print(f"FAIL: {failures} mismatch(es)")
+        sys.exit(1)
+    print(f"PASS: parse_frontmatter matches the previous implementation ({len(CASES)} cases, {notes} notes)")
+
+
+if __name__ == "__main__":
+    main()
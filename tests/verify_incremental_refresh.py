@@ -0,0 +1,670 @@
+"""差分リフレッシュの結果がフルリビルドと一致することを検証するスクリプト
+
+使い方: python tests/verify_incremental_refresh.py
+一時ディレクトリに小さなVaultを作成し、追加・変更・削除を行った後に
+refresh_global_caches(incremental=True) と フルリビルドの結果を比較する。
+"""
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+_tmp = tempfile.TemporaryDirectory()
+VAULT = Path(_tmp.name) / "vault"
+VAULT.mkdir()
+os.environ["OBSIDIAN_CONTENT_DIR"] = str(VAULT)
+os.environ["OBSIDIAN_METADATA_CACHE_FILE"] = str(Path(_tmp.name) / "metadata_cache.json")
+
+from app import cache  # noqa: E402
+from app.core.indexing import refresh_global_caches, refresh_paths  # noqa: E402
+from app.core.search import FIELD_BODY, FIELD_PATH, FIELD_TITLE, SearchIndex  # noqa: E402
+
+
+def write(rel: str, text: str) -> None:
+    p = VAULT / rel
+    p.parent.mkdir(parents=True, exist_ok=True)
+    p.write_text(text, encoding="utf-8")
+    # mtime_nsの変化を確実にする
+    st = p.stat()
+    os.utime(p, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def snapshot() -> dict:
+    snap = cache.get_snapshot()
+    idx = snap.search_index
+    return {
+        "files": sorted((f["path"], f["title"], tuple(f["tags"]), f["published"], f["slug"]) for f in snap.files),
+        "tree": repr(snap.file_tree),
+        "tree_public": repr(snap.file_tree_public),
+        "records": sorted(snap.records),
+        "published": sorted(snap.published_paths),
+        "listings": {v: {t: [f["path"] for f in fs] for t, fs in views.items()} for v, views in snap.listings.items()},
+        "tag_counts": snap.tag_counts,
+        "all_tags": snap.all_tags,
+        "folders": {k: repr(v) for k, v in snap.folders.items()},
+        "folders_public": {k: repr(v) for k, v in snap.folders_public.items()},
+        "names": snap.file_names,
+        "slugs": snap.slug_to_path,
+        "backlinks": {k: [(b["path"], b["title"], b["slug"]) for b in v] for k, v in snap.backlinks.items()},
+        "forward": {k: sorted(v) for k, v in snap.forward_links.items()},
+        "doc_count": idx.doc_count,
+        "body": idx.postings(FIELD_BODY),
+        "title": idx.postings(FIELD_TITLE),
+        "path": idx.postings(FIELD_PATH),
+        "search": [(r["path"], r["score"]) for r in idx.search("環境構築 docker", True, snap.records, snap.published_paths)],
+    }
+
+
+def main() -> None:
+    write("a.md", "---\ntitle: Docker 環境構築\ntags: [infra]\npublish: true\n---\n[[b]] を参照\n")
+    write("dir/b.md", "---\ntitle: B\n---\ndocker compose の設定 [[a]]\n")
+    write("dir/c.md", "環境構築メモ [[missing]]\n")
+    refresh_global_caches()
+    before_slugs = dict(cache.get_snapshot().path_to_slug)
+
+    # 追加・変更・削除
+    write("dir/c.md", "環境構築メモ（更新） [[a]]\n")
+    write("new/missing.md", "---\ntags: infra\n---\n新規ノート docker\n")
+    os.remove(VAULT / "dir" / "b.md")
+    time.sleep(0.01)
+    refresh_global_caches(incremental=True)
+    incremental = snapshot()
+
+    for path, slug in before_slugs.items():
+        if path in cache.get_snapshot().path_to_slug:
+            assert cache.get_snapshot().path_to_slug[path] == slug, f"slug changed: {path}"
+
+    # 対象パス指定での更新
+    write("a.md", "---\ntitle: Docker 環境構築 v2\npublish: false\n---\n本文\n")
+    refresh_paths(["a.md"])
+    targeted = snapshot()
+
+    refresh_global_caches()
+    full = snapshot()
+
+    for key in full:
+        assert targeted[key] == full[key], f"mismatch in {key}"
+    assert incremental["doc_count"] == 3
+    print("PASS: incremental refresh matches full rebuild")
+
+    # 内容のハッシュによる変更検知
+    # mtimeのみ変更（touch）: レンダリング結果は破棄しない
+    cache.MARKDOWN_CACHE["new/missing.md"] = {"sentinel": True}
+    st = (VAULT / "new" / "missing.md").stat()
+    os.utime(VAULT / "new" / "missing.md", ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+    refresh_global_caches(incremental=True)
+    assert "new/missing.md" in cache.MARKDOWN_CACHE, "render cache dropped for identical content"
+
+    # mtime・sizeを保持したまま内容を変更（copy2での同期相当）: forceで内容から検知する
+    c_path = VAULT / "dir" / "c.md"
+    st = c_path.stat()
+    c_path.write_text(c_path.read_text(encoding="utf-8").replace("メモ", "手順"), encoding="utf-8")
+    os.utime(c_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert c_path.stat().st_size == st.st_size
+    refresh_global_caches(incremental=True)
+    assert "手順" not in cache.get_snapshot().records["dir/c.md"].body_text
+    refresh_global_caches(incremental=True, force={"dir/c.md"})
+    assert "手順" in cache.get_snapshot().records["dir/c.md"].body_text
+    print("PASS: content hash change detection")
+
+    verify_search_segment()
+    verify_search_index_updates()
+    verify_search_snippets()
+    verify_proximity_ranking()
+    verify_targeted_refresh()
+    verify_deferred_save()
+    verify_render_cache()
+    verify_metadata_round_trip()
+    verify_health_recovery()
+    verify_parallel_parse()
+    verify_tree_api()
+
+
+def verify_tree_api() -> None:
+    """/api/treeがフォルダの直下1階層のみを返し、公開範囲とETagに従うことを検証"""
+    import asyncio
+    import json
+    from fastapi import HTTPException
+    from starlette.requests import Request
+    from app.api.content import api_tree
+
+    def get(path: str, local: bool = True, etag: str | None = None):
+        headers = [(b"host", b"localhost" if local else b"example.com")]
+        if etag:
+            headers.append((b"if-none-match", etag.encode()))
+        request = Request({
+            "type": "http", "method": "GET", "path": "/api/tree", "headers": headers, "query_string": b"",
+            "client": ("127.0.0.1" if local else "203.0.113.1", 1), "server": ("localhost", 80),
+            "scheme": "http", "root_path": "",
+        })
+        return asyncio.run(api_tree(request, path))
+
+    write("tree/公開.md", "---\ntitle: 公開ノート\npublish: true\n---\n本文\n")
+    write("tree/sub/private.md", "非公開\n")
+    write("tree/sub/deep/x.md", "非公開\n")
+    refresh_global_caches(incremental=True)
+
+    # 直下のディレクトリは配下を含めず件数のみ
+    response = get("tree/")
+    assert json.loads(response.body) == {"path": "tree", "items": [
+        {"type": "directory", "name": "sub", "path": "tree/sub", "count": 2},
+        {"type": "file", "name": "公開.md", "title": "公開ノート", "path": "tree/公開.md", "slug": "tree/koukai"},
+    ]}, response.body
+    assert [item["path"] for item in json.loads(get("tree/sub").body)["items"]] == ["tree/sub/deep", "tree/sub/private.md"]
+    assert any(item["path"] == "tree" for item in json.loads(get("").body)["items"])
+
+    # 外部からのリクエストには公開ノートのツリーを返す（フォルダは空でも含める）
+    public = json.loads(get("tree", local=False).body)
+    assert [(item["path"], item.get("count")) for item in public["items"]] == \
+        [("tree/sub", 1), ("tree/公開.md", None)], public
+    assert [item["path"] for item in json.loads(get("tree/sub", local=False).body)["items"]] == ["tree/sub/deep"]
+    try:
+        get("tree/missing")
+        raise AssertionError("unknown folder did not return 404")
+    except HTTPException as e:
+        assert e.status_code == 404
+
+    # 世代が変わるまでは304、ノートの追加後は新しい内容を返す
+    etag = response.headers["etag"]
+    assert get("tree", etag=etag).status_code == 304
+    write("tree/sub/added.md", "追加\n")
+    refresh_global_caches(incremental=True)
+    response = get("tree", etag=etag)
+    assert response.status_code == 200 and response.headers["etag"] != etag
+    assert json.loads(response.body)["items"][0]["count"] == 3
+    print("PASS: /api/tree serves one folder level per request")
+
+
+def verify_parallel_parse() -> None:
+    """ワーカープロセスでのパース結果（語彙の番号から戻したトークンを含む）がシリアル処理と一致することを検証"""
+    from app.core import indexing
+    from app.core.search import tokenize
+
+    for i in range(12):
+        write(f"parallel/{i}.md", f"---\ntitle: 並列 {i}\n---\nDocker compose 環境構築 {i} " + "共通 語彙 " * i + "\n")
+    items = indexing._walk_vault(VAULT / "parallel", VAULT)[0]
+
+    serial = indexing._parse_notes(items)
+    worker_count, min_files = indexing._index_worker_count, indexing.PARALLEL_INDEX_MIN_FILES
+    indexing._index_worker_count = lambda: 2
+    indexing.PARALLEL_INDEX_MIN_FILES = 1
+    try:
+        parallel = indexing._parse_notes(items)
+    finally:
+        indexing._index_worker_count, indexing.PARALLEL_INDEX_MIN_FILES = worker_count, min_files
+
+    assert len(parallel) == len(serial) == 12
+    for (record, links, stat_key, tokens), (expected, expected_links, expected_stat, no_tokens) in zip(parallel, serial):
+        assert no_tokens is None
+        assert (record.path, record.title, record.body_text, links, stat_key) == \
+            (expected.path, expected.title, expected.body_text, expected_links, expected_stat)
+        assert tokens == (tokenize(expected.body_text), tokenize(expected.title), tokenize(expected.path)), record.path
+    for i in range(12):
+        os.remove(VAULT / "parallel" / f"{i}.md")
+    os.rmdir(VAULT / "parallel")
+    print("PASS: parallel parsing matches serial parsing")
+
+
+def verify_targeted_refresh() -> None:
+    """ノート単位の差分更新（リンク・同名ノート・フォルダの追加を含む）を繰り返し、毎回フルリビルドと比較する"""
+    rng = random.Random(3)
+    stems = ["alpha", "beta", "gamma", "環境構築", "missing", "delta"]
+    folders = ["", "dir", "new", "dir/sub", "x/y/z"]
+    paths = [p.relative_to(VAULT).as_posix() for p in VAULT.rglob("*.md")]
+
+    def note_text() -> str:
+        links = " ".join(f"[[{rng.choice(stems)}]]" for _ in range(rng.randint(0, 3)))
+        tags = ", ".join(rng.sample(["infra", "db", "memo"], rng.randint(0, 2)))
+        return (f"---\ntitle: {rng.choice(stems)} {rng.randint(0, 3)}\ntags: [{tags}]\n"
+                f"publish: {rng.choice(['true', 'false'])}\n---\n{rng.choice(stems)} docker {links}\n")
+
+    for step in range(40):
+        op = rng.random()
+        if op < 0.4 or len(paths) < 3:
+            folder = rng.choice(folders)
+            path = f"{folder}/{rng.choice(stems)}.md" if folder else f"{rng.choice(stems)}.md"
+            write(path, note_text())
+            if path not in paths:
+                paths.append(path)
+            changed = [path]
+        elif op < 0.6:
+            path = paths.pop(rng.randrange(len(paths)))
+            os.remove(VAULT / path)
+            changed = [path]
+        else:
+            changed = rng.sample(paths, min(len(paths), rng.randint(1, 3)))
+            for path in changed:
+                write(path, note_text())
+
+        if step % 5 == 4:
+            refresh_global_caches(incremental=True)
+        else:
+            refresh_paths(changed)
+        incremental = snapshot()
+        refresh_global_caches()
+        full = snapshot()
+        for key in full:
+            assert incremental[key] == full[key], f"mismatch in {key} at step {step}"
+    print("PASS: targeted refresh of links, trees and listings matches full rebuild")
+
+
+def verify_deferred_save() -> None:
+    """差分リフレッシュではスナップショットを書き出さず、flush_snapshot()で最新の世代を書き出すことを検証"""
+    from app.config import METADATA_CACHE_FILE
+    from app.core.indexing import flush_snapshot
+    from app.core.metadata_cache import load_metadata_cache
+
+    refresh_global_caches()
+    saved_at = METADATA_CACHE_FILE.stat().st_mtime_ns
+    write("saved/later.md", "後で保存されるノート\n")
+    refresh_paths(["saved/later.md"])
+    write("dir/c.md", "差分リフレッシュ\n")
+    refresh_global_caches(incremental=True)
+    assert METADATA_CACHE_FILE.stat().st_mtime_ns == saved_at, "metadata cache written on incremental refresh"
+
+    flush_snapshot()
+    data = load_metadata_cache()
+    snap = cache.get_snapshot()
+    assert sorted(f["path"] for f in data["files"]) == sorted(snap.records)
+    assert data["stats"] == snap.stats
+    saved_at = METADATA_CACHE_FILE.stat().st_mtime_ns
+    flush_snapshot()
+    assert METADATA_CACHE_FILE.stat().st_mtime_ns == saved_at, "flush without pending changes rewrote the cache"
+    print("PASS: incremental refresh defers persistence until flush")
+
+
+def verify_render_cache() -> None:
+    """同じ内容でmtimeのみ変わったノートはレンダリング結果を再利用し、
+    スナップショットに未反映の編集は再レンダリングすることを検証"""
+    import asyncio
+    from starlette.requests import Request
+    from app.api import content
+
+    renders = []
+    render_markdown = content.render_markdown
+
+    def counting_render(body, snap):
+        renders.append(body)
+        return render_markdown(body, snap)
+
+    def view(path: str) -> str:
+        request = Request({
+            "type": "http", "method": "GET", "path": "/", "headers": [], "query_string": b"",
+            "client": ("127.0.0.1", 1), "server": ("localhost", 80), "scheme": "http", "root_path": "",
+        })
+        slug = cache.get_snapshot().path_to_slug[path]
+        return asyncio.run(content.read_item(request, slug)).body.decode("utf-8")
+
+    content.render_markdown = counting_render
+    try:
+        write("render/note.md", "---\npublish: true\n---\n最初の本文\n")
+        refresh_global_caches(incremental=True)
+        assert "最初の本文" in view("render/note.md")
+        assert len(renders) == 1
+
+        # 同期で同じ内容がmtimeのみ変わってコピーされた場合はキャッシュを使う
+        data = (VAULT / "render" / "note.md").read_bytes()
+        write("render/note.md", data.decode("utf-8"))
+        refresh_global_caches(incremental=True)
+        assert "最初の本文" in view("render/note.md")
+        assert len(renders) == 1, "re-rendered a note whose content did not change"
+
+        # 反映前の編集は再レンダリングし、反映後は新しい内容でキャッシュする
+        write("render/note.md", "---\npublish: true\n---\n更新した本文\n")
+        assert "更新した本文" in view("render/note.md")
+        refresh_global_caches(incremental=True)
+        view("render/note.md")
+        view("render/note.md")
+        assert len(renders) == 3
+    finally:
+        content.render_markdown = render_markdown
+    print("PASS: rendered HTML is reused for identical content and refreshed for edits")
+
+
+def verify_metadata_round_trip() -> None:
+    """JSONにない型のfrontmatter（set・文字列以外のキー・タプル・日付など）が、
+    メタデータキャッシュの保存・読み込みでパース直後と同じ値に戻ることを検証"""
+    from app.core.frontmatter import parse_frontmatter
+    from app.core.metadata_cache import load_metadata_cache
+
+    text = (
+        "---\n"
+        "created: 2024-01-02\n"
+        "aliases: !!set {x, y}\n"
+        "1: one\n"
+        "2024-05-01: dated\n"
+        "nested: {3: [1, 2], $date: not a date, ok: {a: [true, null, 1.5]}}\n"
+        "single: {$set: [1]}\n"
+        "ordered: !!omap [{a: 1}, {b: 2}]\n"
+        "blob: !!binary aGVsbG8=\n"
+        "when: 2024-01-02 03:04:05+09:00\n"
+        "---\n本文\n"
+    )
+    write("types/note.md", text)
+    refresh_global_caches()
+    expected, _ = parse_frontmatter(text)
+    assert isinstance(expected["aliases"], set) and 1 in expected, expected
+    assert cache.get_snapshot().records["types/note.md"].frontmatter == expected
+
+    data = load_metadata_cache()
+    assert data is not None, "metadata cache not saved"
+    loaded = {f.path: f for f in data["files"]}["types/note.md"]
+    assert loaded.frontmatter == expected, loaded.frontmatter
+    os.remove(VAULT / "types" / "note.md")
+    refresh_global_caches()
+    print("PASS: frontmatter values survive the metadata cache round trip")
+
+
+def verify_health_recovery() -> None:
+    """リフレッシュの失敗で/readyzが503になり、次に成功した差分リフレッシュでreadyに戻ることを検証"""
+    import asyncio
+    import json
+    from app.api.health import healthz, readyz
+    from app.core import indexing
+
+    def status(endpoint) -> tuple[int, dict]:
+        response = asyncio.run(endpoint())
+        return response.status_code, json.loads(response.body)
+
+    refresh_global_caches()
+    code, body = status(readyz)
+    assert code == 200 and body["phase"] == "ready", body
+
+    def broken_stat_vault(*args):
+        raise OSError("vault unavailable")
+
+    stat_vault = indexing.stat_vault
+    indexing.stat_vault = broken_stat_vault
+    try:
+        refresh_global_caches(incremental=True)
+        raise AssertionError("refresh did not fail")
+    except OSError:
+        pass
+    finally:
+        indexing.stat_vault = stat_vault
+    code, body = status(readyz)
+    assert code == 503 and body["phase"] == "failed" and body["error"] == "vault unavailable", body
+    code, body = status(healthz)
+    assert code == 200 and not body["ready"], body
+
+    # 差分リフレッシュの成功で復帰する
+    generation = cache.get_snapshot().generation
+    write("health/note.md", "復帰\n")
+    refresh_global_caches(incremental=True)
+    assert cache.get_snapshot().generation > generation
+    code, body = status(readyz)
+    assert code == 200 and body["phase"] == "ready" and body["error"] is None, body
+
+    # ノート単位の更新（refresh_paths）の失敗・成功も同様
+    def broken_read_notes(items):
+        raise OSError("read failed")
+
+    read_notes = indexing._read_notes
+    indexing._read_notes = broken_read_notes
+    try:
+        refresh_paths(["health/note.md"])
+        raise AssertionError("refresh_paths did not fail")
+    except OSError:
+        pass
+    finally:
+        indexing._read_notes = read_notes
+    assert status(readyz)[0] == 503
+    os.remove(VAULT / "health" / "note.md")
+    refresh_paths(["health/note.md"])
+    code, body = status(readyz)
+    assert code == 200 and body["error"] is None, body
+    print("PASS: /readyz recovers after a failed refresh")
+
+
+def verify_search_segment() -> None:
+    """保存したセグメントをmmapで開いたインデックスが、メモリ上のものと一致することを検証"""
+    from app.core.search_segment import SegmentVocab, index_fingerprint, open_segment
+
+    refresh_global_caches()
+    snap = cache.get_snapshot()
+    records = snap.records
+    assert open_segment("0" * 32) is None, "stale segment opened"
+    idx = open_segment(index_fingerprint(snap.files))
+    assert isinstance(idx.vocab, SegmentVocab)
+    assert _index_state(idx, records) == _index_state(snap.search_index, records)
+
+    # セグメントから開いたインデックスへの差分更新（Copy-on-Write）
+    updated = idx.clone()
+    record = {"path": "dir/c.md", "title": "c", "body_text": "docker api メモ 新語彙"}
+    updated.update_document(records["dir/c.md"], record)
+    records = dict(records, **{"dir/c.md": record})
+    expected = SearchIndex()
+    expected.build(list(records.values()))
+    assert _index_state(updated, records) == _index_state(expected, records)
+    assert _index_state(idx, snap.records) == _index_state(snap.search_index, snap.records), "segment modified"
+    print("PASS: search index segment matches in-memory index")
+
+
+def _index_state(idx: SearchIndex, records: dict) -> dict:
+    queries = ["docker", "環境構築 設定", "api error", "notes", "メモ"]
+    return {
+        "doc_count": idx.doc_count,
+        "postings": [idx.postings(field) for field in (FIELD_BODY, FIELD_TITLE, FIELD_PATH)],
+        "search": [[(r["path"], r["score"]) for r in idx.search(q, True, records, frozenset())] for q in queries],
+    }
+
+
+def _reference_search(records: dict, query: str, published_set: frozenset | None, limit: int) -> list[tuple[str, float]]:
+    """全文書のトークン列から直接求めた検索結果の (パス, スコア)（SearchIndexの内部を使わない参照実装）。
+
+    BM25F: フィールドごとのTFを重み / (1 - b + b * 文書長 / 平均文書長) で正規化して合算し、
+    IDF * tf / (k1 + tf) をクエリ中の出現回数倍して語ごとに足す。複数語のクエリでは、本文に出現するクエリ語
+    （k語）をすべて含む最短の区間の長さspanから 重み * (k - 1) / (語数 - 1) * k / span を、
+    近接フレーズの出現数ごとのBM25F上位 max(残り件数, SEARCH_PROXIMITY_CANDIDATES) 件に加えて並べ直す。
+    引用符のフレーズを含まない文書は除き、
+    近接フレーズが連続して出現する数の多い順、スコアの降順、パスの昇順に並べる。
+    """
+    import math
+    from collections import Counter
+    from app.config import (
+        SEARCH_BM25_B, SEARCH_BM25_K1, SEARCH_FIELD_WEIGHTS, SEARCH_PROXIMITY_CANDIDATES, SEARCH_PROXIMITY_WEIGHT,
+    )
+    from app.core.search import parse_query, tokenize, tokenize_query
+
+    fields = {path: (tokenize(f["body_text"]), tokenize(f["title"]), tokenize(path)) for path, f in records.items()}
+    count = len(fields)
+    avg_lengths = [sum(len(tokens[field]) for tokens in fields.values()) / count for field in range(3)]
+
+    def contains(path: str, phrase: list[str]) -> bool:
+        n = len(phrase)
+        return any(t[i:i + n] == phrase for t in fields[path] for i in range(len(t) - n + 1))
+
+    weighted: dict[str, dict[str, float]] = {}
+    for path, field_tokens in fields.items():
+        for field, tokens in enumerate(field_tokens):
+            weight = SEARCH_FIELD_WEIGHTS[field]
+            if avg_lengths[field]:
+                weight /= 1 - SEARCH_BM25_B + SEARCH_BM25_B * len(tokens) / avg_lengths[field]
+            for token, tf in Counter(tokens).items():
+                weighted.setdefault(token, {})
+                weighted[token][path] = weighted[token].get(path, 0.0) + tf * weight
+
+    scores: dict[str, float] = {}
+    for token, query_tf in Counter(tokenize_query(query)).items():
+        docs = weighted.get(token, {})
+        idf = math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+        for path, tf in docs.items():
+            scores[path] = scores.get(path, 0.0) + idf * tf / (SEARCH_BM25_K1 + tf) * query_tf
+
+    query_terms = set(tokenize_query(query))
+
+    def proximity(path: str) -> float:
+        body = fields[path][0]
+        present = query_terms & set(body)
+        if len(present) < 2:
+            return 0.0
+        span = min(
+            end - start + 1 for start in range(len(body)) for end in range(start, len(body))
+            if present <= set(body[start:end + 1])
+        )
+        k = len(present)
+        return SEARCH_PROXIMITY_WEIGHT * (k - 1) / (len(query_terms) - 1) * k / span
+
+    required, phrases = parse_query(query)
+    tiers: dict[int, list[tuple[float, str]]] = {}
+    for path, score in scores.items():
+        if (published_set is None or path in published_set) and all(contains(path, phrase) for phrase in required):
+            tiers.setdefault(sum(contains(path, phrase) for phrase in phrases), []).append((score, path))
+
+    results: list[tuple[str, float]] = []
+    for count in sorted(tiers, reverse=True):
+        remaining = limit - len(results)
+        if remaining <= 0:
+            break
+        ranked = sorted(tiers[count], key=lambda r: (-r[0], r[1]))
+        if len(query_terms) >= 2:
+            candidates = ranked[:max(remaining, SEARCH_PROXIMITY_CANDIDATES)]
+            ranked = sorted(((score + proximity(path), path) for score, path in candidates), key=lambda r: (-r[0], r[1]))
+        results += [(path, score) for score, path in ranked[:remaining]]
+    return results
+
+
+def _verify_top_k(idx: SearchIndex, records: dict, published: frozenset) -> None:
+    """MaxScoreによる上位k件が、全文書をスコア計算した参照実装の上位k件と一致することを検証"""
+    queries = ["docker", "環境構築 設定", "api error メモ", "python python linux", "notes", "docker compose 手順"]
+    for query in queries:
+        for is_localhost in (True, False):
+            published_set = None if is_localhost else published
+            for limit in (1, 3, 20):
+                results = idx.search(query, is_localhost, records, published, limit=limit)
+                expected = _reference_search(records, query, published_set, limit)
+                assert [r["path"] for r in results] == [path for path, _ in expected], f"top-k mismatch: {query}"
+                for r, (_, score) in zip(results, expected):
+                    assert abs(r["score"] - score) < 1e-4, f"score mismatch: {query}"
+
+
+def _verify_phrases(idx: SearchIndex, records: dict) -> None:
+    """引用符で囲んだフレーズの絞り込みが、トークン列を直接照合した結果と一致することを検証"""
+    from app.core.search import tokenize
+
+    fields = {
+        path: [tokenize(f["body_text"]), tokenize(f["title"]), tokenize(path)]
+        for path, f in records.items()
+    }
+    for phrase in ["docker compose", "環境構築", "設定 メモ 手順", "api error", "notes 1", "python python"]:
+        tokens = tokenize(phrase)
+        n = len(tokens)
+        expected = {
+            path for path, field_tokens in fields.items()
+            if any(t[i:i + n] == tokens for t in field_tokens for i in range(len(t) - n + 1))
+        }
+        results = idx.search(f'"{phrase}"', True, records, frozenset(), limit=len(records))
+        assert {r["path"] for r in results} == expected, f"phrase mismatch: {phrase}"
+
+    for query in ['"docker compose" python', '"api error" メモ', '環境構築 "設定 メモ"']:
+        results = idx.search(query, True, records, frozenset(), limit=len(records))
+        expected = _reference_search(records, query, None, len(records))
+        assert [r["path"] for r in results] == [path for path, _ in expected], f"phrase mismatch: {query}"
+
+
+def verify_search_index_updates() -> None:
+    """SearchIndexのadd/update/remove・compactの結果がbuildと一致することを検証"""
+    rng = random.Random(0)
+    words = ["docker", "compose", "環境構築", "設定", "api", "error", "メモ", "手順", "python", "linux"]
+
+    def record(path: str) -> dict:
+        return {
+            "path": path,
+            "title": " ".join(rng.sample(words, 2)),
+            "body_text": " ".join(rng.choice(words) for _ in range(rng.randint(0, 30))),
+        }
+
+    records = {f"notes/{i}.md": record(f"notes/{i}.md") for i in range(100)}
+    idx = SearchIndex()
+    idx.build(list(records.values()))
+    next_id = 100
+    for step in range(300):
+        idx = idx.clone()
+        op = rng.random()
+        if op < 0.3 and records:
+            path = rng.choice(sorted(records))
+            idx.remove_document(records.pop(path))
+        elif op < 0.6:
+            path = f"notes/{next_id}.md"
+            next_id += 1
+            records[path] = record(path)
+            idx.add_document(records[path])
+        elif records:
+            path = rng.choice(sorted(records))
+            new = record(path)
+            idx.update_document(records[path], new)
+            records[path] = new
+        if idx.needs_compaction():
+            idx = idx.compact()
+            assert idx.dead_documents == 0
+
+        if step % 50 == 49:
+            expected = SearchIndex()
+            expected.build(list(records.values()))
+            assert _index_state(idx, records) == _index_state(expected, records), f"mismatch at step {step}"
+            assert _index_state(idx.compact(), records) == _index_state(expected, records), "mismatch after compact"
+            _verify_top_k(idx, records, frozenset(list(records)[::2]))
+            _verify_phrases(idx, records)
+    print("PASS: search index add/update/remove matches full build")
+
+
+
+def verify_proximity_ranking() -> None:
+    """引用符のない複数語のクエリで、語が近くに出現する文書が離れて出現する文書より上位になることを検証"""
+    filler = " ".join(f"word{i}" for i in range(20))
+    records = {
+        # BM25Fのスコアは同じ（語の出現回数・文書長が同じ）で、パス順では離れている文書が先
+        "a/far.md": {"path": "a/far.md", "title": "t", "body_text": f"docker {filler} compose"},
+        "b/mid.md": {"path": "b/mid.md", "title": "t", "body_text": f"docker {filler[:30]} compose {filler[30:]}"},
+        "c/near.md": {"path": "c/near.md", "title": "t", "body_text": f"docker compose {filler}"},
+        "d/one.md": {"path": "d/one.md", "title": "t", "body_text": f"docker {filler} other"},
+    }
+    idx = SearchIndex()
+    idx.build(list(records.values()))
+
+    results = idx.search("docker compose", True, records, frozenset())
+    assert [r["path"] for r in results] == ["c/near.md", "b/mid.md", "a/far.md", "d/one.md"], results
+    assert results[0]["score"] > results[1]["score"] > results[2]["score"]
+    # 1語のクエリには加点しない（同点はパス順）
+    results = idx.search("compose", True, records, frozenset())
+    assert [r["path"] for r in results] == ["a/far.md", "b/mid.md", "c/near.md"], results
+    # 候補（SEARCH_PROXIMITY_CANDIDATES件）に収まる限り、limitで打ち切っても全件を並べた場合の先頭と一致する
+    assert [r["path"] for r in idx.search("docker compose", True, records, frozenset(), limit=1)] == ["c/near.md"]
+    print("PASS: near query terms outrank distant ones")
+
+
+def verify_search_snippets() -> None:
+    """スニペットのマッチ箇所（位置情報から求めたもの）が本文中のクエリ語を指すことを検証"""
+    from app.core.search import tokenize
+
+    rng = random.Random(1)
+    words = ["Python", "pythonic", "環境構築", "の", "設定", "İstanbul", "😀", "docker-compose", "\n", " "]
+    records = {}
+    for i in range(50):
+        body = "".join(rng.choice(words) + rng.choice(["", " ", "、"]) for _ in range(rng.randint(0, 200)))
+        records[f"notes/{i}.md"] = {"path": f"notes/{i}.md", "title": "t", "body_text": body}
+    idx = SearchIndex()
+    idx.build(list(records.values()))
+
+    for query in ["python", "環境構築 設定", "の", "istanbul docker", "compose"]:
+        query_tokens = set(tokenize(query))
+        results = idx.search(query, True, records, frozenset(records), limit=len(records))
+        assert results, query
+        for r in results:
+            body = records[r["path"]]["body_text"]
+            for start, end in r["highlights"]:
+                highlighted = r["snippet"][start:end]
+                assert set(tokenize(highlighted)) & query_tokens, (query, highlighted)
+                assert highlighted in body, (query, highlighted)
+            # 本文にクエリ語を含む文書は、スニペットにマッチ箇所を含む
+            assert bool(r["highlights"]) == bool(query_tokens & set(tokenize(body))), (query, r["snippet"])
+    print("PASS: search snippet highlights point at query tokens")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""リフレッシュキューのデバウンス・集約・要求番号(ticket)の挙動を検証するスクリプト
+
+使い方: python tests/verify_refresh_queue.py
+app.core.indexingのリフレッシュ関数を呼び出しを記録する関数に差し替え、
+RefreshQueueがデバウンス期間内の要求を1回にまとめること・完了待ちがticket単位で解決されることを確認する。
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+_tmp = tempfile.TemporaryDirectory()
+os.environ["OBSIDIAN_CONTENT_DIR"] = str(Path(_tmp.name) / "vault")
+os.environ["OBSIDIAN_METADATA_CACHE_FILE"] = str(Path(_tmp.name) / "metadata_cache.json")
+(Path(_tmp.name) / "vault").mkdir()
+
+from app.core import indexing  # noqa: E402
+from app.services.refresh import RefreshQueue  # noqa: E402
+
+calls: list[tuple] = []
+gate = threading.Event()  # セット中のみリフレッシュを完了させる
+gate.set()
+
+
+def fake_refresh_global_caches(incremental: bool = False, force: set[str] | None = None) -> None:
+    gate.wait()
+    calls.append(("incremental" if incremental else "full", sorted(force) if force else None))
+
+
+def fake_refresh_paths(paths: list[str], force: bool = True) -> None:
+    gate.wait()
+    calls.append(("paths", list(paths), force))
+
+
+indexing.refresh_global_caches = fake_refresh_global_caches
+indexing.refresh_paths = fake_refresh_paths
+
+
+def verify_coalescing() -> None:
+    """デバウンス期間内の要求は1回のリフレッシュにまとめ、要求番号は要求ごとに増える"""
+    queue = RefreshQueue(debounce=0.1, max_delay=2.0)
+    calls.clear()
+    tickets = [queue.request([path]) for path in ("b.md", "a.md", "b.md")]
+    assert tickets == [1, 2, 3], tickets
+    assert queue.wait(tickets[-1], timeout=5)
+    assert calls == [("paths", ["a.md", "b.md"], True)], calls
+    status = queue.status()
+    assert status["state"] == "idle" and status["requested"] == status["completed"] == 3, status
+
+    # 何も要求しない呼び出しは番号を進めない
+    assert queue.request() == 3
+
+    # フルリビルドは同時に要求されたpaths・差分リフレッシュを包含する
+    calls.clear()
+    queue.request(["c.md"])
+    queue.request(incremental=True)
+    ticket = queue.request(full=True)
+    assert queue.wait(ticket, timeout=5)
+    assert calls == [("full", None)], calls
+
+    # 差分リフレッシュと併せて要求されたpathsはforce対象になる
+    calls.clear()
+    queue.request(["d.md"])
+    ticket = queue.request(incremental=True)
+    assert queue.wait(ticket, timeout=5)
+    assert calls == [("incremental", ["d.md"])], calls
+    print("PASS: requests within the debounce window are coalesced into one refresh")
+
+
+def verify_max_delay() -> None:
+    """要求が続いていても、最初の要求からmax_delayで反映する"""
+    queue = RefreshQueue(debounce=0.2, max_delay=0.3)
+    calls.clear()
+    deadline = time.monotonic() + 1.0
+    first = queue.request(["x.md"])
+    while time.monotonic() < deadline:
+        queue.request(["x.md"])
+        time.sleep(0.05)
+    assert queue.wait(first, timeout=5)
+    assert len(calls) >= 2, calls
+    print("PASS: continuous requests are flushed after max_delay")
+
+
+def verify_async_wait() -> None:
+    """非同期の完了待ちはticketまでの反映で解決し、タイムアウトではFalseを返す（スレッドを使わない）"""
+    queue = RefreshQueue(debounce=0.05, max_delay=1.0)
+
+    async def scenario() -> None:
+        gate.clear()
+        first = queue.request(["a.md"])
+        threads = threading.active_count()
+        waiters = [asyncio.ensure_future(queue.wait_async(first, timeout=5)) for _ in range(50)]
+        timed_out = await queue.wait_async(first, timeout=0.2)
+        assert timed_out is False
+        # 50件待っていても待機用のスレッドは増えない
+        assert threading.active_count() == threads, (threading.active_count(), threads)
+        gate.set()
+        assert all(await asyncio.gather(*waiters))
+        assert await queue.wait_async(first, timeout=0) is True
+
+        # 後の要求番号は、それまでの要求の反映では解決しない
+        gate.clear()
+        second = queue.request(["b.md"])
+        waiter = asyncio.ensure_future(queue.wait_async(second, timeout=5))
+        await asyncio.sleep(0.2)
+        assert not waiter.done()
+        gate.set()
+        assert await waiter
+
+    asyncio.run(scenario())
+    print("PASS: async waiters resolve per ticket without parking threads")
+
+
+if __name__ == "__main__":
+    verify_coalescing()
+    verify_max_delay()
+    verify_async_wait()
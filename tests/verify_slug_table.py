@@ -0,0 +1,85 @@
+"""スラッグ変換表の永続化とpykakasiの遅延importを検証するスクリプト
+
+使い方: python tests/verify_slug_table.py
+一時ディレクトリのVaultでインデックスを構築し、変換表がメタデータキャッシュの隣に書き出されること、
+再起動相当（メモリ上の変換表を破棄）の後は変換表からスラッグを引き、pykakasiを使わないことを確認する。
+"""
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+_tmp = tempfile.TemporaryDirectory()
+VAULT = Path(_tmp.name) / "vault"
+VAULT.mkdir()
+os.environ["OBSIDIAN_CONTENT_DIR"] = str(VAULT)
+os.environ["OBSIDIAN_METADATA_CACHE_FILE"] = str(Path(_tmp.name) / "metadata_cache.json")
+
+from app import cache  # noqa: E402
+from app.config import SLUG_TABLE_FILE  # noqa: E402
+from app.core.indexing import refresh_global_caches  # noqa: E402
+from app.utils import slug  # noqa: E402
+
+
+def restart() -> None:
+    """メモリ上の変換表とpykakasiのインスタンスを破棄する（再起動相当）"""
+    slug._table = None
+    slug._kakasi = None
+    slug._dirty = False
+
+
+def verify_lazy_import() -> None:
+    """ASCIIのみのパスではpykakasiをimportせず、未変換の日本語セグメントで初めてimportする"""
+    assert "pykakasi" not in sys.modules, "pykakasi imported at startup"
+    assert slug.slugify_path("Notes/Docker Compose.md") == "notes/docker-compose"
+    assert "pykakasi" not in sys.modules, "pykakasi imported for an ASCII-only path"
+
+    (VAULT / "日本語").mkdir()
+    (VAULT / "日本語" / "メモ.md").write_text("本文\n", encoding="utf-8")
+    (VAULT / "readme.md").write_text("text\n", encoding="utf-8")
+    refresh_global_caches()
+    assert "pykakasi" in sys.modules
+    assert cache.get_snapshot().path_to_slug["日本語/メモ.md"] == "nihongo/memo", cache.get_snapshot().path_to_slug
+    print("PASS: pykakasi is imported only for unseen non-ASCII segments")
+
+
+def verify_table_persistence() -> None:
+    """変換表は永続化され、再起動後は変換表から同じスラッグを返す（pykakasiを使わない）"""
+    with open(SLUG_TABLE_FILE, encoding="utf-8") as f:
+        data = json.load(f)
+    assert data["version"] == slug.SLUG_TABLE_VERSION
+    assert data["segments"]["日本語"] == "nihongo" and data["segments"]["メモ"] == "memo", data
+
+    before = dict(cache.get_snapshot().path_to_slug)
+    restart()
+    pykakasi = sys.modules.pop("pykakasi")
+    sys.modules["pykakasi"] = None  # importすると失敗させる
+    try:
+        assert slug.slugify_path("日本語/メモ.md") == "nihongo/memo"
+        refresh_global_caches()
+        assert cache.get_snapshot().path_to_slug == before
+        try:
+            slug.slugify_segment("未登録")
+            raise AssertionError("unseen segment did not need pykakasi")
+        except ImportError:
+            pass
+    finally:
+        sys.modules["pykakasi"] = pykakasi
+
+    # 変換ロジックのバージョンが異なる変換表は使わない
+    data["version"] = slug.SLUG_TABLE_VERSION + 1
+    data["segments"]["メモ"] = "stale"
+    with open(SLUG_TABLE_FILE, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False)
+    restart()
+    assert slug.slugify_segment("メモ") == "memo"
+    print("PASS: slug table persists next to the metadata cache and survives restarts")
+
+
+if __name__ == "__main__":
+    verify_lazy_import()
+    verify_table_persistence()
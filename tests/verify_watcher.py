@@ -0,0 +1,124 @@
+"""ファイル監視（inotify）のイベント集約と、変更がインデックスへ反映されることを検証するスクリプト
+
+使い方: python tests/verify_watcher.py
+一時ディレクトリのVaultを監視し、連続した書き込み・作成・リネーム・削除が
+パス単位に集約されて1回のコールバックになること、ディレクトリの追加は差分リフレッシュになること、
+_apply_changes経由でノートの追加・変更・リネーム・削除がスナップショットに反映されることを確認する。
+inotifyが使えない環境ではスキップする。
+"""
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+root_dir = Path(__file__).parent.parent
+sys.path.append(str(root_dir))
+
+_tmp = tempfile.TemporaryDirectory()
+VAULT = Path(_tmp.name) / "vault"
+VAULT.mkdir()
+os.environ["OBSIDIAN_CONTENT_DIR"] = str(VAULT)
+os.environ["OBSIDIAN_METADATA_CACHE_FILE"] = str(Path(_tmp.name) / "metadata_cache.json")
+
+from app import cache  # noqa: E402
+from app.config import WATCH_DEBOUNCE_SECONDS  # noqa: E402
+from app.core.indexing import refresh_global_caches  # noqa: E402
+from app.services.watcher import InotifyWatcher, _apply_changes  # noqa: E402
+
+
+def wait_until(predicate, timeout: float = 10.0) -> bool:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+def verify_event_coalescing() -> None:
+    """デバウンス期間内のイベントはルートごとに1回のコールバックへパス単位で集約される"""
+    notes = Path(_tmp.name) / "notes"
+    images = Path(_tmp.name) / "images"
+    notes.mkdir()
+    images.mkdir()
+    (notes / "old.md").write_text("old\n", encoding="utf-8")
+
+    calls: list[tuple[Path, set[str], bool]] = []
+    flushed = threading.Event()
+
+    def on_changes(root: Path, rel_paths: set[str], rescan: bool) -> None:
+        calls.append((root, set(rel_paths), rescan))
+        flushed.set()
+
+    watcher = InotifyWatcher([notes, images], on_changes)
+    watcher.start()
+    try:
+        for i in range(20):
+            (notes / "a.md").write_text(f"draft {i}\n", encoding="utf-8")
+        (notes / "b.md").write_text("b\n", encoding="utf-8")
+        os.rename(notes / "b.md", notes / "c.md")
+        os.remove(notes / "old.md")
+        (notes / ".hidden.md").write_text("ignored\n", encoding="utf-8")
+        (images / "x.png").write_bytes(b"png")
+        assert flushed.wait(timeout=5)
+        time.sleep(WATCH_DEBOUNCE_SECONDS * 2)
+        assert sorted(calls, key=lambda c: str(c[0])) == [
+            (images, {"x.png"}, False),
+            (notes, {"a.md", "b.md", "c.md", "old.md"}, False),
+        ], calls
+
+        # 追加したディレクトリは配下も監視し、ディレクトリ単位の増減は差分リフレッシュとして通知する
+        calls.clear()
+        flushed.clear()
+        (notes / "sub").mkdir()
+        assert flushed.wait(timeout=5)
+        time.sleep(WATCH_DEBOUNCE_SECONDS * 2)
+        assert calls == [(notes, set(), True)], calls
+        calls.clear()
+        flushed.clear()
+        (notes / "sub" / "d.md").write_text("d\n", encoding="utf-8")
+        assert flushed.wait(timeout=5)
+        assert calls == [(notes, {"sub/d.md"}, False)], calls
+    finally:
+        watcher.stop()
+    print("PASS: watcher coalesces bursts per path and rescans on directory changes")
+
+
+def verify_changes_applied() -> None:
+    """監視したノートの追加・変更・リネーム・削除がフルリビルドなしでスナップショットに反映される"""
+    (VAULT / "keep.md").write_text("---\ntitle: Keep\n---\n本文\n", encoding="utf-8")
+    refresh_global_caches()
+    watcher = InotifyWatcher([VAULT], _apply_changes)
+    watcher.start()
+    try:
+        def records():
+            return cache.get_snapshot().records
+
+        (VAULT / "new.md").write_text("---\ntitle: 新規\n---\n監視 テスト\n", encoding="utf-8")
+        assert wait_until(lambda: "new.md" in records()), sorted(records())
+        assert records()["new.md"]["title"] == "新規"
+
+        (VAULT / "new.md").write_text("---\ntitle: 更新\n---\n監視 テスト\n", encoding="utf-8")
+        assert wait_until(lambda: records()["new.md"]["title"] == "更新")
+
+        os.rename(VAULT / "new.md", VAULT / "renamed.md")
+        assert wait_until(lambda: "renamed.md" in records() and "new.md" not in records()), sorted(records())
+        results = cache.get_snapshot().search_index.search("監視", True, records(), cache.get_snapshot().published_paths)
+        assert [r["path"] for r in results] == ["renamed.md"], results
+
+        os.remove(VAULT / "renamed.md")
+        assert wait_until(lambda: "renamed.md" not in records()), sorted(records())
+        assert sorted(records()) == ["keep.md"]
+    finally:
+        watcher.stop()
+    print("PASS: watched note changes reach the snapshot and search index")
+
+
+if __name__ == "__main__":
+    if not os.path.exists("/proc/sys/fs/inotify"):
+        print("SKIP: inotify is not available")
+        sys.exit(0)
+    verify_event_coalescing()
+    verify_changes_applied()